@@ -9,7 +9,8 @@ def create_app(config_class=Config):
     app = Flask(__name__, instance_relative_config=True)
 
     # Inicializa o CORS na aplicação.
-    CORS(app, supports_credentials=True, origins=["http://localhost:5173", "http://127.0.0.1:5173"])
+    CORS(app, supports_credentials=True, origins=["http://localhost:5173", "http://127.0.0.1:5173"],
+         expose_headers=["Upload-Offset", "Upload-Length", "Location"])
 
     # Configurações a partir do objeto Config
     app.config.from_object(config_class)
@@ -39,10 +40,20 @@ def create_app(config_class=Config):
 
     with app.app_context():
         db.create_all()
-        
-        # Recover interrupted tasks (ghost tasks)
-        from app.transcriptions.task_queue import recover_ghost_tasks
-        recover_ghost_tasks(app)
+
+        # Add columns/indexes introduced after the database was created
+        from app.migrations import upgrade_schema, migrate_segments
+        upgrade_schema()
+        migrate_segments()
+
+        from app.transcriptions.search import ensure_search_index
+        ensure_search_index()
+
+    # Web processes only enqueue work; inference runs in the standalone worker
+    # (python -m app.transcriptions.worker) unless explicitly embedded for dev.
+    if app.config.get('EMBEDDED_WORKER'):
+        from app.transcriptions.worker import start_embedded_worker
+        start_embedded_worker(app)
 
     @login_manager.unauthorized_handler
     def unauthorized():
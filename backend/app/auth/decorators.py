@@ -0,0 +1,21 @@
+from functools import wraps
+
+from flask import current_app, jsonify
+from flask_login import current_user, login_required
+
+
+def is_operator(user) -> bool:
+    """Whether ``user`` is listed in OPERATOR_USERNAMES (deployment-wide views)."""
+    operators = {name.strip() for name in (current_app.config.get('OPERATOR_USERNAMES') or '').split(',')}
+    return user.is_authenticated and user.username in operators - {''}
+
+
+def operator_required(view):
+    """Like login_required, and the user must be an operator."""
+    @wraps(view)
+    @login_required
+    def wrapper(*args, **kwargs):
+        if not is_operator(current_user):
+            return jsonify({'error': 'Não autorizado'}), 403
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,102 @@
+"""
+Lightweight, additive schema upgrades.
+
+``db.create_all()`` creates missing tables but never touches existing ones,
+so databases created by older versions would miss newer columns and indexes.
+``upgrade_schema`` adds them in place (ALTER TABLE ... ADD COLUMN / CREATE
+INDEX). It is idempotent and only ever adds; it never drops or rewrites data.
+"""
+from sqlalchemy import inspect, text, null
+
+from app.extensions import db
+
+
+def _column_default_sql(column):
+    default = column.default
+    if default is None or not default.is_scalar:
+        return None
+    value = default.arg
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return None
+
+
+def _apply(engine, description, operation):
+    # One transaction per statement: several processes may start at once and
+    # race to add the same column; the loser's failure is harmless.
+    try:
+        with engine.begin() as conn:
+            operation(conn)
+        print(f"[*] Schema upgrade: added {description}")
+    except Exception as e:
+        print(f"[*] Schema upgrade: skipped {description} ({e.__class__.__name__})")
+
+
+def upgrade_schema():
+    """Add columns and indexes declared on the models but missing in the database."""
+    engine = db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue  # create_all() already created it with everything
+
+        existing_columns = {c['name'] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'
+            default_sql = _column_default_sql(column)
+            if default_sql is not None:
+                ddl += f' DEFAULT {default_sql}'
+                if not column.nullable:
+                    ddl += ' NOT NULL'
+            _apply(engine, f'column {table.name}.{column.name}',
+                   lambda conn, ddl=ddl: conn.execute(text(ddl)))
+
+        existing_indexes = {i['name'] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                _apply(engine, f'index {index.name}',
+                       lambda conn, index=index: index.create(conn, checkfirst=True))
+
+
+def migrate_segments(batch_size=100):
+    """
+    Move segments stored in the legacy Transcription.structured_data JSON
+    column into the transcription_segment table.
+
+    Each row is claimed by clearing its JSON column first, in the same
+    transaction that inserts the segments, so several processes can run
+    this concurrently without duplicating segments.
+    """
+    # Avoid circular import
+    from app.transcriptions.models import Transcription
+
+    migrated = 0
+    while True:
+        ids = [row.id for row in db.session.query(Transcription.id)
+               .filter(Transcription.structured_data.isnot(None))
+               .limit(batch_size)]
+        if not ids:
+            break
+        for transcription_id in ids:
+            transcription = Transcription.query.get(transcription_id)
+            segments = transcription.structured_data if transcription else None
+            claimed = Transcription.query\
+                .filter(Transcription.id == transcription_id, Transcription.structured_data.isnot(None))\
+                .update({'structured_data': null()}, synchronize_session=False)
+            if claimed == 1 and isinstance(segments, list):
+                transcription.replace_segments(segments)
+                migrated += 1
+            db.session.commit()
+            db.session.expire_all()
+
+    if migrated:
+        print(f"[*] Data migration: moved segments of {migrated} transcriptions to transcription_segment")
@@ -0,0 +1,103 @@
+"""
+Speaker attribution: merges Whisper text segments with pyannote speaker turns.
+
+Each Whisper segment (or word) gets the speaker of the diarization turn it
+overlaps the most. Both lists are swept once in time order, keeping a heap
+of the turns still open at the current position, so the cost is
+O((N + M) log M) instead of comparing every segment with every turn.
+
+When Whisper ran with ``word_timestamps=True`` segments carry their words,
+and a segment spanning a speaker change is split at the first word of the
+new speaker. Words outside every turn (pauses, music) stay with the speaker
+before them.
+"""
+import heapq
+
+UNKNOWN_SPEAKER = "Unknown"
+
+
+def assign_speakers(intervals, turns):
+    """
+    Speaker of the turn with the largest overlap for each ``(start, end)`` in
+    ``intervals``, in input order; UNKNOWN_SPEAKER where nothing overlaps.
+    Ties go to the turn listed first, like a linear scan would.
+    """
+    turn_order = sorted(range(len(turns)), key=lambda i: turns[i]['start'])
+    query_order = sorted(range(len(intervals)), key=lambda i: intervals[i][0])
+    speakers = [UNKNOWN_SPEAKER] * len(intervals)
+
+    open_turns = []  # (end, index) of turns started before the current interval ends
+    next_turn = 0
+    for q in query_order:
+        start, end = intervals[q]
+        while next_turn < len(turn_order) and turns[turn_order[next_turn]]['start'] < end:
+            index = turn_order[next_turn]
+            heapq.heappush(open_turns, (turns[index]['end'], index))
+            next_turn += 1
+        # Intervals are visited by start, so turns ending before it are done for good
+        while open_turns and open_turns[0][0] <= start:
+            heapq.heappop(open_turns)
+
+        best_overlap, best_index = 0, None
+        for turn_end, index in open_turns:
+            overlap = min(end, turn_end) - max(start, turns[index]['start'])
+            if overlap > 0 and (overlap > best_overlap
+                                or (overlap == best_overlap and index < best_index)):
+                best_overlap, best_index = overlap, index
+        if best_index is not None:
+            speakers[q] = turns[best_index]['speaker']
+    return speakers
+
+
+def _split_by_words(segment, word_speakers, fallback):
+    """Consecutive words with the same speaker become one segment."""
+    pieces = []
+    speaker = None
+    for word, word_speaker in zip(segment['words'], word_speakers):
+        if word_speaker == UNKNOWN_SPEAKER:
+            word_speaker = speaker or fallback
+        if pieces and word_speaker == speaker:
+            pieces[-1]['end'] = word['end']
+            pieces[-1]['text'] += word['word']
+        else:
+            pieces.append({
+                "start": word['start'],
+                "end": word['end'],
+                "text": word['word'],
+                "speaker": word_speaker
+            })
+            speaker = word_speaker
+    if len(pieces) == 1:
+        # No speaker change: keep Whisper's own segment bounds and text
+        pieces[0].update(start=segment['start'], end=segment['end'], text=segment['text'])
+    return pieces
+
+
+def merge_segments(whisper_segments, diarization_segments, split_words=True):
+    """
+    Merges Whisper text segments with Pyannote speaker segments based on time overlap.
+    With ``split_words`` and word timestamps present, segments are split at
+    speaker changes.
+    """
+    segment_speakers = assign_speakers(
+        [(s['start'], s['end']) for s in whisper_segments], diarization_segments
+    )
+
+    words = []
+    if split_words:
+        words = [(w['start'], w['end']) for s in whisper_segments for w in s.get('words') or []]
+    word_speakers = iter(assign_speakers(words, diarization_segments)) if words else None
+
+    merged = []
+    for segment, speaker in zip(whisper_segments, segment_speakers):
+        if word_speakers is not None and segment.get('words'):
+            speakers = [next(word_speakers) for _ in segment['words']]
+            merged.extend(_split_by_words(segment, speakers, speaker))
+        else:
+            merged.append({
+                "start": segment['start'],
+                "end": segment['end'],
+                "text": segment['text'],
+                "speaker": speaker
+            })
+    return merged
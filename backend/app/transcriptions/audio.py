@@ -0,0 +1,155 @@
+"""
+Audio decoding shared by Whisper and pyannote.
+
+Each upload (WAV or any compressed format in formats.py) is decoded once,
+by a single streaming ffmpeg process, straight into a 16 kHz mono float32
+buffer; no intermediate WAV is ever written. Both engines receive the same array, and the
+buffer can be kept next to the upload as a memory-mapped ``.npy`` file so
+retries and re-runs skip decoding entirely.
+"""
+import os
+import subprocess
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+DECODED_SUFFIX = '.pcm16k.npy'
+
+# Fixed-size .npy v1.0 header so the shape can be patched in after streaming
+_NPY_MAGIC = b'\x93NUMPY\x01\x00'
+_NPY_HEADER_LEN = 128
+_READ_CHUNK = 1 << 20  # 1 MiB of PCM per read
+
+
+def decoded_path(filepath: str) -> str:
+    """Where the decoded buffer of an upload is cached."""
+    return filepath + DECODED_SUFFIX
+
+
+def _npy_header(num_samples: int) -> bytes:
+    header = "{'descr': '<f4', 'fortran_order': False, 'shape': (%d,), }" % num_samples
+    pad = _NPY_HEADER_LEN - len(_NPY_MAGIC) - 2 - len(header) - 1
+    header = (header + ' ' * pad + '\n').encode('latin1')
+    return _NPY_MAGIC + len(header).to_bytes(2, 'little') + header
+
+
+def _ffmpeg_command(filepath: str):
+    return [
+        'ffmpeg', '-nostdin', '-threads', '0', '-loglevel', 'error',
+        '-i', filepath,
+        # Audio only: ignore video tracks and cover art in mp4/webm/mp3
+        '-vn', '-sn', '-dn',
+        '-f', 'f32le', '-ac', '1', '-acodec', 'pcm_f32le', '-ar', str(SAMPLE_RATE),
+        '-'
+    ]
+
+
+def _open_ffmpeg(filepath: str):
+    try:
+        return subprocess.Popen(_ffmpeg_command(filepath), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise RuntimeError("ffmpeg não encontrado. Instale o ffmpeg para processar áudio.")
+
+
+def _check_ffmpeg(proc, filepath):
+    stderr = proc.stderr.read().decode('utf-8', errors='replace')
+    if proc.wait() != 0:
+        raise RuntimeError(f"Falha ao decodificar o áudio '{os.path.basename(filepath)}': {stderr.strip()}")
+
+
+def decode_to_file(filepath: str, target: str) -> int:
+    """
+    Stream-decode ``filepath`` into a ``.npy`` file at ``target`` without
+    holding the whole signal in memory. Returns the number of samples.
+    """
+    tmp = target + '.tmp'
+    proc = _open_ffmpeg(filepath)
+    num_bytes = 0
+    try:
+        with open(tmp, 'wb') as out:
+            out.write(_npy_header(0))
+            while True:
+                chunk = proc.stdout.read(_READ_CHUNK)
+                if not chunk:
+                    break
+                out.write(chunk)
+                num_bytes += len(chunk)
+            _check_ffmpeg(proc, filepath)
+
+            # Drop a trailing partial sample, then patch the real shape in
+            num_samples = num_bytes // 4
+            out.truncate(_NPY_HEADER_LEN + num_samples * 4)
+            out.seek(0)
+            out.write(_npy_header(num_samples))
+        os.replace(tmp, target)
+        return num_samples
+    except BaseException:
+        proc.kill()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+# Storage compaction codecs: ffmpeg arguments and file extension
+COMPACT_CODECS = {
+    # Lossless; keeps the original rate and channels
+    'flac': (['-c:a', 'flac', '-compression_level', '8', '-f', 'flac'], 'flac'),
+    # Lossy speech coding, mono; the bitrate is appended at call time
+    'opus': (['-c:a', 'libopus', '-application', 'voip', '-ac', '1', '-f', 'ogg'], 'opus'),
+}
+
+
+def encode_file(filepath: str, target: str, codec: str, bitrate: str = '32k'):
+    """Re-encode ``filepath`` into ``target`` with one of COMPACT_CODECS."""
+    codec_args, _ = COMPACT_CODECS[codec]
+    if codec == 'opus':
+        codec_args = codec_args + ['-b:a', bitrate]
+    command = ['ffmpeg', '-nostdin', '-threads', '0', '-loglevel', 'error', '-y',
+               '-i', filepath, '-vn', '-sn', '-dn'] + codec_args + [target]
+    try:
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise RuntimeError("ffmpeg não encontrado. Instale o ffmpeg para processar áudio.")
+    if result.returncode != 0:
+        stderr = result.stderr.decode('utf-8', errors='replace')
+        raise RuntimeError(f"Falha ao recodificar o áudio '{os.path.basename(filepath)}': {stderr.strip()}")
+
+
+def decode(filepath: str) -> np.ndarray:
+    """Decode ``filepath`` into an in-memory float32 array."""
+    proc = _open_ffmpeg(filepath)
+    data = bytearray()
+    try:
+        # Grow one buffer in place instead of joining chunks and copying
+        while True:
+            chunk = proc.stdout.read(_READ_CHUNK)
+            if not chunk:
+                break
+            data += chunk
+        _check_ffmpeg(proc, filepath)
+    except BaseException:
+        proc.kill()
+        raise
+    del data[len(data) // 4 * 4:]
+    return np.frombuffer(data, dtype=np.float32)
+
+
+def load_audio(filepath: str, cache: bool = True) -> np.ndarray:
+    """
+    Return the 16 kHz mono float32 signal of ``filepath``.
+
+    With ``cache`` the decoded buffer is written next to the upload and
+    returned memory-mapped (copy-on-write, so engines may treat it as a
+    regular writable array); a fresh cache is reused without decoding.
+    """
+    if not cache:
+        return decode(filepath)
+
+    target = decoded_path(filepath)
+    if not (os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(filepath)):
+        decode_to_file(filepath, target)
+    return np.load(target, mmap_mode='c')
+
+
+def duration_seconds(audio: np.ndarray) -> float:
+    return len(audio) / SAMPLE_RATE
@@ -0,0 +1,265 @@
+"""
+Chunked, parallel transcription of long recordings.
+
+Long audio is split at low-energy (silence) points into chunks of at most
+``TRANSCRIBE_CHUNK_SECONDS``. The chunks are transcribed in parallel by a
+pool of processes, each holding its own Whisper model, and their segments
+are shifted back to absolute timestamps so the stitched result has the same
+shape as a single ``model.transcribe`` call.
+"""
+import time
+import threading
+import multiprocessing
+import concurrent.futures
+from contextlib import contextmanager
+
+import numpy as np
+
+from app.transcriptions.audio import SAMPLE_RATE
+from app.transcriptions.cpu_budget import cpu_budget
+from app.transcriptions.model_pool import model_cache
+
+FRAME_SECONDS = 0.03        # RMS frame used to locate silence
+SEARCH_FRACTION = 0.2       # Look for a cut in the last 20% of each chunk
+
+
+def find_chunk_boundaries(audio: np.ndarray, max_chunk_seconds: float, sample_rate: int = SAMPLE_RATE):
+    """
+    Return [(start_sample, end_sample), ...] covering ``audio``. Each chunk
+    is at most ``max_chunk_seconds`` long and ends at the quietest frame of
+    its final ``SEARCH_FRACTION``, so cuts fall between words.
+    """
+    total = len(audio)
+    max_len = int(max_chunk_seconds * sample_rate)
+    if total <= max_len:
+        return [(0, total)]
+
+    frame = max(1, int(FRAME_SECONDS * sample_rate))
+    window = max(frame, int(max_len * SEARCH_FRACTION))
+
+    boundaries = []
+    start = 0
+    while total - start > max_len:
+        search_start = start + max_len - window
+        region = np.asarray(audio[search_start:start + max_len], dtype=np.float32)
+        usable = len(region) // frame * frame
+        energy = np.sqrt(np.mean(region[:usable].reshape(-1, frame) ** 2, axis=1))
+        cut = search_start + int(np.argmin(energy)) * frame + frame // 2
+        boundaries.append((start, cut))
+        start = cut
+    boundaries.append((start, total))
+    return boundaries
+
+
+def shift_segment(segment: dict, offset: float) -> dict:
+    """Copy of a Whisper segment with timestamps moved by ``offset`` seconds."""
+    shifted = {
+        'start': segment['start'] + offset,
+        'end': segment['end'] + offset,
+        'text': segment['text'],
+    }
+    if segment.get('words'):
+        shifted['words'] = [
+            dict(word, start=word['start'] + offset, end=word['end'] + offset)
+            for word in segment['words']
+        ]
+    return shifted
+
+
+# --- Child process side ---------------------------------------------------
+
+_chunk_model = None
+
+
+def _init_chunk_worker(model_name, engine_spec, num_threads):
+    """Load the Whisper model once per pool process."""
+    global _chunk_model
+    from app.transcriptions.engines import create_engine
+    _chunk_model = create_engine(engine_spec).load(model_name, num_threads)
+
+
+def _transcribe_chunk(source, start, end, transcribe_options):
+    # ``source`` is the path of the decoded .npy (cheap to share) or the
+    # chunk itself when the decode cache is disabled.
+    if isinstance(source, str):
+        chunk = np.load(source, mmap_mode='r')[start:end]
+    else:
+        chunk = source
+    result = _chunk_model.transcribe(np.array(chunk, dtype=np.float32), **transcribe_options)
+    offset = start / SAMPLE_RATE
+    return [shift_segment(s, offset) for s in result.get('segments', [])]
+
+
+# --- Parent side ----------------------------------------------------------
+
+class ChunkProcessPool:
+    """
+    A process pool for one Whisper model and engine, reused across jobs.
+    Every child process holds a full model copy, so the pool is an entry of
+    the model cache: its children count against MODEL_MEMORY_BUDGET_MB and
+    the processes are shut down when the pool is evicted, sits idle for
+    MODEL_IDLE_TIMEOUT or the worker exits. The next job starts them again.
+    """
+
+    def __init__(self, name, model_name, engine_spec, max_workers, cache=None):
+        from app.transcriptions.engines import create_engine
+
+        self.name = name
+        self.model_name = model_name
+        self.engine_spec = engine_spec
+        self.max_workers = max_workers
+        self.cache = cache
+        self.replica_bytes = create_engine(engine_spec).estimated_bytes(model_name)
+        self.pinned = False
+        self.last_used = time.monotonic()
+        self._executor = None
+        self._in_use = 0
+        self._lock = threading.Lock()
+
+    @property
+    def loaded_bytes(self):
+        return self.max_workers * self.replica_bytes if self._executor else 0
+
+    @contextmanager
+    def acquire(self):
+        """Yield the running executor, starting its processes if needed."""
+        self.last_used = time.monotonic()
+        if self.cache is not None:
+            self.cache.touch(self)
+        with self._lock:
+            self._in_use += 1
+            starting = self._executor is None
+        executor = None
+        try:
+            if starting and self.cache is not None:
+                # Like a pool's first replica, the processes start regardless;
+                # idle models of other pools make room for them if needed
+                self.cache.make_room(self, self.max_workers * self.replica_bytes)
+            with self._lock:
+                if self._executor is None:
+                    # Chunk processes share the cores with the diarization stage beside them
+                    threads = cpu_budget.quota(self.max_workers + 1)
+                    self._executor = concurrent.futures.ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        # torch does not survive fork() with live threads
+                        mp_context=multiprocessing.get_context('spawn'),
+                        initializer=_init_chunk_worker,
+                        initargs=(self.model_name, self.engine_spec, threads)
+                    )
+                executor = self._executor
+            yield executor
+        except concurrent.futures.BrokenExecutor:
+            # A child died (e.g. out of memory); start fresh next time
+            with self._lock:
+                if executor is not None and self._executor is executor:
+                    self._executor = None
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self.last_used = time.monotonic()
+
+    def unload_idle(self, keep=0) -> int:
+        """Shut the processes down if no job is using them. Returns bytes freed."""
+        with self._lock:
+            if keep or self._in_use or self._executor is None:
+                return 0
+            executor, self._executor = self._executor, None
+        executor.shutdown(wait=True)
+        print(f"[*] Stopped {self.max_workers} chunk process(es) of '{self.name}'.")
+        return self.max_workers * self.replica_bytes
+
+    def close(self):
+        """Stop the processes even if a job is using them (worker exit)."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            loaded = self.max_workers if self._executor else 0
+            return {
+                'size': self.max_workers,
+                'loaded': loaded,
+                'in_use': loaded if self._in_use else 0,
+                'replica_mb': round(self.replica_bytes / 2**20, 1),
+                'idle_seconds': round(time.monotonic() - self.last_used, 1),
+                'pinned': self.pinned
+            }
+
+
+def get_chunk_pool(model_name: str, engine_spec: str, max_workers: int) -> ChunkProcessPool:
+    """The process pool for a Whisper model and engine, registered in the model cache."""
+    key = f"chunks:{engine_spec}-{model_name}x{max_workers}"
+    return model_cache.get_entry(
+        key, lambda: ChunkProcessPool(key, model_name, engine_spec, max_workers, cache=model_cache)
+    )
+
+
+def _stitch(segments):
+    for index, segment in enumerate(segments):
+        segment['id'] = index
+    return {'text': ''.join(s['text'] for s in segments), 'segments': segments}
+
+
+def transcribe_chunked(audio: np.ndarray, model_name: str, engine_spec: str, chunk_seconds: float,
+                       max_workers: int, on_chunk=None, **transcribe_options) -> dict:
+    """
+    Transcribe ``audio`` chunk by chunk in a process pool. Returns a dict
+    shaped like Whisper's result: {'text': str, 'segments': [...]}.
+
+    ``on_chunk(segments_so_far, processed_seconds)`` is called each time the
+    next chunk in time order is done. If it raises (e.g. the job was
+    cancelled), chunks that have not started yet are dropped from the pool.
+    """
+    boundaries = find_chunk_boundaries(audio, chunk_seconds)
+    print(f"Transcrevendo {len(boundaries)} trechos em paralelo ({max_workers} processos)...")
+
+    source_path = audio.filename if isinstance(audio, np.memmap) else None
+    segments = []
+    with get_chunk_pool(model_name, engine_spec, max_workers).acquire() as executor:
+        futures = [
+            executor.submit(
+                _transcribe_chunk,
+                source_path or np.asarray(audio[start:end]),
+                start, end, transcribe_options
+            )
+            for start, end in boundaries
+        ]
+        try:
+            for future, (_, end) in zip(futures, boundaries):
+                segments.extend(future.result())
+                if on_chunk:
+                    on_chunk(segments, end / SAMPLE_RATE)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    return _stitch(segments)
+
+
+def transcribe_sequential(model, audio: np.ndarray, chunk_seconds: float,
+                          on_chunk=None, **transcribe_options) -> dict:
+    """
+    Transcribe ``audio`` with one in-process model, window by window, so
+    partial results can be reported while a long file is processed. The tail
+    of each window's text is passed as ``initial_prompt`` to the next one,
+    which keeps Whisper's context across windows.
+    """
+    segments = []
+    prompt = transcribe_options.pop('initial_prompt', None)
+    for start, end in find_chunk_boundaries(audio, chunk_seconds):
+        result = model.transcribe(np.array(audio[start:end], dtype=np.float32),
+                                  initial_prompt=prompt, **transcribe_options)
+        chunk_segments = [shift_segment(s, start / SAMPLE_RATE) for s in result.get('segments', [])]
+        segments.extend(chunk_segments)
+        if chunk_segments:
+            prompt = ''.join(s['text'] for s in chunk_segments)[-200:]
+        if on_chunk:
+            on_chunk(segments, end / SAMPLE_RATE)
+
+    return _stitch(segments)
@@ -0,0 +1,252 @@
+"""
+Storage compaction, retention and garbage collection for uploaded audio.
+
+``run_maintenance`` is called periodically by the inference worker (and by
+``scripts/compact_storage.py``). It:
+
+1. deletes audio of finished transcriptions older than AUDIO_RETENTION_DAYS;
+2. re-encodes WAV uploads whose transcriptions are all finished into
+   STORAGE_COMPACT_CODEC (FLAC by default). Retries and re-runs decode the
+   compact file on demand like any other upload. The content hash, and so
+   the result cache key, stays that of the original upload;
+3. deletes files no row references: abandoned resumable uploads, uploads
+   never transcribed, decoded ``.pcm16k.npy`` buffers of finished work and
+   stray files, once older than UPLOAD_ORPHAN_HOURS.
+
+Each pass is recorded in ``storage_maintenance_run`` with the space it
+reclaimed. Every step tolerates files vanishing underneath it, so passes
+running in several worker processes at once are harmless.
+"""
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, case
+
+from app.extensions import db
+from app.transcriptions.models import Transcription, AudioUpload, StorageMaintenanceRun
+from app.transcriptions import storage
+from app.transcriptions.audio import COMPACT_CODECS, DECODED_SUFFIX, decoded_path, encode_file
+
+ACTIVE_STATUSES = ('pending', 'processing')
+COMPACTABLE_EXTENSIONS = ('.wav',)
+
+
+def _remove(path: str) -> int:
+    """Delete a file, returning the bytes freed (0 if it was already gone)."""
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+        return size
+    except FileNotFoundError:
+        return 0
+
+
+def _audio_key():
+    # Rows older than content-addressed storage reference UPLOAD_FOLDER/<filename>
+    return func.coalesce(Transcription.storage_path, Transcription.filename)
+
+
+def _finished_paths():
+    """Stored audio paths whose transcriptions are all finished, with the newest timestamp."""
+    key = _audio_key()
+    active = func.sum(case((Transcription.status.in_(ACTIVE_STATUSES), 1), else_=0))
+    return db.session.query(key, func.max(Transcription.timestamp))\
+        .group_by(key)\
+        .having(active == 0)\
+        .all()
+
+
+def _located(paths) -> set:
+    # A row may still hold the pre-compaction path of its audio
+    return {os.path.normpath(storage.locate(path)) for path in paths if path}
+
+
+def _active_paths() -> set:
+    return _located(path for (path,) in db.session.query(_audio_key())
+                    .filter(Transcription.status.in_(ACTIVE_STATUSES)).distinct())
+
+
+def _referenced_paths() -> set:
+    paths = {path for (path,) in db.session.query(_audio_key()).distinct()}
+    for storage_path, filename in db.session.query(AudioUpload.storage_path, AudioUpload.filename)\
+            .filter(AudioUpload.status == 'complete'):
+        paths.add(storage_path or filename)
+    return _located(paths)
+
+
+def _repoint(old_path: str, new_path):
+    """Make every row that references ``old_path`` reference ``new_path``."""
+    Transcription.query.filter(Transcription.storage_path == old_path)\
+        .update({'storage_path': new_path}, synchronize_session=False)
+    AudioUpload.query.filter(AudioUpload.storage_path == old_path)\
+        .update({'storage_path': new_path}, synchronize_session=False)
+
+
+def compact(report: StorageMaintenanceRun):
+    codec = current_app.config.get('STORAGE_COMPACT_CODEC')
+    if not codec:
+        return
+    if codec not in COMPACT_CODECS:
+        print(f"[!] Unknown STORAGE_COMPACT_CODEC '{codec}', skipping compaction.")
+        return
+    bitrate = current_app.config.get('STORAGE_OPUS_BITRATE') or '32k'
+    _, extension = COMPACT_CODECS[codec]
+
+    for relative_path, _ in _finished_paths():
+        if not relative_path.startswith(storage.OBJECTS_DIR + os.sep) \
+                or not relative_path.lower().endswith(COMPACTABLE_EXTENSIONS):
+            continue
+        source = storage.absolute_path(relative_path)
+        if not os.path.exists(source):
+            # Compacted by another process; make sure the rows follow
+            current = storage.locate(relative_path)
+            if current != relative_path:
+                _repoint(relative_path, current)
+                db.session.commit()
+            continue
+
+        new_path = os.path.splitext(relative_path)[0] + '.' + extension
+        target = storage.absolute_path(new_path)
+        tmp = f"{target}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            encode_file(source, tmp, codec, bitrate)
+        except Exception as e:
+            _remove(tmp)
+            print(f"[!] Could not compact {relative_path}: {e}")
+            continue
+
+        before, after = os.path.getsize(source), os.path.getsize(tmp)
+        if after >= before:
+            _remove(tmp)
+            continue
+        os.replace(tmp, target)
+        _repoint(relative_path, new_path)
+        db.session.commit()
+        _remove(source)
+        _remove(decoded_path(source))
+
+        report.compacted_files += 1
+        report.compacted_bytes_before += before
+        report.compacted_bytes_after += after
+        report.reclaimed_bytes += before - after
+
+
+def expire(report: StorageMaintenanceRun):
+    days = int(current_app.config.get('AUDIO_RETENTION_DAYS') or 0)
+    if days <= 0:
+        return
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    recent_uploads = {path for (path,) in db.session.query(AudioUpload.storage_path)
+                      .filter(AudioUpload.created_at >= cutoff, AudioUpload.storage_path.isnot(None))}
+
+    for relative_path, newest in _finished_paths():
+        if newest is None or newest >= cutoff or relative_path in recent_uploads:
+            continue
+        current = storage.locate(relative_path)
+        source = storage.absolute_path(current)
+        freed = _remove(source) + _remove(decoded_path(source))
+        AudioUpload.query.filter(AudioUpload.storage_path.in_({relative_path, current}))\
+            .update({'status': 'expired'}, synchronize_session=False)
+        db.session.commit()
+        if freed:
+            report.expired_files += 1
+            report.reclaimed_bytes += freed
+
+
+def collect_garbage(report: StorageMaintenanceRun):
+    hours = int(current_app.config.get('UPLOAD_ORPHAN_HOURS') or 24)
+    cutoff = datetime.utcnow() - timedelta(hours=hours)
+
+    # Resumable uploads nobody finished
+    for upload in AudioUpload.query.filter(AudioUpload.status == 'uploading',
+                                           AudioUpload.updated_at < cutoff):
+        report.reclaimed_bytes += _remove(storage.partial_path(upload.upload_id))
+        storage.discard_partial(upload.upload_id)
+        db.session.delete(upload)
+        report.orphaned_files += 1
+    # Finished uploads never transcribed; their files go below if unshared
+    transcribed = db.session.query(Transcription.id).filter(
+        Transcription.storage_path == AudioUpload.storage_path).exists()
+    AudioUpload.query.filter(AudioUpload.status == 'complete',
+                             AudioUpload.created_at < cutoff,
+                             AudioUpload.storage_path.isnot(None),
+                             ~transcribed).delete(synchronize_session=False)
+    db.session.commit()
+
+    referenced = _referenced_paths()
+    active = _active_paths()
+    in_progress = {f"{upload_id}.part" for (upload_id,) in db.session.query(AudioUpload.upload_id)
+                   .filter(AudioUpload.status == 'uploading')}
+    folder = storage.upload_folder()
+    oldest_mtime = time.time() - hours * 3600
+
+    for directory, _, files in os.walk(folder):
+        for name in files:
+            path = os.path.join(directory, name)
+            relative_path = os.path.normpath(os.path.relpath(path, folder))
+            try:
+                if os.path.getmtime(path) > oldest_mtime:
+                    continue  # Grace period: may belong to a request in flight
+            except FileNotFoundError:
+                continue
+            if relative_path.startswith(storage.PARTIAL_DIR + os.sep):
+                orphan = name not in in_progress
+            elif name.endswith(DECODED_SUFFIX):
+                # Decoded buffers only speed up pending/running work
+                base = relative_path[:-len(DECODED_SUFFIX)]
+                orphan = base not in active
+            else:
+                orphan = relative_path not in referenced
+            if orphan:
+                freed = _remove(path)
+                if freed:
+                    report.orphaned_files += 1
+                    report.reclaimed_bytes += freed
+
+
+def run_maintenance() -> StorageMaintenanceRun:
+    """One full compaction / retention / GC pass. Returns its recorded report."""
+    report = StorageMaintenanceRun(
+        started_at=datetime.utcnow(),
+        compacted_files=0, compacted_bytes_before=0, compacted_bytes_after=0,
+        expired_files=0, orphaned_files=0, reclaimed_bytes=0
+    )
+    try:
+        expire(report)
+        compact(report)
+        collect_garbage(report)
+    except Exception as e:
+        db.session.rollback()
+        report.error_message = str(e)
+        print(f"[!] Storage maintenance failed: {e}")
+    report.finished_at = datetime.utcnow()
+    db.session.add(report)
+    db.session.commit()
+    print(f"[*] Storage maintenance: {report.expired_files} expired, "
+          f"{report.compacted_files} compacted, {report.orphaned_files} orphaned files removed, "
+          f"{report.reclaimed_bytes / 2**20:.1f} MB reclaimed.")
+    return report
+
+
+def storage_usage() -> dict:
+    """Bytes currently used under UPLOAD_FOLDER, by kind."""
+    usage = {'audio_bytes': 0, 'decoded_bytes': 0, 'partial_bytes': 0, 'files': 0}
+    folder = storage.upload_folder()
+    for directory, _, files in os.walk(folder):
+        for name in files:
+            path = os.path.join(directory, name)
+            try:
+                size = os.path.getsize(path)
+            except FileNotFoundError:
+                continue
+            usage['files'] += 1
+            if os.path.relpath(path, folder).startswith(storage.PARTIAL_DIR + os.sep):
+                usage['partial_bytes'] += size
+            elif name.endswith(DECODED_SUFFIX):
+                usage['decoded_bytes'] += size
+            else:
+                usage['audio_bytes'] += size
+    return usage
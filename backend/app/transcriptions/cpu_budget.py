@@ -0,0 +1,159 @@
+"""
+CPU thread budget shared by every inference stage of the worker process.
+
+Each job runs two CPU-heavy stages side by side (Whisper and pyannote), and
+by default every PyTorch workload sizes its intra-op thread pool to all
+cores. With a few jobs in flight that oversubscribes the machine several
+times over, and context switching and cache thrashing make the whole
+worker slower than running fewer jobs.
+
+The budget splits ``CPU_CORES`` between the stages currently running:
+starting or finishing a stage re-applies ``torch.set_num_threads`` with
+``cores // active stages`` (the setting is per process, so every running
+stage gets that share). Jobs are admitted only while each stage would
+still get ``CPU_MIN_THREADS_PER_STAGE`` threads; past that point another
+job only slows the ones already running, so it stays queued.
+
+A job's stages are not known before its audio is decoded: in chunked mode
+Whisper runs as TRANSCRIBE_CHUNK_WORKERS processes. Jobs are therefore
+admitted with their worst case (``job_stages``) and give the surplus back
+once transcribe_audio has decided whether to chunk.
+"""
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+from app.transcriptions.model_pool import get_setting
+
+# Whisper and diarization run concurrently within a job
+STAGES_PER_JOB = 2
+
+
+def job_stages(chunked: bool, chunk_workers: int = 1) -> int:
+    """Stages a job runs at once: Whisper (one per chunk process) plus diarization."""
+    return (max(1, int(chunk_workers)) if chunked else 1) + 1
+
+
+def available_cores() -> int:
+    """Cores this process may run on (honours taskset/cgroup CPU affinity)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on Windows/macOS
+        return os.cpu_count() or 1
+
+
+class CPUBudget:
+    """Thread quotas for the running stages and admission of new jobs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total_cores = available_cores()
+        self.min_threads = 2
+        self.interop_threads = 1
+        self.max_jobs = 0  # 0 = limited by the budget only
+        self.active_stages = 0  # Weight of the stages running now
+        self.reserved_stages = 0  # Stages of the jobs admitted so far
+        self._applied = None
+        self._interop_applied = False
+
+    def configure(self, cores=None, min_threads=None, max_jobs=None):
+        if cores is None:
+            cores = get_setting('CPU_CORES')
+        if min_threads is None:
+            min_threads = get_setting('CPU_MIN_THREADS_PER_STAGE')
+        if max_jobs is None:
+            max_jobs = get_setting('TRANSCRIPTION_WORKERS')
+        self.total_cores = int(cores or 0) or available_cores()
+        self.min_threads = max(1, int(min_threads or 2))
+        self.interop_threads = int(get_setting('CPU_INTEROP_THREADS') or 1)
+        self.max_jobs = int(max_jobs or 0)
+
+    @property
+    def max_stages(self) -> int:
+        """Stages that can run at once with at least min_threads each."""
+        return max(1, self.total_cores // self.min_threads)
+
+    def quota(self, stages: int) -> int:
+        """Threads each of ``stages`` concurrent stages gets."""
+        return max(1, self.total_cores // max(1, stages))
+
+    def steady_quota(self) -> int:
+        """
+        Per-stage threads once the worker is fully loaded. Used where the
+        thread count is fixed when a model is loaded (CTranslate2) or a
+        process starts.
+        """
+        stages = self.max_stages
+        if self.max_jobs:
+            stages = min(stages, self.max_jobs * STAGES_PER_JOB)
+        return self.quota(stages)
+
+    def try_admit(self, stages: int = STAGES_PER_JOB) -> bool:
+        """
+        Reserve room for a job's stages. A job is always admitted when
+        nothing else is running, so a tiny budget never stalls the queue.
+        """
+        with self._lock:
+            if self.reserved_stages and self.reserved_stages + stages > self.max_stages:
+                return False
+            self.reserved_stages += stages
+            return True
+
+    def release(self, stages: int = STAGES_PER_JOB):
+        with self._lock:
+            self.reserved_stages = max(0, self.reserved_stages - stages)
+
+    @contextmanager
+    def stage(self, name: str, weight: int = 1):
+        """
+        Run a CPU-heavy stage inside the budget; yields its thread quota.
+        ``weight`` counts stages running in other processes (chunk workers).
+        """
+        with self._lock:
+            self.active_stages += weight
+            threads = self.quota(self.active_stages)
+            self._apply(threads)
+        try:
+            yield threads
+        finally:
+            with self._lock:
+                self.active_stages -= weight
+                if self.active_stages:
+                    # The remaining stages take over the freed cores
+                    self._apply(self.quota(self.active_stages))
+
+    def refresh(self):
+        """Re-apply the current quota, e.g. once loading a model imported torch."""
+        with self._lock:
+            if self.active_stages:
+                self._apply(self.quota(self.active_stages))
+
+    def _apply(self, threads: int):
+        # Only touch torch if a model already imported it
+        torch = sys.modules.get('torch')
+        if torch is None:
+            return
+        if not self._interop_applied:
+            self._interop_applied = True
+            try:
+                torch.set_interop_threads(self.interop_threads)
+            except RuntimeError:
+                pass  # Can only be set before the first inter-op parallel work
+        if threads != self._applied:
+            torch.set_num_threads(threads)
+            self._applied = threads
+
+    def stats(self):
+        with self._lock:
+            return {
+                'total_cores': self.total_cores,
+                'min_threads_per_stage': self.min_threads,
+                'max_stages': self.max_stages,
+                'active_stages': self.active_stages,
+                'reserved_stages': self.reserved_stages,
+                'threads_per_stage': self.quota(self.active_stages),
+            }
+
+
+cpu_budget = CPUBudget()
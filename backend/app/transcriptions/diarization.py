@@ -1,60 +1,76 @@
 
-import os
-import threading
-import torch
-from pyannote.audio import Pipeline
+from app.transcriptions.model_pool import model_cache, get_setting
+from app.transcriptions.audio import SAMPLE_RATE
+from app.transcriptions.cpu_budget import cpu_budget
 
-# Singleton instance to avoid reloading model
-_diarization_pipeline = None
-_diarization_lock = threading.Lock()
+# Pretrained pipeline; part of the result cache key, so changing it
+# invalidates cached results
+DIARIZATION_PIPELINE = "pyannote/speaker-diarization-3.1"
 
-from flask import current_app
+# Approximate in-memory size of the pyannote pipeline (models + buffers)
+DIARIZATION_PIPELINE_BYTES = 300 * 2**20
 
 class DiarizationService:
     @staticmethod
-    def get_pipeline():
-        global _diarization_pipeline
-        if _diarization_pipeline is None:
-            # Try to get from app config (if in context), fallback to env
-            try:
-                hf_token = current_app.config.get("HF_TOKEN")
-            except RuntimeError:
-                # If queried outside app context
-                hf_token = os.environ.get("HF_TOKEN")
-            if not hf_token:
-                print("WARNING: HF_TOKEN not found. Diarization model download might fail if not cached.")
+    def get_pool():
+        """Pool of pipeline replicas, managed by the shared model cache."""
+        size = int(get_setting('DIARIZATION_REPLICAS') or 0) or int(get_setting('TRANSCRIPTION_WORKERS') or 3)
+        return model_cache.get_pool(
+            'diarization',
+            loader=DiarizationService.load_pipeline,
+            size=size,
+            estimated_bytes=DIARIZATION_PIPELINE_BYTES
+        )
+
+    @staticmethod
+    def load_pipeline():
+        """Load a fresh pyannote pipeline instance (one pool replica)."""
+        # Imported here so that importing this module does not load torch/pyannote
+        import torch
+        from pyannote.audio import Pipeline
+
+        hf_token = get_setting("HF_TOKEN")
+        if not hf_token:
+            print("WARNING: HF_TOKEN not found. Diarization model download might fail if not cached.")
+        
+        print(f"Loading Diarization Pipeline ({DIARIZATION_PIPELINE})...")
+        try:
+            pipeline = Pipeline.from_pretrained(
+                DIARIZATION_PIPELINE,
+                token=hf_token
+            )
             
-            print("Loading Diarization Pipeline (pyannote/speaker-diarization-3.1)...")
-            try:
-                _diarization_pipeline = Pipeline.from_pretrained(
-                    "pyannote/speaker-diarization-3.1",
-                    token=hf_token
-                )
+            # Use GPU if available
+            if torch.cuda.is_available():
+                pipeline.to(torch.device("cuda"))
+                print("Diarization using CUDA")
+            else:
+                print("Diarization using CPU")
                 
-                # Use GPU if available
-                if torch.cuda.is_available():
-                    _diarization_pipeline.to(torch.device("cuda"))
-                    print("Diarization using CUDA")
-                else:
-                    print("Diarization using CPU")
-                    
-            except Exception as e:
-                print(f"Error loading diarization pipeline: {e}")
-                raise e
-                
-        return _diarization_pipeline
+        except Exception as e:
+            print(f"Error loading diarization pipeline: {e}")
+            raise e
+        
+        # torch is imported now; give it the running stages' thread quota
+        cpu_budget.refresh()
+        return pipeline
 
     @staticmethod
-    def diarize(audio_path):
+    def diarize(audio, hook=None):
         """
-        Performs speaker diarization on an audio file.
+        Performs speaker diarization on an audio file path or on an already
+        decoded 16 kHz mono float32 array (see audio.load_audio).
+        ``hook`` is passed to the pyannote pipeline, which calls it after each
+        step and batch; an exception raised there aborts the run.
         Returns a list of segments: [{'start': float, 'end': float, 'speaker': str}]
         """
-        pipeline = DiarizationService.get_pipeline()
-        
-        # Run inference
-        with _diarization_lock:
-            diarization = pipeline(audio_path)
+        if not isinstance(audio, str):
+            import torch
+            audio = {'waveform': torch.from_numpy(audio)[None, :], 'sample_rate': SAMPLE_RATE}
+
+        # Run inference on a checked-out replica; other workers use their own
+        with DiarizationService.get_pool().acquire() as pipeline:
+            diarization = pipeline(audio, hook=hook) if hook else pipeline(audio)
         
         segments = []
         # "turn" is the segment, "track" is the speaker ID, "speaker" is the speaker label
@@ -0,0 +1,186 @@
+"""
+Speech-to-text engines.
+
+An engine loads a Whisper model and returns an object whose
+``transcribe(audio, **options)`` behaves like openai-whisper's: it takes a
+16 kHz mono float32 array plus ``language``, ``task``, ``word_timestamps``
+and ``initial_prompt``, and returns ``{'text': str, 'segments': [...]}``
+with ``id``, ``start``, ``end``, ``text`` and, with word timestamps,
+``words`` (``word``, ``start``, ``end``, ``probability``) per segment. The
+rest of the pipeline (model pools, chunking, speaker merge, result cache)
+only relies on that shape.
+
+Engines are named by a spec string, ``<engine>`` or ``<engine>:<compute type>``:
+
+* ``whisper`` - openai-whisper on PyTorch, FP32 on CPU (default);
+* ``faster-whisper:int8`` - CTranslate2 via faster-whisper, with ``int8``,
+  ``int8_float32``, ``int16`` or ``float32`` weights. Several times faster on
+  CPU at a fraction of the memory.
+
+WHISPER_ENGINE picks the engine for the deployment, and
+WHISPER_ENGINE_MODELS overrides it per model size, e.g.
+``"large=faster-whisper:int8,medium=faster-whisper:int16"``. Without a
+compute type, faster-whisper uses WHISPER_COMPUTE_TYPE.
+"""
+import importlib.util
+
+from app.transcriptions.model_pool import get_setting
+
+DEFAULT_ENGINE = 'whisper'
+FASTER_WHISPER = 'faster-whisper'
+COMPUTE_TYPES = ('int8', 'int8_float32', 'int16', 'float32')
+
+# Approximate FP32 size of each Whisper model, used for the memory budget
+# until the first replica is loaded and measured.
+WHISPER_MODEL_BYTES = {
+    'tiny': 150 * 2**20,
+    'base': 290 * 2**20,
+    'small': 970 * 2**20,
+    'medium': 3 * 2**30,
+    'large': 6 * 2**30,
+}
+
+# Resident size relative to FP32 for each CTranslate2 compute type
+COMPUTE_TYPE_SCALE = {'int8': 0.3, 'int8_float32': 0.3, 'int16': 0.55, 'float32': 1.0}
+
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def _model_bytes(model_name: str) -> int:
+    # 'large-v3' and friends are sized like 'large'
+    return WHISPER_MODEL_BYTES.get(model_name.split('-')[0], 0)
+
+
+class WhisperEngine:
+    """openai-whisper: the PyTorch reference implementation."""
+    name = DEFAULT_ENGINE
+
+    def __init__(self, compute_type=None):
+        self.compute_type = None
+
+    @property
+    def spec(self) -> str:
+        return self.name
+
+    def available(self) -> bool:
+        return _available('whisper')
+
+    def estimated_bytes(self, model_name: str) -> int:
+        return _model_bytes(model_name)
+
+    def load(self, model_name: str, num_threads: int = 0):
+        if not self.available():
+            raise RuntimeError("A biblioteca Whisper não está instalada. Instale com: pip install openai-whisper")
+        import torch
+        import whisper
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        # The model's own transcribe() already returns the shared result shape
+        return whisper.load_model(model_name)
+
+
+class FasterWhisperModel:
+    """A faster-whisper model behind the openai-whisper ``transcribe`` interface."""
+
+    def __init__(self, model):
+        self.model = model
+
+    def transcribe(self, audio, language=None, task='transcribe', word_timestamps=False,
+                   initial_prompt=None, **options):
+        segments, _ = self.model.transcribe(
+            audio, language=language, task=task, word_timestamps=word_timestamps,
+            initial_prompt=initial_prompt, **options
+        )
+        # ``segments`` is a generator: decoding happens while it is consumed
+        result = []
+        for index, segment in enumerate(segments):
+            item = {
+                'id': index,
+                'start': segment.start,
+                'end': segment.end,
+                'text': segment.text,
+            }
+            if word_timestamps and segment.words:
+                item['words'] = [
+                    {'word': w.word, 'start': w.start, 'end': w.end, 'probability': w.probability}
+                    for w in segment.words
+                ]
+            result.append(item)
+        return {'text': ''.join(s['text'] for s in result), 'segments': result}
+
+
+class FasterWhisperEngine:
+    """faster-whisper (CTranslate2) with quantized weights, CPU only."""
+    name = FASTER_WHISPER
+
+    def __init__(self, compute_type=None):
+        compute_type = compute_type or get_setting('WHISPER_COMPUTE_TYPE') or 'int8'
+        if compute_type not in COMPUTE_TYPES:
+            raise ValueError(f"Tipo de computação inválido para faster-whisper: {compute_type}")
+        self.compute_type = compute_type
+
+    @property
+    def spec(self) -> str:
+        return f"{self.name}:{self.compute_type}"
+
+    def available(self) -> bool:
+        return _available('faster_whisper')
+
+    def estimated_bytes(self, model_name: str) -> int:
+        return int(_model_bytes(model_name) * COMPUTE_TYPE_SCALE[self.compute_type])
+
+    def load(self, model_name: str, num_threads: int = 0):
+        if not self.available():
+            raise RuntimeError("A biblioteca faster-whisper não está instalada. Instale com: pip install faster-whisper")
+        from faster_whisper import WhisperModel
+        model = WhisperModel(model_name, device='cpu', compute_type=self.compute_type,
+                             cpu_threads=num_threads or 0)
+        return FasterWhisperModel(model)
+
+
+ENGINES = {
+    WhisperEngine.name: WhisperEngine,
+    FasterWhisperEngine.name: FasterWhisperEngine,
+}
+
+
+def create_engine(spec: str):
+    """Engine for a spec string such as 'whisper' or 'faster-whisper:int8'."""
+    name, _, compute_type = (spec or DEFAULT_ENGINE).strip().partition(':')
+    if name not in ENGINES:
+        raise ValueError(f"Engine de transcrição desconhecida: {name}")
+    return ENGINES[name](compute_type or None)
+
+
+def parse_engine_map(spec) -> dict:
+    """Parse 'large=faster-whisper:int8,base=whisper' into {'large': 'faster-whisper:int8', ...}."""
+    if isinstance(spec, dict):
+        return dict(spec)
+    mapping = {}
+    for item in (spec or '').split(','):
+        if '=' in item:
+            model_name, engine = item.split('=', 1)
+            mapping[model_name.strip()] = engine.strip()
+    return mapping
+
+
+def engine_spec(model_name: str) -> str:
+    """Configured engine spec for a model size."""
+    overrides = parse_engine_map(get_setting('WHISPER_ENGINE_MODELS', ''))
+    return overrides.get(model_name) or get_setting('WHISPER_ENGINE') or DEFAULT_ENGINE
+
+
+def get_engine(model_name: str):
+    return create_engine(engine_spec(model_name))
+
+
+def model_label(model_name: str, engine=None) -> str:
+    """
+    Identifies a model and the engine running it, e.g. 'whisper-base' or
+    'faster-whisper:int8-large'. Different engines give slightly different
+    text, so this is also what results are cached under.
+    """
+    engine = engine or get_engine(model_name)
+    return f"{engine.spec}-{model_name}"
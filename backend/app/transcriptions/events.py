@@ -0,0 +1,144 @@
+"""
+Local pub/sub for transcription status events (Server-Sent Events).
+
+Each web process keeps one EventBroker. Browsers subscribe through
+``GET /transcriptions/events`` and receive status/progress/completion events
+for their own jobs. Events come from two sources:
+
+* the task queue, which publishes directly when it runs in this process
+  (``EMBEDDED_WORKER``);
+* a watcher thread that, while anyone is subscribed, runs a single query per
+  tick for the subscribed users' active jobs and publishes what changed,
+  which covers jobs run by the standalone worker process.
+
+The broker remembers the last state sent per job, so both sources can fire
+for the same change without duplicating events.
+"""
+import queue
+import threading
+import time
+
+from sqlalchemy.orm import load_only
+
+from app.transcriptions.models import Transcription
+
+ACTIVE_STATUSES = ('pending', 'processing')
+
+# How long a final state stays remembered after it was sent, so the other
+# source (the watcher's next tick) does not send it again
+FINISHED_TTL_SECONDS = 60
+
+
+def status_payload(transcription) -> dict:
+    """Small status event for one transcription (no transcript text)."""
+    return {
+        'id': transcription.id,
+        'status': transcription.status,
+        'progress': transcription.progress,
+        'processed_seconds': transcription.processed_seconds,
+        'duration': transcription.duration,
+        'eta_seconds': transcription.eta_seconds(),
+        'error_message': transcription.error_message,
+        'model_name': transcription.model_name,
+    }
+
+
+class EventBroker:
+    def __init__(self):
+        self._subscribers = {}  # user_id -> set of queue.Queue
+        self._last_sent = {}    # transcription id -> (status, progress)
+        self._finished = {}     # transcription id -> when its final state is forgotten
+        self._lock = threading.Lock()
+        self._watcher = None
+        self.app = None
+
+    def subscribe(self, user_id, app=None) -> queue.Queue:
+        events = queue.Queue(maxsize=1000)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(events)
+            if app is not None and self._watcher is None:
+                self.app = app
+                self._watcher = threading.Thread(target=self._watch, daemon=True)
+                self._watcher.start()
+        return events
+
+    def unsubscribe(self, user_id, events):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers:
+                subscribers.discard(events)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def publish(self, user_id, payload: dict):
+        """Send a status payload to the user's subscribers if it changed."""
+        key = (payload['status'], payload['progress'])
+        now = time.monotonic()
+        with self._lock:
+            self._expire_finished(now)
+            if self._last_sent.get(payload['id']) == key:
+                return
+            self._last_sent[payload['id']] = key
+            if payload['status'] in ACTIVE_STATUSES:
+                self._finished.pop(payload['id'], None)  # Retried
+            else:
+                # Terminal state: kept a while for the watcher's next tick
+                self._finished[payload['id']] = now + self._finished_ttl()
+            subscribers = list(self._subscribers.get(user_id, ()))
+
+        event = payload['status'] if payload['status'] in ('completed', 'failed', 'cancelled') else 'status'
+        for events in subscribers:
+            try:
+                events.put_nowait((event, payload))
+            except queue.Full:
+                pass  # Slow client; it resynchronizes on reconnect
+
+    def _finished_ttl(self):
+        interval = self.app.config.get('EVENTS_POLL_INTERVAL', 2) if self.app else 2
+        return max(FINISHED_TTL_SECONDS, 3 * interval)
+
+    def _expire_finished(self, now):
+        # Caller holds self._lock
+        for transcription_id, expires_at in list(self._finished.items()):
+            if expires_at <= now:
+                del self._finished[transcription_id]
+                self._last_sent.pop(transcription_id, None)
+
+    def publish_transcription(self, transcription):
+        self.publish(transcription.user_id, status_payload(transcription))
+
+    def _watch(self):
+        """Publish changes of subscribed users' jobs made by other processes."""
+        watched = set()  # ids seen active on the previous tick
+        while True:
+            interval = self.app.config.get('EVENTS_POLL_INTERVAL', 2)
+            threading.Event().wait(interval)
+            with self._lock:
+                user_ids = list(self._subscribers)
+            if not user_ids:
+                watched.clear()
+                continue
+            try:
+                with self.app.app_context():
+                    # One query for everyone: active jobs plus the ones that
+                    # were active last tick (to catch their final state)
+                    condition = Transcription.status.in_(ACTIVE_STATUSES)
+                    if watched:
+                        condition = condition | Transcription.id.in_(watched)
+                    rows = Transcription.query\
+                        .options(load_only(
+                            Transcription.id, Transcription.user_id, Transcription.status,
+                            Transcription.progress, Transcription.processed_seconds,
+                            Transcription.duration, Transcription.started_at,
+                            Transcription.error_message, Transcription.model_name))\
+                        .filter(Transcription.user_id.in_(user_ids), condition)\
+                        .all()
+                    watched = {t.id for t in rows if t.status in ACTIVE_STATUSES}
+                    for transcription in rows:
+                        self.publish_transcription(transcription)
+            except Exception as e:
+                print(f"[!] Error watching transcription events: {e}")
+
+
+# Process-wide broker
+broker = EventBroker()
@@ -0,0 +1,175 @@
+"""
+Transcript export in TXT, SRT, WebVTT and JSON.
+
+Each format is a generator that yields the file piece by piece while
+segments are read from the database in batches, so a 10-hour transcript is
+exported in constant memory and the first bytes go out immediately.
+
+Renders of completed transcriptions are cached on disk under
+EXPORT_CACHE_FOLDER as ``<transcription id>/<revision>.<format>``, written
+while the first request streams. The revision changes whenever the
+transcript does (completion, speaker rename), so a stale render is never
+served; ``invalidate`` drops the old files right away.
+"""
+import json
+import os
+import shutil
+import uuid
+
+from flask import current_app
+
+from app.transcriptions.models import Transcription, TranscriptionSegment
+
+SEGMENT_BATCH = 500
+BLOCK_SIZE = 64 * 1024  # Bytes per chunk sent to the client
+
+FORMATS = {
+    # format: (mimetype, file extension)
+    'txt': ('text/plain', 'txt'),
+    'srt': ('application/x-subrip', 'srt'),
+    'vtt': ('text/vtt', 'vtt'),
+    'json': ('application/json', 'json'),
+}
+
+
+def _segments(transcription: Transcription):
+    # Plain rows rather than ORM objects: cheaper per segment, nothing tracked
+    query = transcription.segments_query().with_entities(
+        TranscriptionSegment.start, TranscriptionSegment.end,
+        TranscriptionSegment.speaker, TranscriptionSegment.text
+    )
+    return query.yield_per(SEGMENT_BATCH)
+
+
+def _mmss(seconds):
+    return f"{int(seconds // 60):02d}:{int(seconds % 60):02d}"
+
+
+def _timestamp(seconds, separator):
+    millis = int(round(max(seconds, 0) * 1000))
+    hours, millis = divmod(millis, 3_600_000)
+    minutes, millis = divmod(millis, 60_000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+
+def render_txt(transcription: Transcription):
+    """``[MM:SS - MM:SS] Speaker: text`` per segment, or the raw text."""
+    empty = True
+    for segment in _segments(transcription):
+        empty = False
+        yield f"[{_mmss(segment.start)} - {_mmss(segment.end)}] {segment.speaker}: {segment.text.strip()}\n"
+    if empty:
+        yield transcription.text or ''
+
+
+def render_srt(transcription: Transcription):
+    for index, segment in enumerate(_segments(transcription), start=1):
+        yield (f"{index}\n"
+               f"{_timestamp(segment.start, ',')} --> {_timestamp(segment.end, ',')}\n"
+               f"{segment.speaker}: {segment.text.strip()}\n\n")
+
+
+def render_vtt(transcription: Transcription):
+    yield "WEBVTT\n\n"
+    for segment in _segments(transcription):
+        speaker = segment.speaker.replace('>', '')
+        yield (f"{_timestamp(segment.start, '.')} --> {_timestamp(segment.end, '.')}\n"
+               f"<v {speaker}>{segment.text.strip()}\n\n")
+
+
+def render_json(transcription: Transcription):
+    header = {
+        'id': transcription.id,
+        'filename': transcription.filename,
+        'timestamp': transcription.timestamp.isoformat() if transcription.timestamp else None,
+        'duration': transcription.duration,
+        'text': transcription.text or '',
+    }
+    # Everything but the closing brace, then the segments array streamed in
+    yield json.dumps(header, ensure_ascii=False)[:-1] + ', "segments": ['
+    separator = ''
+    for segment in _segments(transcription):
+        yield separator + json.dumps({
+            'start': segment.start,
+            'end': segment.end,
+            'text': segment.text,
+            'speaker': segment.speaker
+        }, ensure_ascii=False)
+        separator = ', '
+    yield ']}'
+
+
+RENDERERS = {
+    'txt': render_txt,
+    'srt': render_srt,
+    'vtt': render_vtt,
+    'json': render_json,
+}
+
+
+def _cache_dir(transcription_id: int) -> str:
+    return os.path.join(current_app.config['EXPORT_CACHE_FOLDER'], str(transcription_id))
+
+
+def cached_path(transcription: Transcription, fmt: str):
+    """Path of the cached render, or None if the transcript is not cacheable/cached."""
+    if not current_app.config.get('EXPORT_CACHE_ENABLED', True) or transcription.status != 'completed':
+        return None
+    path = os.path.join(_cache_dir(transcription.id), f"{transcription.revision or 0}.{FORMATS[fmt][1]}")
+    return path if os.path.exists(path) else None
+
+
+def _blocks(pieces):
+    """Group the small per-segment strings into BLOCK_SIZE encoded chunks."""
+    buffer, size = [], 0
+    for piece in pieces:
+        data = piece.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= BLOCK_SIZE:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def stream(transcription: Transcription, fmt: str):
+    """
+    Encoded chunks of the render. For completed transcripts the output is
+    also written to the cache; the file only becomes visible once complete.
+    """
+    blocks = _blocks(RENDERERS[fmt](transcription))
+    if not current_app.config.get('EXPORT_CACHE_ENABLED', True) or transcription.status != 'completed':
+        yield from blocks
+        return
+
+    directory = _cache_dir(transcription.id)
+    target = os.path.join(directory, f"{transcription.revision or 0}.{FORMATS[fmt][1]}")
+    tmp = f"{target}.{uuid.uuid4().hex[:8]}.tmp"
+    os.makedirs(directory, exist_ok=True)
+    completed = False
+    try:
+        with open(tmp, 'wb') as out:
+            for block in blocks:
+                out.write(block)
+                yield block
+        completed = True
+    finally:
+        # A client that disconnects mid-download leaves no partial render
+        if completed:
+            os.replace(tmp, target)
+        elif os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def read_blocks(path: str):
+    """A cached render, read back in BLOCK_SIZE chunks."""
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            yield block
+
+
+def invalidate(transcription_id: int):
+    """Drop every cached render of a transcription."""
+    shutil.rmtree(_cache_dir(transcription_id), ignore_errors=True)
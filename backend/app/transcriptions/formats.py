@@ -0,0 +1,102 @@
+"""
+Supported upload formats.
+
+Files are recognised by their content (magic bytes), never by the MIME type
+the client sends; the file name extension is only a first filter. Every
+format listed here is decoded by ffmpeg (see audio.py).
+"""
+import os
+import struct
+from typing import Optional
+
+# Extensions accepted in file names
+EXTENSIONS = {'wav', 'mp3', 'm4a', 'aac', 'mp4', 'ogg', 'oga', 'opus', 'flac', 'webm'}
+
+# Bytes needed to recognise every format below
+SNIFF_BYTES = 64
+
+SUPPORTED_DESCRIPTION = 'WAV, MP3, M4A/AAC, OGG/Opus, FLAC ou WebM'
+
+
+def sniff(head: bytes) -> Optional[str]:
+    """
+    Canonical extension of the audio format starting with ``head`` (the
+    first SNIFF_BYTES of the file), or None if it is not a supported format.
+    """
+    if len(head) < 12:
+        return None
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        return 'wav'
+    if head[:4] == b'fLaC':
+        return 'flac'
+    if head[:4] == b'OggS':
+        # The first page of an Opus stream carries the OpusHead packet
+        return 'opus' if b'OpusHead' in head else 'ogg'
+    if head[:4] == b'\x1a\x45\xdf\xa3':
+        return 'webm'  # EBML: WebM or Matroska audio
+    if head[4:8] == b'ftyp':
+        return 'm4a'  # MP4/M4A container (AAC, ALAC...)
+    if head[:3] == b'ID3':
+        return 'mp3'
+    if head[0] == 0xFF:
+        if head[1] & 0xF6 == 0xF0:
+            return 'aac'  # ADTS frame sync, layer 00
+        if head[1] & 0xE0 == 0xE0 and head[1] & 0x06:
+            return 'mp3'  # MPEG audio frame sync, layer I-III
+    return None
+
+
+# Typical bitrates (bytes per second) of compressed formats, used to guess
+# the duration of a file before it is decoded
+TYPICAL_BYTE_RATES = {
+    'mp3': 128_000 // 8,
+    'm4a': 128_000 // 8,
+    'aac': 128_000 // 8,
+    'mp4': 128_000 // 8,
+    'ogg': 96_000 // 8,
+    'oga': 96_000 // 8,
+    'opus': 48_000 // 8,
+    'webm': 64_000 // 8,
+    'flac': 700_000 // 8,
+}
+
+HEADER_BYTES = 4096
+
+
+def estimate_duration(path: str) -> Optional[float]:
+    """
+    Approximate duration in seconds, without decoding: exact for WAV and
+    FLAC (from their headers), from a typical bitrate for other formats.
+    Used to order the job queue; None if the file cannot be read.
+    """
+    try:
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            head = f.read(HEADER_BYTES)
+    except OSError:
+        return None
+    extension = sniff(head[:SNIFF_BYTES])
+
+    if extension == 'wav':
+        # Walk the RIFF chunks for the byte rate (fmt) and the data size
+        byte_rate, data_size, offset = None, None, 12
+        while offset + 8 <= len(head):
+            chunk_id, chunk_size = head[offset:offset + 4], struct.unpack('<I', head[offset + 4:offset + 8])[0]
+            if chunk_id == b'fmt ' and offset + 20 <= len(head):
+                byte_rate = struct.unpack('<I', head[offset + 16:offset + 20])[0]
+            elif chunk_id == b'data':
+                data_size = min(chunk_size, size - offset - 8)
+                break
+            offset += 8 + chunk_size + (chunk_size & 1)
+        if byte_rate:
+            return (data_size if data_size is not None else size) / byte_rate
+    elif extension == 'flac' and len(head) >= 26:
+        # STREAMINFO: 20-bit sample rate ... 36-bit total samples, from byte 18
+        bits = int.from_bytes(head[18:26], 'big')
+        sample_rate = bits >> 44
+        total_samples = bits & ((1 << 36) - 1)
+        if sample_rate and total_samples:
+            return total_samples / sample_rate
+
+    byte_rate = TYPICAL_BYTE_RATES.get(extension)
+    return size / byte_rate if byte_rate else None
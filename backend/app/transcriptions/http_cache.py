@@ -0,0 +1,117 @@
+"""
+Conditional requests and response compression for transcript payloads.
+
+Read endpoints compute a cheap fingerprint of what they would return (ids,
+revisions, status, ``updated_at``) *before* loading segments or serializing
+anything. When it matches the client's ``If-None-Match`` (or the data is not
+newer than ``If-Modified-Since``) they answer 304 with no body. ETags are
+weak because the same payload may be sent gzip- or brotli-encoded.
+
+``compress_response`` runs after every request of the blueprint and
+encodes JSON and text responses with brotli (if the optional ``brotli``
+package is installed) or gzip, when the client accepts it. Streamed
+responses (exports) are compressed on the fly, chunk by chunk.
+"""
+import hashlib
+import zlib
+from datetime import timezone
+
+from flask import current_app, request, make_response
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/plain', 'text/vtt', 'application/x-subrip'}
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def make_etag(*parts) -> str:
+    return hashlib.sha1('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest()[:24]
+
+
+def _as_utc(moment):
+    if moment is None:
+        return None
+    return moment.replace(tzinfo=timezone.utc, microsecond=0)
+
+
+def not_modified(etag: str, last_modified=None):
+    """
+    A 304 response if the client's copy is current, else None.
+    ``last_modified`` is a naive UTC datetime (how the models store time).
+    """
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified is not None:
+        fresh = _as_utc(last_modified) <= request.if_modified_since
+    else:
+        fresh = False
+    if not fresh:
+        return None
+    response = make_response('', 304)
+    return tag(response, etag, last_modified)
+
+
+def tag(response, etag: str, last_modified=None):
+    """Attach validators; clients must revalidate before reusing the payload."""
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = _as_utc(last_modified)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _choose_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compress_stream(chunks, encoding):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            data = compressor.process(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+def compress_response(response):
+    if response.status_code != 200 or response.direct_passthrough \
+            or 'Content-Encoding' in response.headers \
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+
+    encoding = _choose_encoding()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < current_app.config.get('COMPRESS_MIN_SIZE', 1024):
+            return response
+        if encoding == 'br':
+            response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+        else:
+            compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            response.set_data(compressor.compress(data) + compressor.flush())
+    response.headers['Content-Encoding'] = encoding
+    return response
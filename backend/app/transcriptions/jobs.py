@@ -0,0 +1,302 @@
+"""
+Durable, lease-based job queue stored in the database.
+
+Every process (web or worker) talks to the same ``transcription_job`` table,
+so queued work survives restarts and a job is only ever processed by the
+worker currently holding its lease. Claims use a compare-and-swap UPDATE,
+which works on SQLite as well as on databases with row locking.
+
+Jobs are not claimed in submission order. ``claim_job`` picks, among the
+claimable jobs:
+
+1. one of the user with the fewest jobs running right now (fair share: a
+   user who submitted 50 files gets one slot while others are waiting);
+2. within that, the lowest score: the expected audio duration (shortest
+   job first), minus a boost for interactive submissions and retries, minus
+   the time already waited times SCHEDULER_AGING_RATE, so long recordings
+   are delayed but never starved.
+"""
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import or_, and_, func
+
+from app.extensions import db
+from app.transcriptions.models import Transcription, TranscriptionJob
+from app.transcriptions import storage, formats, search
+
+
+PRIORITY_NORMAL = 'normal'
+PRIORITY_INTERACTIVE = 'interactive'  # A user waiting on a single file
+PRIORITY_RETRY = 'retry'  # Re-submitted by the user after a failure
+
+# Assumed audio length of jobs whose duration could not be estimated
+DEFAULT_EXPECTED_DURATION = 600
+
+
+def make_worker_id() -> str:
+    """Unique lease owner name for this process/queue instance."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def resolve_model_name(user_id: int) -> str:
+    """Whisper model configured by the user, or the deployment default."""
+    # Avoid circular import
+    from app.auth.user_preferences import UserPreferences
+
+    prefs = UserPreferences.query.filter_by(user_id=user_id).first()
+    if prefs:
+        return prefs.whisper_model
+    return current_app.config.get('WHISPER_MODEL', 'base')
+
+
+def submission_priority(user_id: int, requested=None) -> str:
+    """
+    Priority of a new submission: as requested ('interactive' or 'batch'),
+    else interactive when it is the only job the user has waiting.
+    """
+    if requested == PRIORITY_INTERACTIVE:
+        return PRIORITY_INTERACTIVE
+    if requested == 'batch':
+        return PRIORITY_NORMAL
+    waiting = TranscriptionJob.query\
+        .join(Transcription, Transcription.id == TranscriptionJob.transcription_id)\
+        .filter(Transcription.user_id == user_id,
+                TranscriptionJob.status.in_(('queued', 'running')))\
+        .count()
+    return PRIORITY_NORMAL if waiting else PRIORITY_INTERACTIVE
+
+
+def enqueue_job(transcription: Transcription, model_name: str,
+                priority: str = PRIORITY_NORMAL) -> TranscriptionJob:
+    """
+    Create (or reset) the job for a transcription. The caller commits, so the
+    job and the Transcription row are written in the same transaction.
+    """
+    job = TranscriptionJob.query.filter_by(transcription_id=transcription.id).first()
+    if job is None:
+        job = TranscriptionJob(transcription_id=transcription.id)
+        db.session.add(job)
+
+    job.model_name = model_name
+    job.priority = priority
+    job.expected_duration = transcription.duration or _estimate_duration(transcription)
+    job.status = 'queued'
+    job.attempts = 0
+    job.max_attempts = current_app.config.get('JOB_MAX_ATTEMPTS', 3)
+    job.lease_owner = None
+    job.lease_expires_at = None
+    job.heartbeat_at = None
+    return job
+
+
+def _estimate_duration(transcription: Transcription):
+    relative_path = storage.locate(transcription.storage_path or transcription.filename)
+    return formats.estimate_duration(storage.absolute_path(relative_path))
+
+
+def _claimable_filter(now):
+    return or_(
+        TranscriptionJob.status == 'queued',
+        and_(TranscriptionJob.status == 'running', TranscriptionJob.lease_expires_at < now)
+    )
+
+
+def claim_job(owner: str, lease_seconds: int, max_tries: int = 5):
+    """
+    Atomically claim the next job for ``owner``: among the claimable jobs,
+    one of the user with the fewest jobs running, then the lowest score
+    (shortest expected audio first, less interactive/retry boosts and
+    aging; see _next_candidate and _score). A candidate someone else took
+    in the meantime is skipped and the next one picked, up to ``max_tries``.
+
+    Returns the claimed TranscriptionJob, or None when nothing is claimable.
+    Expired leases that already used up ``max_attempts`` are marked failed
+    instead of being handed out again.
+    """
+    for _ in range(max_tries):
+        now = datetime.utcnow()
+        candidate = _next_candidate(now)
+        if candidate is None:
+            return None
+
+        if candidate.attempts >= candidate.max_attempts:
+            _give_up(candidate, now)
+            continue
+
+        # Compare-and-swap: only succeeds if nobody claimed it in between
+        claimed = TranscriptionJob.query\
+            .filter(TranscriptionJob.id == candidate.id,
+                    TranscriptionJob.attempts == candidate.attempts,
+                    _claimable_filter(now))\
+            .update({
+                'status': 'running',
+                'attempts': candidate.attempts + 1,
+                'lease_owner': owner,
+                'lease_expires_at': now + timedelta(seconds=lease_seconds),
+                'heartbeat_at': now,
+                'updated_at': now,
+            }, synchronize_session=False)
+
+        if claimed != 1:
+            db.session.rollback()
+            continue
+
+        Transcription.query.filter_by(id=candidate.transcription_id)\
+            .update({'status': 'processing', 'progress': 10, 'error_message': None,
+                     'started_at': now, 'processed_seconds': 0},
+                    synchronize_session=False)
+        db.session.commit()
+        db.session.refresh(candidate)
+        return candidate
+
+    return None
+
+
+def _score(job: TranscriptionJob, duration, now) -> float:
+    """Lower runs first: expected seconds of audio, less boosts and aging."""
+    config = current_app.config
+    score = job.expected_duration or duration or DEFAULT_EXPECTED_DURATION
+    if job.priority == PRIORITY_INTERACTIVE:
+        score -= config.get('SCHEDULER_INTERACTIVE_BOOST_SECONDS', 1800)
+    elif job.priority == PRIORITY_RETRY or job.status == 'running':
+        # Explicit retries and jobs reclaimed from a crashed worker
+        score -= config.get('SCHEDULER_RETRY_BOOST_SECONDS', 900)
+    if job.updated_at:
+        score -= (now - job.updated_at).total_seconds() * config.get('SCHEDULER_AGING_RATE', 1.0)
+    return score
+
+
+def _next_candidate(now):
+    """The claimable job to run next, by fair share and then score (see module docs)."""
+    limit = current_app.config.get('SCHEDULER_MAX_CANDIDATES', 1000)
+    rows = db.session.query(TranscriptionJob, Transcription.user_id, Transcription.duration)\
+        .join(Transcription, Transcription.id == TranscriptionJob.transcription_id)\
+        .filter(_claimable_filter(now))\
+        .order_by(TranscriptionJob.id)\
+        .limit(limit)\
+        .all()
+    if not rows:
+        return None
+
+    running = dict(
+        db.session.query(Transcription.user_id, func.count(TranscriptionJob.id))
+        .join(Transcription, Transcription.id == TranscriptionJob.transcription_id)
+        .filter(TranscriptionJob.status == 'running', TranscriptionJob.lease_expires_at >= now)
+        .group_by(Transcription.user_id)
+    )
+    job, _, _ = min(rows, key=lambda row: (running.get(row.user_id, 0), _score(row[0], row.duration, now)))
+    return job
+
+
+def _give_up(job: TranscriptionJob, now):
+    """Mark a job whose retries are exhausted as failed (guarded by CAS)."""
+    updated = TranscriptionJob.query\
+        .filter(TranscriptionJob.id == job.id,
+                TranscriptionJob.attempts == job.attempts,
+                _claimable_filter(now))\
+        .update({'status': 'failed', 'lease_owner': None, 'lease_expires_at': None,
+                 'updated_at': now}, synchronize_session=False)
+    if updated == 1:
+        Transcription.query.filter_by(id=job.transcription_id)\
+            .update({'status': 'failed', 'progress': 0,
+                     'error_message': 'Número máximo de tentativas excedido.'},
+                    synchronize_session=False)
+        search.remove_transcription(job.transcription_id)
+        print(f"[!] Job {job.id} exceeded {job.max_attempts} attempts. Marking as failed.")
+    db.session.commit()
+
+
+def heartbeat(job_id: int, owner: str, lease_seconds: int, commit: bool = True) -> bool:
+    """
+    Extend the lease of a running job. Returns False if the lease was lost.
+    With ``commit=False`` the renewal joins the caller's transaction, so
+    writes made in it only land while ``owner`` still holds the lease.
+    """
+    now = datetime.utcnow()
+    updated = TranscriptionJob.query\
+        .filter_by(id=job_id, lease_owner=owner, status='running')\
+        .update({'lease_expires_at': now + timedelta(seconds=lease_seconds),
+                 'heartbeat_at': now}, synchronize_session=False)
+    if commit:
+        db.session.commit()
+    return updated == 1
+
+
+def finish_job(job_id: int, owner: str, status: str = 'done') -> bool:
+    """
+    Release the lease and set the final job status, in the caller's
+    transaction. Returns False (and changes nothing) if ``owner`` no longer
+    holds the lease, in which case the caller must roll back its results.
+    """
+    updated = TranscriptionJob.query\
+        .filter_by(id=job_id, lease_owner=owner, status='running')\
+        .update({'status': status, 'lease_owner': None, 'lease_expires_at': None,
+                 'updated_at': datetime.utcnow()}, synchronize_session=False)
+    return updated == 1
+
+
+def release_for_retry(job_id: int, owner: str) -> bool:
+    """
+    Put a job that crashed back in the queue if it still has attempts left.
+    Returns True if it was re-queued, False if it was marked failed.
+    """
+    job = TranscriptionJob.query.get(job_id)
+    if job is None or job.lease_owner != owner:
+        return False
+    retry = job.attempts < job.max_attempts
+    finish_job(job_id, owner, status='queued' if retry else 'failed')
+    return retry
+
+
+def cancel_job(transcription: Transcription) -> bool:
+    """
+    Cancel a pending or processing transcription, in the caller's
+    transaction. A queued job is simply never claimed; a running one loses
+    its lease, and its worker stops at the next stage or chunk boundary (see
+    is_cancelled). Partial output saved so far (segments, text, their
+    search rows) is cleared here, and without the lease the worker cannot
+    write any more. Returns False if the transcription already finished.
+    """
+    if transcription.status not in ('pending', 'processing'):
+        return False
+    now = datetime.utcnow()
+    # Compare-and-swap against a worker claiming or finishing it right now
+    updated = TranscriptionJob.query\
+        .filter(TranscriptionJob.transcription_id == transcription.id,
+                TranscriptionJob.status.in_(('queued', 'running')))\
+        .update({'status': 'cancelled', 'lease_owner': None, 'lease_expires_at': None,
+                 'updated_at': now}, synchronize_session=False)
+    if not updated and transcription.job is not None:
+        return False
+    transcription.status = 'cancelled'
+    transcription.progress = 0
+    transcription.error_message = None
+    transcription.text = ''
+    transcription.processed_seconds = 0
+    transcription.replace_segments([])  # Also drops the search rows
+    return True
+
+
+def is_cancelled(job_id: int) -> bool:
+    status = db.session.query(TranscriptionJob.status).filter_by(id=job_id).scalar()
+    return status == 'cancelled'
+
+
+def job_state(job_id: int, owner: str) -> str:
+    """'cancelled', 'held' while ``owner`` still holds the running job's lease, else 'lost'."""
+    row = db.session.query(TranscriptionJob.status, TranscriptionJob.lease_owner)\
+        .filter_by(id=job_id).first()
+    if row is None:
+        return 'lost'
+    status, lease_owner = row
+    if status == 'cancelled':
+        return 'cancelled'
+    return 'held' if status == 'running' and lease_owner == owner else 'lost'
+
+
+def count_jobs(status: str) -> int:
+    return TranscriptionJob.query.filter_by(status=status).count()
@@ -0,0 +1,334 @@
+"""
+Pools of model replicas and the memory-budgeted cache that owns them.
+
+A single PyTorch model instance can only serve one inference at a time here,
+so instead of one global lock per model we keep up to N independent replicas
+per model and hand them out to workers for the duration of one call.
+
+All pools live in one ModelCache, which keeps the total estimated size of
+loaded replicas under ``MODEL_MEMORY_BUDGET_MB`` by unloading idle replicas
+of the least recently used models, and unloads models that sat idle for
+longer than ``MODEL_IDLE_TIMEOUT`` seconds. Anything else holding models
+can be registered as an entry too (see chunking.ChunkProcessPool); an entry
+needs ``name``, ``last_used``, ``pinned``, ``loaded_bytes``,
+``unload_idle(keep)``, ``close()`` and ``stats()``.
+"""
+import copy
+import gc
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app
+
+
+def get_setting(key, default=None):
+    """Read a setting from the app config, falling back to the environment."""
+    try:
+        return current_app.config.get(key, default)
+    except RuntimeError:
+        # Outside an app context (e.g. scripts/test_concurrency.py)
+        return os.environ.get(key, default)
+
+
+def parse_pool_sizes(spec) -> dict:
+    """Parse a 'tiny=4,base=3,medium=1' string into {'tiny': 4, ...}."""
+    if isinstance(spec, dict):
+        return {k: int(v) for k, v in spec.items()}
+    sizes = {}
+    for item in (spec or '').split(','):
+        if '=' not in item:
+            continue
+        name, value = item.split('=', 1)
+        sizes[name.strip()] = int(value)
+    return sizes
+
+
+def parse_model_list(spec) -> list:
+    """Parse 'base,small' into ['base', 'small']."""
+    if isinstance(spec, (list, tuple)):
+        return list(spec)
+    return [item.strip() for item in (spec or '').split(',') if item.strip()]
+
+
+def estimate_model_bytes(model) -> int:
+    """Size of a torch module's parameters and buffers, 0 if unknown."""
+    try:
+        tensors = list(model.parameters()) + list(model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    except Exception:
+        return 0
+
+
+def _release_memory():
+    gc.collect()
+    torch = sys.modules.get('torch')
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+class ReplicaPool:
+    """
+    Up to ``size`` replicas of one model, created lazily by ``loader``.
+    ``acquire()`` checks a replica out and blocks while all are in use.
+
+    Loading is single-flight: while one replica is being loaded from disk,
+    other callers wait for it instead of starting their own load, and any
+    extra replicas they need are deep copies of the freshly loaded one.
+    """
+
+    def __init__(self, name, loader, size, cache=None, estimated_bytes=0):
+        self.name = name
+        self.loader = loader
+        self.size = max(1, int(size))
+        self.cache = cache
+        self.replica_bytes = estimated_bytes
+        self.pinned = False
+        self.last_used = time.monotonic()
+        self._idle = []
+        self._created = 0
+        self._loading = False
+        self._capped = False
+        self._waiting = 0
+        self._cond = threading.Condition()
+
+    @property
+    def loaded_bytes(self):
+        return self._created * self.replica_bytes
+
+    def _checkout(self):
+        while True:
+            with self._cond:
+                self._waiting += 1
+                try:
+                    while True:
+                        if self._idle:
+                            return self._idle.pop()
+                        if not self._loading and not self._capped and self._created < self.size:
+                            # Reserve the slot, then load outside the lock
+                            self._created += 1
+                            self._loading = True
+                            index = self._created
+                            break
+                        self._cond.wait(timeout=5)
+                finally:
+                    self._waiting -= 1
+
+            # The first replica is always loaded; more only if they fit the budget
+            if index == 1 or self._make_room():
+                break
+            with self._cond:
+                self._created -= 1
+                self._loading = False
+                self._capped = True  # Until a replica is returned
+                self._cond.notify_all()
+
+        try:
+            print(f"[*] Loading replica {index}/{self.size} of '{self.name}'...")
+            replica = self.loader()
+            measured = estimate_model_bytes(replica)
+            if measured:
+                self.replica_bytes = measured
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._loading = False
+                self._cond.notify_all()
+            raise
+
+        self._clone_for_waiters(replica)
+        return replica
+
+    def _make_room(self):
+        # Called once the new replica is reserved in _created, so it is
+        # already part of loaded_bytes and no extra bytes are requested.
+        # Never called with self._cond held: the cache locks other pools.
+        return self.cache is None or self.cache.make_room(self, 0)
+
+    def _clone_for_waiters(self, replica):
+        """Serve callers that queued up during the load with copies instead of new loads."""
+        with self._cond:
+            wanted = min(self._waiting, self.size - self._created)
+
+        clones = []
+        for _ in range(wanted):
+            with self._cond:
+                self._created += 1
+            if not self._make_room():
+                with self._cond:
+                    self._created -= 1
+                break
+            try:
+                clones.append(copy.deepcopy(replica))
+            except Exception as e:
+                print(f"[!] Could not clone '{self.name}' replica: {e}")
+                with self._cond:
+                    self._created -= 1
+                break
+
+        with self._cond:
+            self._idle.extend(clones)
+            self._loading = False
+            self._cond.notify_all()
+
+    def _checkin(self, replica):
+        with self._cond:
+            self._idle.append(replica)
+            self._capped = False
+            self.last_used = time.monotonic()
+            self._cond.notify()
+
+    @contextmanager
+    def acquire(self):
+        self.last_used = time.monotonic()
+        if self.cache is not None:
+            self.cache.touch(self)
+        replica = self._checkout()
+        try:
+            yield replica
+        finally:
+            self._checkin(replica)
+
+    def unload_idle(self, keep=0) -> int:
+        """Drop idle replicas, keeping at least ``keep`` loaded. Returns bytes freed."""
+        with self._cond:
+            removable = min(len(self._idle), max(0, self._created - keep))
+            dropped = [self._idle.pop() for _ in range(removable)]
+            self._created -= len(dropped)
+            self._capped = False
+            freed = len(dropped) * self.replica_bytes
+        if dropped:
+            del dropped
+            print(f"[*] Unloaded {removable} idle replica(s) of '{self.name}'.")
+        return freed
+
+    def close(self):
+        """Drop every idle replica (process exit)."""
+        self.unload_idle(keep=0)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'loaded': self._created,
+                'in_use': self._created - len(self._idle),
+                'replica_mb': round(self.replica_bytes / 2**20, 1),
+                'idle_seconds': round(time.monotonic() - self.last_used, 1),
+                'pinned': self.pinned
+            }
+
+
+class ModelCache:
+    """
+    Owns every ReplicaPool and enforces the memory budget (LRU eviction of
+    idle replicas) and the idle timeout (background unloading).
+    """
+
+    def __init__(self):
+        self._pools = {}
+        self._lock = threading.RLock()
+        self.budget_bytes = 0  # 0 = unlimited
+        self.idle_timeout = 0  # 0 = never unload
+        self._reaper = None
+
+    def configure(self, budget_mb=None, idle_timeout=None):
+        if budget_mb is None:
+            budget_mb = get_setting('MODEL_MEMORY_BUDGET_MB')
+        if idle_timeout is None:
+            idle_timeout = get_setting('MODEL_IDLE_TIMEOUT')
+        self.budget_bytes = int(float(budget_mb or 0) * 2**20)
+        self.idle_timeout = float(idle_timeout or 0)
+        if self.idle_timeout > 0 and self._reaper is None:
+            self._reaper = threading.Thread(target=self._reap_loop, daemon=True)
+            self._reaper.start()
+
+    def get_pool(self, key, loader, size, estimated_bytes=0) -> ReplicaPool:
+        return self.get_entry(key, lambda: ReplicaPool(key, loader, size, cache=self,
+                                                       estimated_bytes=estimated_bytes))
+
+    def get_entry(self, key, factory):
+        """The entry registered under ``key``, created by ``factory()`` on first use."""
+        with self._lock:
+            entry = self._pools.get(key)
+            if entry is None:
+                entry = factory()
+                self._pools[key] = entry
+            return entry
+
+    def touch(self, pool):
+        # Dict order doubles as LRU order: most recently used last
+        with self._lock:
+            self._pools.pop(pool.name, None)
+            self._pools[pool.name] = pool
+
+    def loaded_bytes(self):
+        with self._lock:
+            return sum(pool.loaded_bytes for pool in self._pools.values())
+
+    def make_room(self, requester, nbytes) -> bool:
+        """
+        Evict idle replicas of least recently used models until ``nbytes``
+        more fit in the budget. Returns False if they still do not fit.
+        ``nbytes`` excludes replicas already reserved in a pool: those are
+        counted by loaded_bytes().
+        """
+        if not self.budget_bytes:
+            return True
+        with self._lock:
+            if self.loaded_bytes() + nbytes <= self.budget_bytes:
+                return True
+            freed = 0
+            for pool in list(self._pools.values()):
+                if pool is requester:
+                    continue
+                freed += pool.unload_idle(keep=0)
+                if self.loaded_bytes() + nbytes <= self.budget_bytes:
+                    break
+            if freed:
+                _release_memory()
+            return self.loaded_bytes() + nbytes <= self.budget_bytes
+
+    def evict_idle(self, older_than):
+        """Unload pools unused for ``older_than`` seconds (pinned pools keep one replica)."""
+        now = time.monotonic()
+        freed = 0
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            if now - pool.last_used >= older_than:
+                freed += pool.unload_idle(keep=1 if pool.pinned else 0)
+        if freed:
+            _release_memory()
+        return freed
+
+    def close_all(self):
+        """Unload everything that can be unloaded; called when the worker exits."""
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            try:
+                pool.close()
+            except Exception as e:
+                print(f"[!] Error closing '{pool.name}': {e}")
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(max(1.0, min(self.idle_timeout / 2, 60)))
+            try:
+                self.evict_idle(self.idle_timeout)
+            except Exception as e:
+                print(f"[!] Error unloading idle models: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'budget_mb': round(self.budget_bytes / 2**20, 1),
+                'loaded_mb': round(self.loaded_bytes() / 2**20, 1),
+                'pools': {name: pool.stats() for name, pool in self._pools.items()}
+            }
+
+
+# Process-wide cache shared by Whisper and diarization pools
+model_cache = ModelCache()
@@ -0,0 +1,109 @@
+"""
+The 'auto' Whisper model: picks a model size per job.
+
+The choice is made by the worker once the audio is decoded and its
+duration is known. Every candidate in AUTO_MODEL_CANDIDATES (smallest to
+largest) gets an estimated processing time, ``duration x real-time
+factor``, where the real-time factor (processing seconds per audio second)
+is the average measured over the model's recent jobs, or a conservative
+CPU default until it has run. The work already waiting for the worker
+(remaining part of running jobs plus the queue, spread over
+TRANSCRIPTION_WORKERS) is added on top.
+
+The largest model whose estimate fits in ``duration x AUTO_MODEL_TARGET_RTF``
+(but never less than AUTO_MODEL_MIN_BUDGET_SECONDS) is used, so long files
+and a busy queue step down to smaller models and an idle worker steps up.
+If nothing fits, the smallest candidate runs. The chosen model is stored on
+the Transcription (``model_name``) along with the measured real-time factor.
+"""
+from sqlalchemy import func
+
+from app.extensions import db
+from app.transcriptions.models import Transcription, TranscriptionJob
+from app.transcriptions.model_pool import get_setting, parse_model_list
+
+AUTO_MODEL = 'auto'
+MODEL_SIZES = ['tiny', 'base', 'small', 'medium', 'large']
+
+# Processing seconds per audio second of openai-whisper FP32 on a CPU
+# worker, including diarization; replaced by measurements once available
+DEFAULT_REALTIME_FACTORS = {
+    'tiny': 0.15,
+    'base': 0.25,
+    'small': 0.6,
+    'medium': 1.5,
+    'large': 3.0,
+}
+
+# Assumed length of queued recordings whose duration is not known yet
+DEFAULT_DURATION = 600
+
+
+def candidates() -> list:
+    """Model sizes 'auto' may choose from, smallest first."""
+    names = parse_model_list(get_setting('AUTO_MODEL_CANDIDATES') or 'tiny,base,small,medium')
+    return sorted((n for n in names if n in MODEL_SIZES), key=MODEL_SIZES.index) or ['base']
+
+
+def realtime_factors() -> dict:
+    """Average measured real-time factor of each model's recent jobs, else the defaults."""
+    samples = int(get_setting('AUTO_MODEL_RTF_SAMPLES') or 20)
+    factors = dict(DEFAULT_REALTIME_FACTORS)
+    for model_name in MODEL_SIZES:
+        recent = db.session.query(Transcription.realtime_factor)\
+            .filter(Transcription.model_name == model_name,
+                    Transcription.realtime_factor.isnot(None))\
+            .order_by(Transcription.id.desc())\
+            .limit(samples)\
+            .subquery()
+        measured = db.session.query(func.avg(recent.c.realtime_factor)).scalar()
+        if measured:
+            factors[model_name] = float(measured)
+    return factors
+
+
+def backlog_seconds(factors: dict, exclude_id=None) -> float:
+    """Estimated processing seconds of every other queued or running job."""
+    rows = db.session.query(
+        TranscriptionJob.status, TranscriptionJob.model_name,
+        Transcription.model_name, Transcription.duration, Transcription.processed_seconds
+    ).join(Transcription, Transcription.id == TranscriptionJob.transcription_id)\
+        .filter(TranscriptionJob.status.in_(('queued', 'running')))
+    if exclude_id is not None:
+        rows = rows.filter(Transcription.id != exclude_id)
+
+    typical = db.session.query(func.avg(Transcription.duration))\
+        .filter(Transcription.status == 'completed').scalar() or DEFAULT_DURATION
+    fallback = factors.get(get_setting('WHISPER_MODEL') or 'base', DEFAULT_REALTIME_FACTORS['base'])
+
+    total = 0.0
+    for status, job_model, chosen_model, duration, processed in rows:
+        done = (processed or 0) if status == 'running' else 0
+        remaining = (duration or typical) - done
+        model_name = chosen_model or job_model
+        total += max(0.0, remaining) * factors.get(model_name, fallback)
+    return total
+
+
+def choose_model(duration: float, transcription_id=None):
+    """
+    Model size for a recording of ``duration`` seconds under the current
+    load. Returns (model name, details of the decision for the logs).
+    """
+    factors = realtime_factors()
+    workers = max(1, int(get_setting('TRANSCRIPTION_WORKERS') or 1))
+    wait = backlog_seconds(factors, exclude_id=transcription_id) / workers
+    budget = max(duration * float(get_setting('AUTO_MODEL_TARGET_RTF') or 0.5),
+                 float(get_setting('AUTO_MODEL_MIN_BUDGET_SECONDS') or 120))
+
+    options = candidates()
+    chosen = options[0]
+    for model_name in options:
+        if wait + duration * factors[model_name] <= budget:
+            chosen = model_name
+    return chosen, {
+        'duration': round(duration, 1),
+        'backlog_wait_s': round(wait, 1),
+        'budget_s': round(budget, 1),
+        'estimate_s': round(duration * factors[chosen], 1),
+    }
@@ -3,16 +3,258 @@ from datetime import datetime
 from app.auth.models import User
 
 class Transcription(db.Model):
+    __table_args__ = (
+        # Serves the per-user, newest-first listing and its keyset pagination
+        db.Index('ix_transcription_user_timestamp', 'user_id', 'timestamp'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(256))
     text = db.Column(db.Text)
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    # Legacy: segments used to be stored here as one JSON array. They now
+    # live in transcription_segment; migrations.migrate_segments() moves old
+    # rows over and clears this column.
     structured_data = db.Column(db.JSON)
     
     # Background processing fields
-    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, processing, completed, failed
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, processing, completed, failed, cancelled
     error_message = db.Column(db.Text)
     progress = db.Column(db.Integer, default=0)  # 0-100
     
+    # Incremental progress: audio length, seconds transcribed so far and
+    # when processing started (used to compute the ETA)
+    duration = db.Column(db.Float)
+    processed_seconds = db.Column(db.Float, default=0)
+    started_at = db.Column(db.DateTime)
+    
+    # SHA-256 of the audio content (the result cache key) and where the
+    # audio is stored, relative to UPLOAD_FOLDER. Older rows have no
+    # storage_path; their audio is UPLOAD_FOLDER/<filename>.
+    audio_hash = db.Column(db.String(64), index=True)
+    storage_path = db.Column(db.String(512))
+    
+    # Incremented whenever the finished transcript changes (completion,
+    # speaker rename); keys cached renders of the transcript
+    revision = db.Column(db.Integer, default=0, nullable=False)
+    # Whisper model that produced the transcript (what 'auto' resolved to)
+    # and its processing seconds per audio second on this job
+    model_name = db.Column(db.String(50))
+    realtime_factor = db.Column(db.Float)
+    
+    # Last change of any kind (status, progress, text); HTTP Last-Modified/ETag
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
     author = db.relationship(User, backref='transcriptions')
+
+    def bump_revision(self):
+        """Mark the transcript as changed (caller commits). Atomic in SQL."""
+        self.revision = Transcription.revision + 1
+
+    def modified_at(self):
+        return self.updated_at or self.timestamp
+
+    def eta_seconds(self):
+        """Estimated seconds left, from the transcription speed observed so far."""
+        if self.status != 'processing' or not self.duration or not self.started_at or not self.processed_seconds:
+            return None
+        elapsed = (datetime.utcnow() - self.started_at).total_seconds()
+        if elapsed <= 0:
+            return None
+        speed = self.processed_seconds / elapsed  # audio seconds per wall second
+        return max(0, round((self.duration - self.processed_seconds) / speed))
+
+    def segments_query(self):
+        return TranscriptionSegment.query\
+            .filter_by(transcription_id=self.id)\
+            .order_by(TranscriptionSegment.position)
+
+    def segment_dicts(self):
+        """Segments as [{'start', 'end', 'text', 'speaker'}], in transcript order."""
+        return [segment.to_dict() for segment in self.segments_query()]
+
+    def append_segments(self, segments, first_position=0):
+        """Insert segment dicts with consecutive positions (caller commits)."""
+        if not segments:
+            return
+        db.session.execute(db.insert(TranscriptionSegment), [
+            TranscriptionSegment.row(self.id, first_position + offset, segment)
+            for offset, segment in enumerate(segments)
+        ])
+
+    def replace_segments(self, segments):
+        """Replace all segments of this transcription and drop their search rows (caller commits)."""
+        from app.transcriptions import search  # search imports this module
+        search.remove_transcription(self.id)
+        TranscriptionSegment.query.filter_by(transcription_id=self.id).delete(synchronize_session=False)
+        self.append_segments(segments)
+
+
+class TranscriptionSegment(db.Model):
+    """One timed line of a transcript."""
+    __tablename__ = 'transcription_segment'
+    __table_args__ = (
+        db.Index('ix_segment_transcription_start', 'transcription_id', 'start'),
+        db.Index('ix_segment_transcription_speaker', 'transcription_id', 'speaker'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    transcription_id = db.Column(db.Integer, db.ForeignKey('transcription.id'), nullable=False)
+    position = db.Column(db.Integer, nullable=False)  # Order within the transcript
+    start = db.Column(db.Float, nullable=False)
+    end = db.Column(db.Float, nullable=False)
+    speaker = db.Column(db.String(128), default='Unknown', nullable=False)
+    text = db.Column(db.Text, default='', nullable=False)
+
+    @staticmethod
+    def row(transcription_id, position, segment):
+        return {
+            'transcription_id': transcription_id,
+            'position': position,
+            'start': segment.get('start', 0),
+            'end': segment.get('end', 0),
+            'speaker': segment.get('speaker') or 'Unknown',
+            'text': segment.get('text', ''),
+        }
+
+    def to_dict(self):
+        return {
+            'start': self.start,
+            'end': self.end,
+            'text': self.text,
+            'speaker': self.speaker
+        }
+
+
+class TranscriptionJob(db.Model):
+    """
+    Durable work item for the inference worker.
+
+    There is exactly one job per Transcription. Workers claim a job by
+    atomically taking its lease; a running job whose lease expired (the
+    worker crashed or stopped heartbeating) can be claimed again until
+    ``max_attempts`` is reached.
+    """
+    __tablename__ = 'transcription_job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    transcription_id = db.Column(db.Integer, db.ForeignKey('transcription.id'), unique=True, nullable=False)
+    model_name = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), default='queued', nullable=False, index=True)  # queued, running, done, failed, cancelled
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    max_attempts = db.Column(db.Integer, default=3, nullable=False)
+
+    # Scheduling (see jobs.claim_job): 'normal', 'interactive' or 'retry', and
+    # the audio length estimated at submission, for shortest-job-first
+    priority = db.Column(db.String(20), default='normal', nullable=False)
+    expected_duration = db.Column(db.Float)
+
+    # Lease held by the worker currently processing the job
+    lease_owner = db.Column(db.String(128))
+    lease_expires_at = db.Column(db.DateTime, index=True)
+    heartbeat_at = db.Column(db.DateTime)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    transcription = db.relationship(Transcription, backref=db.backref('job', uselist=False))
+
+
+class AudioUpload(db.Model):
+    """
+    An uploaded audio file. Created when a (resumable) upload starts; once
+    every byte arrived and the checksum matched, the file is moved to
+    content-addressed storage (see storage.py) and ``status`` becomes
+    'complete'.
+    """
+    __tablename__ = 'audio_upload'
+
+    id = db.Column(db.Integer, primary_key=True)
+    upload_id = db.Column(db.String(32), unique=True, index=True)  # Public token used in upload URLs
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    filename = db.Column(db.String(256), nullable=False)  # Sanitized original name, for display
+    extension = db.Column(db.String(10))  # Of the sniffed format, once known
+    status = db.Column(db.String(20), default='complete', nullable=False)  # uploading, complete
+    size = db.Column(db.BigInteger, default=0, nullable=False)  # Total length declared by the client
+    offset = db.Column(db.BigInteger, default=0, nullable=False)  # Bytes received so far
+    expected_sha256 = db.Column(db.String(64))  # Optional, declared by the client
+    sha256 = db.Column(db.String(64), index=True)  # Set once complete
+    storage_path = db.Column(db.String(512))  # Relative to UPLOAD_FOLDER, set once complete
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'upload_id': self.upload_id,
+            'filename': self.filename,
+            'status': self.status,
+            'size': self.size,
+            'offset': self.offset,
+            'sha256': self.sha256
+        }
+
+
+class ResultCacheEntry(db.Model):
+    """
+    A finished transcription result, keyed by audio content and everything
+    that influences the output (model, language, pipeline version).
+    """
+    __tablename__ = 'result_cache'
+    __table_args__ = (
+        db.UniqueConstraint('audio_hash', 'model_name', 'language', 'pipeline_version',
+                            name='uq_result_cache_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    audio_hash = db.Column(db.String(64), nullable=False)
+    model_name = db.Column(db.String(50), nullable=False)
+    language = db.Column(db.String(16), nullable=False)
+    pipeline_version = db.Column(db.String(128), nullable=False)
+    text = db.Column(db.Text)
+    segments = db.Column(db.JSON)
+    duration = db.Column(db.Float)
+    size_bytes = db.Column(db.Integer, default=0, nullable=False)  # Approximate stored size
+    hits = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # LRU eviction order
+
+
+class ResultCacheStats(db.Model):
+    """Single-row counters for the result cache (id is always 1)."""
+    __tablename__ = 'result_cache_stats'
+
+    id = db.Column(db.Integer, primary_key=True)
+    hits = db.Column(db.Integer, default=0, nullable=False)
+    misses = db.Column(db.Integer, default=0, nullable=False)
+    stores = db.Column(db.Integer, default=0, nullable=False)
+    evictions = db.Column(db.Integer, default=0, nullable=False)
+
+
+class StorageMaintenanceRun(db.Model):
+    """Report of one storage compaction / retention / garbage collection pass."""
+    __tablename__ = 'storage_maintenance_run'
+
+    id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    finished_at = db.Column(db.DateTime)
+    compacted_files = db.Column(db.Integer, default=0, nullable=False)
+    compacted_bytes_before = db.Column(db.BigInteger, default=0, nullable=False)
+    compacted_bytes_after = db.Column(db.BigInteger, default=0, nullable=False)
+    expired_files = db.Column(db.Integer, default=0, nullable=False)  # Past AUDIO_RETENTION_DAYS
+    orphaned_files = db.Column(db.Integer, default=0, nullable=False)  # Referenced by nothing
+    reclaimed_bytes = db.Column(db.BigInteger, default=0, nullable=False)
+    error_message = db.Column(db.Text)
+
+    def to_dict(self):
+        return {
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'compacted_files': self.compacted_files,
+            'compacted_bytes_before': self.compacted_bytes_before,
+            'compacted_bytes_after': self.compacted_bytes_after,
+            'expired_files': self.expired_files,
+            'orphaned_files': self.orphaned_files,
+            'reclaimed_bytes': self.reclaimed_bytes,
+            'error_message': self.error_message
+        }
@@ -0,0 +1,185 @@
+"""
+Content-addressed cache of finished transcription results.
+
+Entries are keyed by (SHA-256 of the audio, Whisper model and engine,
+language, pipeline version), so the same recording uploaded again under
+another name, or retried with the same settings, completes without running
+Whisper and pyannote again. The cache lives in the database and is shared by all web
+and worker processes. Least recently used entries are evicted once
+RESULT_CACHE_MAX_ENTRIES or RESULT_CACHE_MAX_MB is exceeded; hit, miss,
+store and eviction counts are kept in ``result_cache_stats``.
+"""
+import json
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import func, case
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db
+from app.transcriptions.models import ResultCacheEntry, ResultCacheStats
+from app.transcriptions.diarization import DIARIZATION_PIPELINE
+from app.transcriptions.engines import model_label
+from app.transcriptions.model_selection import AUTO_MODEL, candidates
+
+# Bump the suffix when speaker merging or the stored result format changes
+PIPELINE_VERSION = f"{DIARIZATION_PIPELINE}+r2"
+
+
+def enabled() -> bool:
+    return bool(current_app.config.get('RESULT_CACHE_ENABLED', True))
+
+
+def current_language() -> str:
+    return current_app.config.get('WHISPER_LANGUAGE') or 'pt'
+
+
+def pipeline_version() -> str:
+    # Word-level speaker splitting produces different segments
+    if current_app.config.get('WHISPER_WORD_TIMESTAMPS'):
+        return PIPELINE_VERSION + '+words'
+    return PIPELINE_VERSION
+
+
+def cached_models(model_name) -> dict:
+    """Cache labels that can serve ``model_name``, mapped to their model."""
+    if model_name == AUTO_MODEL:
+        # 'auto' is served by whichever candidate already has the audio
+        return {model_label(name): name for name in candidates()}
+    return {model_label(model_name): model_name}
+
+
+def _key_filter(audio_hash, model_name, language):
+    labels = list(cached_models(model_name))  # Smallest model first
+    query = ResultCacheEntry.query.filter(
+        ResultCacheEntry.audio_hash == audio_hash,
+        ResultCacheEntry.model_name.in_(labels),
+        ResultCacheEntry.language == language,
+        ResultCacheEntry.pipeline_version == pipeline_version()
+    )
+    if len(labels) > 1:
+        # Prefer the largest model's result
+        rank = case({label: index for index, label in enumerate(labels)}, value=ResultCacheEntry.model_name)
+        query = query.order_by(rank.desc())
+    return query
+
+
+def _bump(**counters):
+    """Atomically add to the stats counters (caller commits)."""
+    values = {name: getattr(ResultCacheStats, name) + amount for name, amount in counters.items()}
+    updated = db.session.execute(
+        db.update(ResultCacheStats).where(ResultCacheStats.id == 1).values(**values)
+    ).rowcount
+    if not updated:
+        # First use: create the row; a concurrent creator wins harmlessly
+        try:
+            with db.session.begin_nested():
+                db.session.add(ResultCacheStats(id=1, **counters))
+        except IntegrityError:
+            db.session.execute(
+                db.update(ResultCacheStats).where(ResultCacheStats.id == 1).values(**values)
+            )
+
+
+def lookup(audio_hash: str, model_name: str, language: str = None):
+    """
+    Cached result for this audio and settings, or None. Records the hit or
+    miss and refreshes the entry's LRU position (caller commits).
+    """
+    if not enabled() or not audio_hash:
+        return None
+    entry = _key_filter(audio_hash, model_name, language or current_language()).first()
+    if entry is None:
+        _bump(misses=1)
+        return None
+    db.session.execute(
+        db.update(ResultCacheEntry)
+        .where(ResultCacheEntry.id == entry.id)
+        .values(hits=ResultCacheEntry.hits + 1, last_used_at=datetime.utcnow())
+    )
+    _bump(hits=1)
+    return entry
+
+
+def store(audio_hash: str, model_name: str, text: str, segments, duration=None, language: str = None):
+    """Cache a finished result and evict old entries if over the limits. Commits."""
+    if not enabled() or not audio_hash:
+        return
+    language = language or current_language()
+    size_bytes = len((text or '').encode('utf-8')) + len(json.dumps(segments or []))
+    try:
+        entry = _key_filter(audio_hash, model_name, language).first()
+        if entry is None:
+            entry = ResultCacheEntry(
+                audio_hash=audio_hash,
+                model_name=model_label(model_name),
+                language=language,
+                pipeline_version=pipeline_version()
+            )
+            db.session.add(entry)
+        entry.text = text
+        entry.segments = segments or []
+        entry.duration = duration
+        entry.size_bytes = size_bytes
+        entry.last_used_at = datetime.utcnow()
+        _bump(stores=1)
+        db.session.commit()
+    except IntegrityError:
+        # Another worker stored the same key first
+        db.session.rollback()
+        return
+    evict()
+
+
+def evict():
+    """Drop least recently used entries until both limits hold. Commits."""
+    max_entries = int(current_app.config.get('RESULT_CACHE_MAX_ENTRIES') or 0)
+    max_bytes = int(current_app.config.get('RESULT_CACHE_MAX_MB') or 0) * 1024 * 1024
+    if not max_entries and not max_bytes:
+        return 0
+
+    count, total_bytes = db.session.query(
+        func.count(ResultCacheEntry.id), func.coalesce(func.sum(ResultCacheEntry.size_bytes), 0)
+    ).one()
+    excess_entries = count - max_entries if max_entries else 0
+    excess_bytes = total_bytes - max_bytes if max_bytes else 0
+    if excess_entries <= 0 and excess_bytes <= 0:
+        return 0
+
+    victims = []
+    oldest = db.session.query(ResultCacheEntry.id, ResultCacheEntry.size_bytes)\
+        .order_by(ResultCacheEntry.last_used_at, ResultCacheEntry.id)
+    for entry_id, size_bytes in oldest.yield_per(500):
+        if excess_entries <= 0 and excess_bytes <= 0:
+            break
+        victims.append(entry_id)
+        excess_entries -= 1
+        excess_bytes -= size_bytes or 0
+
+    ResultCacheEntry.query.filter(ResultCacheEntry.id.in_(victims)).delete(synchronize_session=False)
+    _bump(evictions=len(victims))
+    db.session.commit()
+    return len(victims)
+
+
+def stats() -> dict:
+    """Counters and current size, for the stats endpoint."""
+    row = ResultCacheStats.query.get(1)
+    hits = row.hits if row else 0
+    misses = row.misses if row else 0
+    count, total_bytes = db.session.query(
+        func.count(ResultCacheEntry.id), func.coalesce(func.sum(ResultCacheEntry.size_bytes), 0)
+    ).one()
+    return {
+        'enabled': enabled(),
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+        'stores': row.stores if row else 0,
+        'evictions': row.evictions if row else 0,
+        'entries': count,
+        'size_bytes': int(total_bytes),
+        'max_entries': current_app.config.get('RESULT_CACHE_MAX_ENTRIES'),
+        'max_mb': current_app.config.get('RESULT_CACHE_MAX_MB'),
+        'pipeline_version': pipeline_version()
+    }
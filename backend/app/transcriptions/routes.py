@@ -1,19 +1,33 @@
 import os
 import re
-from flask import request, jsonify, send_file, current_app, send_from_directory
+import json
+import queue
+import base64
+import uuid
+from datetime import datetime
+from flask import request, jsonify, send_file, current_app, send_from_directory, Response, stream_with_context
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from werkzeug.exceptions import RequestEntityTooLarge
+from sqlalchemy import func, or_, and_
+from sqlalchemy.orm import defer
 
 from app.extensions import db
+from app.auth.decorators import operator_required
 from . import bp
-from .models import Transcription
-from .services import transcribe_audio
-from .task_queue import get_task_queue
-from app.auth.user_preferences import UserPreferences
+from .models import Transcription, TranscriptionSegment, AudioUpload, StorageMaintenanceRun
+from .jobs import enqueue_job, cancel_job, resolve_model_name, submission_priority, PRIORITY_RETRY
+from .events import broker, status_payload, ACTIVE_STATUSES
+from . import search
+from . import result_cache
+from . import storage
+from . import formats
+from . import export
+from . import http_cache
 
-ALLOWED_EXTENSIONS = {'wav'}
-ALLOWED_MIME_TYPES = {'audio/wav', 'audio/x-wav', 'audio/wave'}
+# The extension is a first filter only; content is verified by sniffing
+ALLOWED_EXTENSIONS = formats.EXTENSIONS
+UNSUPPORTED_FORMAT = f'Formato não suportado. Envie {formats.SUPPORTED_DESCRIPTION}'
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -25,6 +39,7 @@ def sanitize_filename(filename):
 @bp.route('/upload', methods=['POST'])
 @login_required
 def upload_file():
+    """Single-request upload. Large files should use the resumable /uploads protocol."""
     if 'file' not in request.files:
         return jsonify({'error': 'Nenhum arquivo enviado'}), 400
     
@@ -33,45 +48,305 @@ def upload_file():
     if file.filename == '':
         return jsonify({'error': 'Nenhum arquivo selecionado'}), 400
     
-    if not allowed_file(file.filename) or file.content_type not in ALLOWED_MIME_TYPES:
-        return jsonify({'error': 'Formato não suportado. Apenas arquivos .wav são permitidos'}), 400
+    if not allowed_file(file.filename):
+        return jsonify({'error': UNSUPPORTED_FORMAT}), 400
+    
+    # Trust the content, not the client's MIME type or extension
+    extension = formats.sniff(file.stream.read(formats.SNIFF_BYTES))
+    file.stream.seek(0)
+    if extension is None:
+        return jsonify({'error': UNSUPPORTED_FORMAT}), 400
     
     filename = sanitize_filename(file.filename)
-    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+    upload_id = uuid.uuid4().hex
     
     try:
-        file.save(filepath)
+        # Stream into storage and hash in the same pass (the hash keys the result cache)
+        size = storage.save_stream(upload_id, file.stream)
+        sha256 = storage.content_hash(upload_id, size)
+        upload = AudioUpload(
+            upload_id=upload_id,
+            user_id=current_user.id,
+            filename=filename,
+            extension=extension,
+            status='complete',
+            size=size,
+            offset=size,
+            sha256=sha256,
+            storage_path=storage.commit_partial(upload_id, sha256, extension)
+        )
+        db.session.add(upload)
+        db.session.commit()
         return jsonify({
             'success': True,
+            'upload_id': upload_id,
             'filename': filename,
+            'sha256': sha256,
             'message': 'Arquivo enviado com sucesso'
         })
     except Exception as e:
+        db.session.rollback()
+        storage.discard_partial(upload_id)
         return jsonify({'error': f'Erro ao salvar arquivo: {str(e)}'}), 500
 
+# Resumable uploads (tus-style): POST /uploads declares the file, PATCH
+# /uploads/<id> appends chunks at the offset the server reports, and
+# GET/HEAD /uploads/<id> returns that offset so an interrupted upload
+# continues where it stopped. Chunks are streamed straight from the request
+# body into storage; nothing is spooled to a temporary file first.
+
+UPLOAD_CHUNK_CONTENT_TYPE = 'application/offset+octet-stream'
+CHECKSUM_MISMATCH = 460  # Status used by the tus checksum extension
+
+def upload_headers(upload):
+    return {
+        'Upload-Offset': str(upload.offset),
+        'Upload-Length': str(upload.size),
+        'Cache-Control': 'no-store'
+    }
+
+def get_own_upload(upload_id):
+    upload = AudioUpload.query.filter_by(upload_id=upload_id).first()
+    if upload is None or upload.user_id != current_user.id:
+        return None
+    return upload
+
+@bp.route('/uploads', methods=['POST'])
+@login_required
+def create_upload():
+    """Start a resumable upload: {"filename", "size", "sha256" (optional, hex)}."""
+    data = request.get_json(silent=True) or {}
+    filename = sanitize_filename(data.get('filename') or '')
+    if not filename:
+        return jsonify({'error': 'Nome do arquivo não fornecido'}), 400
+    if not allowed_file(filename):
+        return jsonify({'error': UNSUPPORTED_FORMAT}), 400
+    
+    try:
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Tamanho do arquivo inválido'}), 400
+    max_size = current_app.config.get('UPLOAD_MAX_SIZE')
+    if size <= 0 or (max_size and size > max_size):
+        return jsonify({'error': 'Arquivo muito grande ou vazio'}), 413 if size > 0 else 400
+    
+    expected_sha256 = (data.get('sha256') or '').lower() or None
+    if expected_sha256 and not re.fullmatch(r'[0-9a-f]{64}', expected_sha256):
+        return jsonify({'error': 'Checksum SHA-256 inválido'}), 400
+    
+    upload = AudioUpload(
+        upload_id=uuid.uuid4().hex,
+        user_id=current_user.id,
+        filename=filename,
+        extension=filename.rsplit('.', 1)[1].lower(),
+        status='uploading',
+        size=size,
+        offset=0,
+        expected_sha256=expected_sha256
+    )
+    try:
+        storage.create_partial(upload.upload_id)
+        db.session.add(upload)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        storage.discard_partial(upload.upload_id)
+        return jsonify({'error': f'Erro ao iniciar upload: {str(e)}'}), 500
+    
+    response = jsonify(dict(upload.to_dict(), chunk_size=current_app.config.get('UPLOAD_CHUNK_SIZE')))
+    response.status_code = 201
+    response.headers.update(upload_headers(upload))
+    response.headers['Location'] = f"{request.base_url}/{upload.upload_id}"
+    return response
+
+@bp.route('/uploads/<upload_id>', methods=['GET'])
+@login_required
+def get_upload(upload_id):
+    """Current offset of an upload (HEAD returns just the headers)."""
+    upload = get_own_upload(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload não encontrado'}), 404
+    response = jsonify(upload.to_dict())
+    response.headers.update(upload_headers(upload))
+    return response
+
+@bp.route('/uploads/<upload_id>', methods=['PATCH'])
+@login_required
+def append_upload_chunk(upload_id):
+    """
+    Append the request body at ``Upload-Offset``. An optional
+    ``Upload-Checksum: sha256 <base64 digest>`` header is verified before the
+    offset advances. The last chunk moves the file to content-addressed
+    storage after checking the whole-file SHA-256, if one was declared.
+    """
+    upload = get_own_upload(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload não encontrado'}), 404
+    if request.mimetype != UPLOAD_CHUNK_CONTENT_TYPE:
+        return jsonify({'error': f'Content-Type deve ser {UPLOAD_CHUNK_CONTENT_TYPE}'}), 415
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({'error': 'Cabeçalho Upload-Offset ausente ou inválido'}), 400
+    
+    expected_digest = None
+    checksum = request.headers.get('Upload-Checksum')
+    if checksum:
+        algorithm, _, encoded = checksum.partition(' ')
+        if algorithm.lower() != 'sha256':
+            return jsonify({'error': 'Algoritmo de checksum não suportado (use sha256)'}), 400
+        try:
+            expected_digest = base64.b64decode(encoded, validate=True)
+        except ValueError:
+            return jsonify({'error': 'Checksum inválido'}), 400
+    
+    with storage.upload_lock(upload_id):
+        db.session.refresh(upload)
+        if upload.status != 'uploading':
+            return jsonify(dict(upload.to_dict(), error='Upload já concluído')), 409
+        if offset != upload.offset:
+            # The client must resume from the offset we actually have
+            response = jsonify(dict(upload.to_dict(), error='Offset não confere'))
+            response.status_code = 409
+            response.headers.update(upload_headers(upload))
+            return response
+        
+        try:
+            written = storage.write_chunk(upload_id, offset, request.stream,
+                                          max_bytes=upload.size - offset, expected_digest=expected_digest)
+        except storage.ChecksumMismatch:
+            response = jsonify(dict(upload.to_dict(), error='Checksum do bloco não confere; reenvie'))
+            response.status_code = CHECKSUM_MISMATCH
+            response.headers.update(upload_headers(upload))
+            return response
+        
+        # Compare-and-swap on the offset, in case another web process
+        # received a PATCH for the same upload
+        updated = db.session.execute(
+            db.update(AudioUpload)
+            .where(AudioUpload.id == upload.id, AudioUpload.offset == offset, AudioUpload.status == 'uploading')
+            .values(offset=offset + written, updated_at=datetime.utcnow())
+        ).rowcount
+        db.session.commit()
+        db.session.refresh(upload)
+        if not updated:
+            return jsonify(dict(upload.to_dict(), error='Upload modificado por outra requisição')), 409
+        
+        # Verify the format as soon as the first bytes are in
+        if offset < formats.SNIFF_BYTES <= upload.offset or upload.offset == upload.size:
+            extension = formats.sniff(storage.read_head(upload_id, formats.SNIFF_BYTES))
+            if extension is None:
+                storage.discard_partial(upload_id)
+                db.session.delete(upload)
+                db.session.commit()
+                return jsonify({'error': UNSUPPORTED_FORMAT}), 400
+            upload.extension = extension
+            db.session.commit()
+        
+        if upload.offset == upload.size:
+            sha256 = storage.content_hash(upload_id, upload.size)
+            if upload.expected_sha256 and sha256 != upload.expected_sha256:
+                storage.discard_partial(upload_id)
+                db.session.delete(upload)
+                db.session.commit()
+                return jsonify({'error': 'Checksum do arquivo não confere; envie novamente'}), CHECKSUM_MISMATCH
+            upload.sha256 = sha256
+            upload.storage_path = storage.commit_partial(upload_id, sha256, upload.extension)
+            upload.status = 'complete'
+            db.session.commit()
+    
+    response = jsonify(upload.to_dict())
+    response.headers.update(upload_headers(upload))
+    return response
+
+@bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@login_required
+def cancel_upload(upload_id):
+    """Abort an unfinished upload and drop what was received."""
+    upload = get_own_upload(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload não encontrado'}), 404
+    if upload.status != 'uploading':
+        return jsonify({'error': 'Upload já concluído'}), 409
+    storage.discard_partial(upload_id)
+    db.session.delete(upload)
+    db.session.commit()
+    return jsonify({'success': True})
+
+def find_upload(user_id, data):
+    """
+    The upload a /transcribe or similar request refers to, by ``upload_id``
+    or (older clients) by ``filename``, the user's latest upload with that name.
+    """
+    if data.get('upload_id'):
+        return AudioUpload.query.filter_by(
+            upload_id=data['upload_id'], user_id=user_id, status='complete'
+        ).first()
+    return AudioUpload.query.filter_by(
+        filename=data['filename'], user_id=user_id, status='complete'
+    ).order_by(AudioUpload.id.desc()).first()
+
+def complete_from_cache(transcription, model_name):
+    """Fill in a cached result for this audio and model, if any (caller commits)."""
+    entry = result_cache.lookup(transcription.audio_hash, model_name)
+    if entry is None:
+        return False
+    transcription.model_name = result_cache.cached_models(model_name).get(entry.model_name, model_name)
+    transcription.status = 'completed'
+    transcription.text = entry.text
+    transcription.replace_segments(entry.segments or [])
+    transcription.progress = 100
+    transcription.error_message = None
+    transcription.duration = entry.duration
+    transcription.processed_seconds = entry.duration or 0
+    transcription.bump_revision()
+    if transcription.job:
+        transcription.job.status = 'done'
+        transcription.job.lease_owner = None
+        transcription.job.lease_expires_at = None
+    return True
+
+def cached_response(transcription):
+    search.index_transcription(transcription.id)
+    broker.publish_transcription(transcription)
+    return jsonify({
+        'success': True,
+        'id': transcription.id,
+        'status': 'completed',
+        'cached': True,
+        'message': 'Transcrição concluída a partir do cache'
+    })
+
 @bp.route('/transcribe', methods=['POST'])
 @login_required
 def transcribe_route():
     """Submit a transcription task for background processing"""
-    data = request.get_json()
-    if not data or 'filename' not in data:
+    data = request.get_json(silent=True) or {}
+    if not data.get('upload_id') and not data.get('filename'):
         return jsonify({'error': 'Nome do arquivo não fornecido'}), 400
     
-    filename = data['filename']
-    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+    upload = find_upload(current_user.id, data)
+    if upload is None and data.get('upload_id'):
+        return jsonify({'error': 'Upload não encontrado'}), 404
+    if upload is not None:
+        filename = upload.filename
+        storage_path = upload.storage_path
+        audio_hash = upload.sha256
+    else:
+        # Files uploaded before content-addressed storage live under their name
+        filename = data['filename']
+        if sanitize_filename(filename) != filename:
+            return jsonify({'error': 'Arquivo não encontrado'}), 404
+        storage_path = None
+        audio_hash = None
+    if storage_path:
+        storage_path = storage.locate(storage_path)
+    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], storage_path or filename)
     
     # Check if file exists
     if not os.path.exists(filepath):
         return jsonify({'error': 'Arquivo não encontrado'}), 404
     
-    # Get user's preferred model from preferences
-    preferences = UserPreferences.query.filter_by(user_id=current_user.id).first()
-    if preferences:
-        model_name = preferences.whisper_model
-    else:
-        # Use default if no preferences set
-        model_name = current_app.config.get('WHISPER_MODEL', 'base')
-    
     try:
         # Create transcription record with pending status
         transcription_record = Transcription(
@@ -79,18 +354,24 @@ def transcribe_route():
             text='',  # Will be filled when processing completes
             user_id=current_user.id,
             status='pending',
-            progress=0
+            progress=0,
+            storage_path=storage_path,
+            audio_hash=audio_hash or storage.hash_file(filepath)
         )
         db.session.add(transcription_record)
-        db.session.commit()
+        db.session.flush()
         
-        # Submit to background queue
-        task_queue = get_task_queue()
-        task_queue.submit_task(
-            transcription_id=transcription_record.id,
-            filepath=filepath,
-            model_name=model_name
-        )
+        # Same audio already transcribed with the same settings: done
+        model_name = resolve_model_name(current_user.id)
+        if complete_from_cache(transcription_record, model_name):
+            db.session.commit()
+            return cached_response(transcription_record)
+        
+        # Enqueue the durable job in the same transaction; the inference
+        # worker claims it from the job table.
+        enqueue_job(transcription_record, model_name,
+                    priority=submission_priority(current_user.id, data.get('priority')))
+        db.session.commit()
         
         # Return immediately with transcription ID
         return jsonify({
@@ -108,30 +389,152 @@ def transcribe_route():
 @login_required
 def get_transcription_status(id):
     """Get the current status of a transcription"""
-    transcription = Transcription.query.get_or_404(id)
+    # The transcript column is only loaded if the client's copy is stale
+    transcription = Transcription.query.options(defer(Transcription.text)).get_or_404(id)
     
     # Check ownership
     if transcription.user_id != current_user.id:
         return jsonify({'error': 'Não autorizado'}), 403
     
+    modified_at = transcription.modified_at()
+    etag = http_cache.make_etag('status', transcription.id, transcription.revision,
+                                transcription.status, transcription.progress, modified_at)
+    return http_cache.not_modified(etag, modified_at) or \
+        http_cache.tag(jsonify(status_response(transcription)), etag, modified_at)
+
+def status_response(transcription, include_results=True):
+    """Status payload shared by the single and batch status endpoints."""
     response = {
         'id': transcription.id,
         'filename': transcription.filename,
         'status': transcription.status,
         'progress': transcription.progress,
-        'timestamp': transcription.timestamp.isoformat()
+        'timestamp': transcription.timestamp.isoformat(),
+        'model_name': transcription.model_name
     }
     
     # Include results if completed
-    if transcription.status == 'completed':
+    if include_results and transcription.status == 'completed':
         response['transcription'] = transcription.text
-        response['segments'] = transcription.structured_data
+        response['segments'] = transcription.segment_dicts()
+    
+    # Include partial results and an ETA while processing
+    if transcription.status == 'processing':
+        response['partial'] = True
+        if include_results:
+            response['transcription'] = transcription.text
+            response['segments'] = transcription.segment_dicts()
+        response['duration'] = transcription.duration
+        response['processed_seconds'] = transcription.processed_seconds
+        response['eta_seconds'] = transcription.eta_seconds()
     
     # Include error if failed
     if transcription.status == 'failed':
         response['error_message'] = transcription.error_message
     
-    return jsonify(response)
+    return response
+
+MAX_BATCH_STATUS_IDS = 200
+
+@bp.route('/status', methods=['GET', 'POST'])
+@login_required
+def batch_transcription_status():
+    """
+    Status of many transcriptions in one request and one query.
+    GET /status?ids=1,2,3&results=false or POST {"ids": [1, 2, 3], "results": false}.
+    IDs the user does not own are reported as missing.
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        raw_ids = data.get('ids', [])
+        include_results = bool(data.get('results', True))
+    else:
+        raw_ids = [i for i in request.args.get('ids', '').split(',') if i.strip()]
+        include_results = request.args.get('results', 'true').lower() not in ('0', 'false', 'no')
+    
+    try:
+        ids = list(dict.fromkeys(int(i) for i in raw_ids))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'IDs inválidos'}), 400
+    if not ids:
+        return jsonify({'error': 'Nenhum ID fornecido'}), 400
+    if len(ids) > MAX_BATCH_STATUS_IDS:
+        return jsonify({'error': f'Máximo de {MAX_BATCH_STATUS_IDS} IDs por requisição'}), 400
+    
+    query = Transcription.query.filter(
+        Transcription.user_id == current_user.id,
+        Transcription.id.in_(ids)
+    )
+    etag, modified_at = fingerprint(query, 'batch', sorted(ids), include_results)
+    cached = http_cache.not_modified(etag, modified_at)
+    if cached:
+        return cached
+    if not include_results:
+        # Skip the (potentially huge) transcript column entirely
+        query = query.options(defer(Transcription.text))
+    
+    items = [status_response(t, include_results) for t in query]
+    found = {item['id'] for item in items}
+    return http_cache.tag(jsonify({
+        'items': items,
+        'missing': [i for i in ids if i not in found]
+    }), etag, modified_at)
+
+def fingerprint(query, *request_parts):
+    """
+    ETag and Last-Modified for the rows ``query`` selects, from one
+    aggregate over a few narrow columns. Any change to a row moves its
+    updated_at; the count and id sum catch rows appearing or disappearing.
+    """
+    count, id_sum, modified_at = query.with_entities(
+        func.count(Transcription.id),
+        func.sum(Transcription.id),
+        func.max(func.coalesce(Transcription.updated_at, Transcription.timestamp))
+    ).order_by(None).one()
+    if isinstance(modified_at, str):
+        modified_at = datetime.fromisoformat(modified_at)
+    return http_cache.make_etag(current_user.id, *request_parts, count, id_sum, modified_at), modified_at
+
+@bp.route('/events', methods=['GET'])
+@login_required
+def transcription_events():
+    """
+    Server-Sent Events stream with status, progress and completion events for
+    the current user's transcriptions. Replaces per-ID status polling.
+    """
+    app = current_app._get_current_object()
+    user_id = current_user.id
+    keepalive = app.config.get('EVENTS_KEEPALIVE_SECONDS', 15)
+    
+    events = broker.subscribe(user_id, app=app)
+    # Current state of active jobs, so the client starts in sync
+    initial = [status_payload(t) for t in Transcription.query.filter(
+        Transcription.user_id == user_id,
+        Transcription.status.in_(ACTIVE_STATUSES)
+    )]
+    
+    def format_event(event, payload):
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+    
+    def stream():
+        try:
+            yield "retry: 5000\n\n"
+            for payload in initial:
+                yield format_event('status', payload)
+            while True:
+                try:
+                    event, payload = events.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_event(event, payload)
+        finally:
+            broker.unsubscribe(user_id, events)
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Disable proxy buffering (nginx)
+    })
 
 @bp.route('/<int:id>/retry', methods=['POST'])
 @login_required
@@ -144,29 +547,26 @@ def retry_transcription(id):
         return jsonify({'error': 'Não autorizado'}), 403
     
     # Check if failed or should be allowed to retry
-    if transcription.status not in ['failed', 'pending']:
-        return jsonify({'error': 'Apenas transcrições que falharam ou estão pendentes podem ser reiniciadas'}), 400
+    if transcription.status not in ['failed', 'cancelled', 'pending']:
+        return jsonify({'error': 'Apenas transcrições que falharam, foram canceladas ou estão pendentes podem ser reiniciadas'}), 400
+    
+    # Audio may have been removed by the retention policy (see compaction.py)
+    relative_path = storage.locate(transcription.storage_path or transcription.filename)
+    if not os.path.exists(storage.absolute_path(relative_path)):
+        return jsonify({'error': 'O áudio original não está mais disponível no servidor'}), 410
     
     try:
-        # Reset status and progress
+        # Reset status and progress, and re-queue the job with a fresh retry budget
         transcription.status = 'pending'
         transcription.progress = 0
         transcription.error_message = None
+        model_name = resolve_model_name(current_user.id)
+        if complete_from_cache(transcription, model_name):
+            db.session.commit()
+            return cached_response(transcription)
+        enqueue_job(transcription, model_name, priority=PRIORITY_RETRY)
         db.session.commit()
         
-        # Get user's preferred model
-        from app.auth.user_preferences import UserPreferences
-        prefs = UserPreferences.query.filter_by(user_id=current_user.id).first()
-        model_name = prefs.whisper_model if prefs else 'base'
-        
-        # Audio path
-        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], transcription.filename)
-        
-        # Submit to queue
-        from app.transcriptions.task_queue import get_task_queue
-        task_queue = get_task_queue()
-        task_queue.submit_task(transcription.id, filepath, model_name)
-        
         return jsonify({
             'success': True,
             'id': transcription.id,
@@ -178,51 +578,76 @@ def retry_transcription(id):
         db.session.rollback()
         return jsonify({'error': f'Erro ao reiniciar transcrição: {str(e)}'}), 500
 
+@bp.route('/<int:id>/cancel', methods=['POST'])
+@login_required
+def cancel_transcription(id):
+    """
+    Cancel a pending or processing transcription. Queued work is dropped
+    right away; a running job stops at its next stage or chunk boundary.
+    """
+    transcription = Transcription.query.get_or_404(id)
+    
+    # Check ownership
+    if transcription.user_id != current_user.id:
+        return jsonify({'error': 'Não autorizado'}), 403
+    
+    try:
+        if not cancel_job(transcription):
+            db.session.rollback()
+            return jsonify({'error': 'Apenas transcrições pendentes ou em processamento podem ser canceladas'}), 400
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Erro ao cancelar transcrição: {str(e)}'}), 500
+    
+    broker.publish_transcription(transcription)
+    return jsonify({
+        'success': True,
+        'id': transcription.id,
+        'status': transcription.status,
+        'message': 'Transcrição cancelada'
+    })
+
 @bp.route('/<int:id>/download', methods=['GET'])
 @login_required
 def download_transcription(id):
+    """Plain-text download (``?format=`` selects another export format)."""
+    return export_transcription(id, request.args.get('format', 'txt'))
+
+@bp.route('/<int:id>/export/<fmt>', methods=['GET'])
+@login_required
+def export_transcription(id, fmt):
+    """Transcript as TXT, SRT, WebVTT or JSON, streamed (or served from the render cache)."""
+    fmt = fmt.lower()
+    if fmt not in export.FORMATS:
+        return jsonify({'error': f"Formato inválido. Use: {', '.join(export.FORMATS)}"}), 400
+    
     transcription = Transcription.query.get_or_404(id)
     
     if transcription.user_id != current_user.id:
         return jsonify({'error': 'Não autorizado'}), 403
     
-    # Generate content on-the-fly
-    content = ""
-    segments = transcription.structured_data
-    
-    if segments and len(segments) > 0:
-        for segment in segments:
-            speaker = segment.get('speaker', 'Unknown')
-            text = segment.get('text', '').strip()
-            start = segment.get('start', 0)
-            end = segment.get('end', 0)
-            
-            # Simple MM:SS format
-            def fmt_time(s):
-                m = int(s // 60)
-                sec = int(s % 60)
-                return f"{m:02d}:{sec:02d}"
-            
-            time_str = f"[{fmt_time(start)} - {fmt_time(end)}]"
-            content += f"{time_str} {speaker}: {text}\n"
-    else:
-        # Fallback to raw text
-        content = transcription.text if transcription.text else ""
-
-    # Create in-memory file
-    from io import BytesIO
-    mem_file = BytesIO()
-    mem_file.write(content.encode('utf-8'))
-    mem_file.seek(0)
-    
-    download_name = transcription.filename.rsplit('.', 1)[0] + '.txt'
-    
-    return send_file(
-        mem_file,
-        as_attachment=True,
-        download_name=download_name,
-        mimetype='text/plain'
-    )
+    if transcription.status == 'cancelled':
+        return jsonify({'error': 'Transcrição cancelada: não há texto para exportar'}), 409
+    
+    modified_at = transcription.modified_at()
+    etag = http_cache.make_etag('export', transcription.id, transcription.revision, fmt,
+                                transcription.status, modified_at)
+    not_modified = http_cache.not_modified(etag, modified_at)
+    if not_modified:
+        return not_modified
+    
+    mimetype, extension = export.FORMATS[fmt]
+    download_name = transcription.filename.rsplit('.', 1)[0] + '.' + extension
+    
+    # Cached renders are streamed from disk too, so they can be compressed
+    cached = export.cached_path(transcription, fmt)
+    body = export.read_blocks(cached) if cached else stream_with_context(export.stream(transcription, fmt))
+    response = Response(body, mimetype=mimetype)
+    response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+    return http_cache.tag(response, etag, modified_at)
+
+bp.after_request(http_cache.compress_response)
 
 # Removed old static file download route to avoid confusion, 
 # or keep it but checking explicit ownership if needed. 
@@ -230,34 +655,129 @@ def download_transcription(id):
 # but the frontend will assume IDs.
 
 
+PREVIEW_CHARS = 200
+
+# Fields that can be requested with ?fields=, mapped to SQL expressions so
+# the query only reads the columns the client asked for
+LIST_FIELDS = {
+    'id': Transcription.id,
+    'filename': Transcription.filename,
+    'timestamp': Transcription.timestamp,
+    'status': Transcription.status,
+    'progress': Transcription.progress,
+    'error_message': Transcription.error_message,
+    'duration': Transcription.duration,
+    'model_name': Transcription.model_name,
+    'text': Transcription.text,
+    'preview': func.substr(Transcription.text, 1, PREVIEW_CHARS),
+}
+# 'segments' is not a column: it is filled from transcription_segment
+SEGMENTS_FIELD = 'segments'
+FULL_FIELDS = ['id', 'filename', 'text', 'segments', 'timestamp', 'status', 'progress', 'error_message']
+SUMMARY_FIELDS = ['id', 'filename', 'preview', 'timestamp', 'status', 'progress', 'error_message', 'duration']
+
+def encode_cursor(timestamp, id):
+    raw = f"{timestamp.isoformat()}|{id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    timestamp, id = raw.split('|')
+    return datetime.fromisoformat(timestamp), int(id)
+
 @bp.route('/', methods=['GET'])
 @login_required
 def list_transcriptions():
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 5, type=int)
+    """
+    List the user's transcriptions, newest first.
     
-    pagination = Transcription.query.filter_by(user_id=current_user.id)\
-        .order_by(Transcription.timestamp.desc())\
-        .paginate(page=page, per_page=per_page, error_out=False)
+    ?view=summary returns metadata plus a short text preview instead of the
+    full text and segments; ?fields=id,filename,... picks the fields.
+    ?cursor= (empty for the first page) switches to keyset pagination, which
+    avoids COUNT(*) and OFFSET scans; follow next_cursor for the next page.
+    Without it the classic ?page= pagination is used.
+    """
+    per_page = min(request.args.get('per_page', 5, type=int), 100)
     
-    return jsonify({
-        'items': [{
-            'id': t.id,
-            'filename': t.filename,
-            'text': t.text,
-            'segments': t.structured_data,
-            'timestamp': t.timestamp.isoformat(),
-            'status': t.status,
-            'progress': t.progress,
-            'error_message': t.error_message
-        } for t in pagination.items],
+    if 'fields' in request.args:
+        fields = [f.strip() for f in request.args['fields'].split(',') if f.strip()]
+        unknown = [f for f in fields if f not in LIST_FIELDS and f != SEGMENTS_FIELD]
+        if unknown:
+            return jsonify({'error': f'Campos inválidos: {", ".join(unknown)}'}), 400
+    elif request.args.get('view') == 'summary':
+        fields = SUMMARY_FIELDS
+    else:
+        fields = FULL_FIELDS
+    
+    # Nothing changed since the client's copy: skip the page query entirely
+    etag, modified_at = fingerprint(
+        Transcription.query.filter(Transcription.user_id == current_user.id),
+        'list', sorted(request.args.items(multi=True))
+    )
+    cached = http_cache.not_modified(etag, modified_at)
+    if cached:
+        return cached
+    
+    # id and timestamp are always read: they are the keyset cursor
+    columns = list(dict.fromkeys(['id', 'timestamp'] + [f for f in fields if f != SEGMENTS_FIELD]))
+    query = db.session.query(*[LIST_FIELDS[f].label(f) for f in columns])\
+        .filter(Transcription.user_id == current_user.id)\
+        .order_by(Transcription.timestamp.desc(), Transcription.id.desc())
+    
+    def serialize_page(rows):
+        segments = {}
+        if SEGMENTS_FIELD in fields and rows:
+            # One query for the segments of the whole page
+            for segment in TranscriptionSegment.query\
+                    .filter(TranscriptionSegment.transcription_id.in_([r.id for r in rows]))\
+                    .order_by(TranscriptionSegment.transcription_id, TranscriptionSegment.position):
+                segments.setdefault(segment.transcription_id, []).append(segment.to_dict())
+        items = []
+        for row in rows:
+            item = {}
+            for field in fields:
+                if field == SEGMENTS_FIELD:
+                    item[field] = segments.get(row.id, [])
+                    continue
+                value = getattr(row, field)
+                item[field] = value.isoformat() if field == 'timestamp' and value else value
+            items.append(item)
+        return items
+    
+    if 'cursor' in request.args:
+        cursor = request.args['cursor']
+        if cursor:
+            try:
+                last_timestamp, last_id = decode_cursor(cursor)
+            except (ValueError, UnicodeDecodeError):
+                return jsonify({'error': 'Cursor inválido'}), 400
+            query = query.filter(or_(
+                Transcription.timestamp < last_timestamp,
+                and_(Transcription.timestamp == last_timestamp, Transcription.id < last_id)
+            ))
+        
+        rows = query.limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        return http_cache.tag(jsonify({
+            'items': serialize_page(rows),
+            'next_cursor': encode_cursor(rows[-1].timestamp, rows[-1].id) if has_next else None,
+            'has_next': has_next,
+            'per_page': per_page
+        }), etag, modified_at)
+    
+    page = request.args.get('page', 1, type=int)
+    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    
+    return http_cache.tag(jsonify({
+        'items': serialize_page(pagination.items),
         'total': pagination.total,
         'pages': pagination.pages,
         'current_page': pagination.page,
         'per_page': per_page,
         'has_next': pagination.has_next,
         'has_prev': pagination.has_prev
-    })
+    }), etag, modified_at)
 
 @bp.route('/<int:id>/rename-speaker', methods=['PUT'])
 @login_required
@@ -274,27 +794,115 @@ def rename_speaker(id):
     if not old_label or not new_label:
         return jsonify({'error': 'Labels antigo e novo são obrigatórios'}), 400
         
-    # Update structured data
-    segments = transcription.structured_data
-    if not segments:
+    # Single UPDATE on the (transcription_id, speaker) index
+    if not transcription.segments_query().first():
         return jsonify({'error': 'Não há dados estruturados para esta transcrição'}), 400
-        
-    updated = False
-    
-    # We need to create a new list to ensure SQLAlchemy detects the change in JSON
-    new_segments = []
     
-    for segment in segments:
-        new_segment = segment.copy()
-        if new_segment['speaker'] == old_label:
-            new_segment['speaker'] = new_label
-            updated = True
-        new_segments.append(new_segment)
+    updated = TranscriptionSegment.query\
+        .filter_by(transcription_id=transcription.id, speaker=old_label)\
+        .update({'speaker': new_label}, synchronize_session=False)
         
     if updated:
-        transcription.structured_data = new_segments
-        # Optional: Update text blob if desired, but sticking to JSON update for now as planned
+        transcription.bump_revision()
         db.session.commit()
+        export.invalidate(transcription.id)
+        search.update_speaker(transcription.id, new_label)
         return jsonify({'success': True, 'message': 'Orador renomeado com sucesso'})
     
     return jsonify({'error': 'Orador não encontrado'}), 404
+
+@bp.route('/cache/stats', methods=['GET'])
+@operator_required
+def result_cache_stats():
+    """Hit/miss counters and size of the result cache (all users; operators only)."""
+    return jsonify(result_cache.stats())
+
+@bp.route('/storage/stats', methods=['GET'])
+@operator_required
+def storage_stats():
+    """Disk usage of uploaded audio and the latest maintenance passes (operators only)."""
+    from .compaction import storage_usage
+    runs = StorageMaintenanceRun.query.order_by(StorageMaintenanceRun.started_at.desc()).limit(5)
+    return jsonify({
+        'usage': storage_usage(),
+        'reclaimed_bytes_total': int(db.session.query(
+            func.coalesce(func.sum(StorageMaintenanceRun.reclaimed_bytes), 0)).scalar()),
+        'recent_runs': [run.to_dict() for run in runs]
+    })
+
+@bp.route('/search', methods=['GET'])
+@login_required
+def search_transcriptions():
+    """
+    Full-text search across the user's transcripts.
+    ?q= words to find (all must match, 'pref*' for prefixes), optional
+    ?transcription_id= to search a single transcript, ?limit=&offset=.
+    """
+    q = (request.args.get('q') or '').strip()
+    if not q.replace('*', '').replace('"', '').strip():
+        return jsonify({'error': 'Parâmetro de busca "q" é obrigatório'}), 400
+    
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    offset = request.args.get('offset', 0, type=int)
+    transcription_id = request.args.get('transcription_id', type=int)
+    
+    results, took_ms = search.search_segments(current_user.id, q, limit=limit, offset=offset,
+                                              transcription_id=transcription_id)
+    return jsonify({
+        'query': q,
+        'results': results,
+        'took_ms': took_ms
+    })
+
+@bp.route('/<int:id>/segments', methods=['GET'])
+@login_required
+def list_segments(id):
+    """
+    Segments of a transcription without loading the whole transcript.
+    Optional filters: ?start=&end= (seconds, segments overlapping the window),
+    ?speaker=, and ?limit=&offset= for paging.
+    """
+    transcription = Transcription.query.get_or_404(id)
+    
+    if transcription.user_id != current_user.id:
+        return jsonify({'error': 'Não autorizado'}), 403
+    
+    start = request.args.get('start', type=float)
+    end = request.args.get('end', type=float)
+    speaker = request.args.get('speaker')
+    limit = min(request.args.get('limit', 500, type=int), 5000)
+    offset = request.args.get('offset', 0, type=int)
+    
+    query = transcription.segments_query()
+    if speaker:
+        query = query.filter(TranscriptionSegment.speaker == speaker)
+    if end is not None:
+        query = query.filter(TranscriptionSegment.start < end)
+    if start is not None:
+        query = query.filter(TranscriptionSegment.end > start)
+    
+    segments = query.offset(offset).limit(limit + 1).all()
+    return jsonify({
+        'id': transcription.id,
+        'segments': [s.to_dict() for s in segments[:limit]],
+        'has_more': len(segments) > limit
+    })
+
+@bp.route('/<int:id>/speakers', methods=['GET'])
+@login_required
+def list_speakers(id):
+    """Distinct speaker labels of a transcription with their segment counts."""
+    transcription = Transcription.query.get_or_404(id)
+    
+    if transcription.user_id != current_user.id:
+        return jsonify({'error': 'Não autorizado'}), 403
+    
+    rows = db.session.query(TranscriptionSegment.speaker, func.count(TranscriptionSegment.id))\
+        .filter(TranscriptionSegment.transcription_id == transcription.id)\
+        .group_by(TranscriptionSegment.speaker)\
+        .order_by(TranscriptionSegment.speaker)
+    
+    return jsonify({
+        'id': transcription.id,
+        'speakers': [{'speaker': speaker, 'segments': count} for speaker, count in rows]
+    })
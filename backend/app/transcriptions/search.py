@@ -0,0 +1,198 @@
+"""
+Full-text search over transcript segments.
+
+On SQLite the index is an FTS5 virtual table, ``segment_search``, with one
+row per segment (rowid = transcription_segment.id). It is maintained
+incrementally: a transcription is (re)indexed when the worker completes it,
+and speaker renames update only the affected rows. ``transcription_id`` and
+``user_id`` are indexed FTS columns so per-transcript deletes and per-user
+filtering go through the full-text index instead of scanning it.
+
+Other databases fall back to a LIKE query on transcription_segment.
+"""
+import re
+import html
+import time
+
+from sqlalchemy import text
+
+from app.extensions import db
+from app.transcriptions.models import Transcription, TranscriptionSegment
+
+SNIPPET_TOKENS = 12
+HIGHLIGHT_OPEN = '<mark>'
+HIGHLIGHT_CLOSE = '</mark>'
+# Stand-ins for the highlight tags until the snippet is HTML-escaped
+# (private-use characters, which transcripts do not contain)
+_MARK_OPEN = '\ue000'
+_MARK_CLOSE = '\ue001'
+
+_fts_available = None
+
+
+def fts_enabled() -> bool:
+    """True when the database is SQLite with FTS5 compiled in."""
+    global _fts_available
+    if _fts_available is None:
+        if db.engine.dialect.name != 'sqlite':
+            _fts_available = False
+        else:
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(text("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)"))
+                    conn.execute(text("DROP TABLE temp.fts5_probe"))
+                _fts_available = True
+            except Exception:
+                _fts_available = False
+    return _fts_available
+
+
+def ensure_search_index():
+    """Create the FTS5 table if needed (idempotent, cheap)."""
+    if not fts_enabled():
+        return
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS segment_search USING fts5("
+            "text, speaker, transcription_id, user_id, "
+            "start UNINDEXED, \"end\" UNINDEXED, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        ))
+
+
+def index_transcription(transcription_id: int):
+    """(Re)index all segments of one transcription."""
+    if not fts_enabled():
+        return
+    transcription = Transcription.query.get(transcription_id)
+    if transcription is None:
+        return
+    remove_transcription(transcription_id)
+    db.session.execute(text(
+        "INSERT INTO segment_search (rowid, text, speaker, transcription_id, user_id, start, \"end\") "
+        "SELECT id, text, speaker, transcription_id, :user_id, start, \"end\" "
+        "FROM transcription_segment WHERE transcription_id = :transcription_id"
+    ), {'user_id': transcription.user_id, 'transcription_id': transcription_id})
+    db.session.commit()
+
+
+def remove_transcription(transcription_id: int):
+    """Drop the indexed rows of one transcription (caller commits)."""
+    if not fts_enabled():
+        return
+    db.session.execute(
+        text("DELETE FROM segment_search WHERE segment_search MATCH :match"),
+        {'match': f'transcription_id : "{int(transcription_id)}"'}
+    )
+
+
+def update_speaker(transcription_id: int, new_label: str):
+    """Propagate a speaker rename to the indexed rows of the renamed segments."""
+    if not fts_enabled():
+        return
+    db.session.execute(text(
+        "UPDATE segment_search SET speaker = :label WHERE rowid IN ("
+        "SELECT id FROM transcription_segment "
+        "WHERE transcription_id = :transcription_id AND speaker = :label)"
+    ), {'label': new_label, 'transcription_id': transcription_id})
+    db.session.commit()
+
+
+def rebuild_if_empty():
+    """Backfill the index for completed transcriptions (first run after upgrade)."""
+    if not fts_enabled():
+        return
+    ensure_search_index()
+    if db.session.execute(text("SELECT 1 FROM segment_search LIMIT 1")).first():
+        return
+    ids = [row.id for row in db.session.query(Transcription.id).filter_by(status='completed')]
+    for transcription_id in ids:
+        index_transcription(transcription_id)
+    if ids:
+        print(f"[*] Search index built for {len(ids)} transcriptions.")
+
+
+def _fts_query(query: str) -> str:
+    """
+    Turn free text into a safe FTS5 expression: every word must match (as a
+    quoted phrase, so operators and punctuation cannot break the syntax);
+    a trailing '*' keeps prefix matching.
+    """
+    terms = []
+    for word in query.split():
+        prefix = word.endswith('*')
+        word = word.rstrip('*').replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ('*' if prefix else ''))
+    return ' AND '.join(terms)
+
+
+def _render_snippet(snippet: str) -> str:
+    """HTML-escape a snippet and only then turn the stand-ins into <mark> tags."""
+    return html.escape(snippet).replace(_MARK_OPEN, HIGHLIGHT_OPEN).replace(_MARK_CLOSE, HIGHLIGHT_CLOSE)
+
+
+def _like_snippet(content: str, words) -> str:
+    snippet = content.strip()
+    if words:
+        # One pass, longest word first, so highlights never nest
+        pattern = '|'.join(re.escape(w) for w in sorted(set(words), key=len, reverse=True))
+        snippet = re.sub(f'({pattern})', _MARK_OPEN + r'\1' + _MARK_CLOSE, snippet, flags=re.IGNORECASE)
+    return _render_snippet(snippet)
+
+
+def _like_pattern(word: str) -> str:
+    """'%word%' with LIKE wildcards in the user's input matched literally (escape '\\')."""
+    word = word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{word}%'
+
+
+def search_segments(user_id: int, query: str, limit: int = 20, offset: int = 0, transcription_id=None):
+    """
+    Matching segments of the user's transcriptions, best match first.
+    ``snippet`` is HTML: the segment text escaped, with matches in <mark>.
+    Returns (results, took_ms).
+    """
+    started = time.perf_counter()
+
+    if fts_enabled():
+        match = f'{{text speaker}} : ({_fts_query(query)}) AND user_id : "{user_id}"'
+        if transcription_id is not None:
+            match += f' AND transcription_id : "{int(transcription_id)}"'
+        rows = db.session.execute(text(
+            "SELECT s.transcription_id, t.filename, s.start, s.\"end\", s.speaker, "
+            f"snippet(segment_search, 0, :mark_open, :mark_close, '…', {SNIPPET_TOKENS}) AS snippet "
+            "FROM segment_search s JOIN transcription t ON t.id = s.transcription_id "
+            "WHERE segment_search MATCH :match "
+            "ORDER BY bm25(segment_search) LIMIT :limit OFFSET :offset"
+        ), {'match': match, 'limit': limit, 'offset': offset,
+            'mark_open': _MARK_OPEN, 'mark_close': _MARK_CLOSE}).all()
+        results = [{
+            'transcription_id': int(row.transcription_id),
+            'filename': row.filename,
+            'start': float(row.start),
+            'end': float(row[3]),
+            'speaker': row.speaker,
+            'snippet': _render_snippet(row.snippet),
+        } for row in rows]
+    else:
+        words = query.replace('*', '').split()
+        q = db.session.query(TranscriptionSegment, Transcription.filename)\
+            .join(Transcription, Transcription.id == TranscriptionSegment.transcription_id)\
+            .filter(Transcription.user_id == user_id)
+        if transcription_id is not None:
+            q = q.filter(TranscriptionSegment.transcription_id == transcription_id)
+        for word in words:
+            q = q.filter(TranscriptionSegment.text.ilike(_like_pattern(word), escape='\\'))
+        rows = q.order_by(TranscriptionSegment.transcription_id.desc(), TranscriptionSegment.start)\
+            .offset(offset).limit(limit).all()
+        results = [{
+            'transcription_id': segment.transcription_id,
+            'filename': filename,
+            'start': segment.start,
+            'end': segment.end,
+            'speaker': segment.speaker,
+            'snippet': _like_snippet(segment.text, words),
+        } for segment, filename in rows]
+
+    return results, round((time.perf_counter() - started) * 1000, 2)
@@ -1,42 +1,158 @@
 import os
-import threading
-try:
-    import whisper
-    WHISPER_AVAILABLE = True
-except ImportError:
-    WHISPER_AVAILABLE = False
-
-_whisper_models = {}
-_whisper_lock = threading.Lock()
-
-def load_whisper_model(model_name='base'):
-    if not WHISPER_AVAILABLE:
-        raise RuntimeError("A biblioteca Whisper não está instalada. Instale com: pip install openai-whisper")
-
-    if model_name in _whisper_models:
-        return _whisper_models[model_name]
-    
+
+from app.transcriptions.model_pool import model_cache, get_setting, parse_pool_sizes, parse_model_list
+# whisper / faster-whisper (and torch behind them) are only imported when a
+# model is loaded, so importing this module stays cheap for processes that
+# never run inference.
+from app.transcriptions.engines import get_engine, model_label
+from app.transcriptions.cpu_budget import cpu_budget, job_stages
+
+def load_whisper_model(model_name='base', engine=None):
+    """Load a fresh Whisper model instance (one pool replica) with its configured engine."""
+    engine = engine or get_engine(model_name)
     try:
-        print(f"Carregando modelo Whisper '{model_name}' (isso pode demorar na primeira vez)...")
-        loaded_model = whisper.load_model(model_name)
-        _whisper_models[model_name] = loaded_model
+        print(f"Carregando modelo Whisper '{model_name}' ({engine.spec}; isso pode demorar na primeira vez)...")
+        # Engines that fix their thread count at load time get a fully loaded worker's share
+        loaded_model = engine.load(model_name, cpu_budget.steady_quota())
+        cpu_budget.refresh()
         print(f"Modelo Whisper '{model_name}' carregado com sucesso!")
         return loaded_model
     except Exception as e:
         print(f"Erro ao carregar modelo Whisper '{model_name}': {e}")
         raise e
 
+def whisper_pool_size(model_name):
+    """Replicas for a model size, e.g. WHISPER_REPLICAS="base=3,medium=1"."""
+    sizes = parse_pool_sizes(get_setting('WHISPER_REPLICAS', ''))
+    if model_name in sizes:
+        return sizes[model_name]
+    return int(get_setting('WHISPER_REPLICAS_DEFAULT') or 0) or int(get_setting('TRANSCRIPTION_WORKERS') or 3)
+
+def get_whisper_pool(model_name):
+    engine = get_engine(model_name)
+    return model_cache.get_pool(
+        model_label(model_name, engine),
+        loader=lambda: load_whisper_model(model_name, engine),
+        size=whisper_pool_size(model_name),
+        estimated_bytes=engine.estimated_bytes(model_name)
+    )
+
+def preload_models():
+    """
+    Load (and optionally warm up) the models listed in PRELOAD_MODELS so the
+    first job does not pay the load time. Preloaded models stay pinned: the
+    idle timeout never unloads their last replica.
+    """
+    model_cache.configure()
+    cpu_budget.configure()
+    warmup = get_setting('MODEL_WARMUP') in (True, 'True')
+
+    for model_name in parse_model_list(get_setting('PRELOAD_MODELS', '')):
+        try:
+            if model_name == 'diarization':
+                pool = DiarizationService.get_pool()
+            else:
+                pool = get_whisper_pool(model_name)
+            pool.pinned = True
+            with pool.acquire() as model:
+                if warmup:
+                    _warmup(model_name, model)
+            print(f"[*] Model '{model_name}' preloaded{' and warmed up' if warmup else ''}.")
+        except Exception as e:
+            print(f"[!] Could not preload model '{model_name}': {e}")
+
+def _warmup(model_name, model):
+    """Run one tiny inference so lazy kernels/allocations happen now."""
+    import numpy as np
+    silence = np.zeros(16000, dtype=np.float32)  # 1s at 16 kHz
+    if model_name == 'diarization':
+        import torch
+        model({'waveform': torch.from_numpy(silence)[None], 'sample_rate': 16000})
+    else:
+        model.transcribe(silence, language=get_setting('WHISPER_LANGUAGE') or 'pt', task='transcribe')
+
 
 from app.transcriptions.diarization import DiarizationService
+from app.transcriptions.audio import load_audio, duration_seconds
+from app.transcriptions.alignment import merge_segments, UNKNOWN_SPEAKER
+from app.transcriptions.model_selection import AUTO_MODEL
 
 import concurrent.futures
 
-def transcribe_audio(filepath: str, model_name: str) -> dict:
+class TranscriptionAborted(Exception):
+    """The caller must stop this job; transcribe_audio lets it propagate instead of reporting an error."""
+
+class TranscriptionCancelled(TranscriptionAborted):
+    """The job was cancelled; raised by transcribe_audio at the next stage or chunk boundary."""
+
+def transcribe_audio(filepath: str, model_name: str, on_progress=None, select_model=None,
+                     is_cancelled=None, on_stages=None) -> dict:
+    """
+    Transcribe and diarize an audio file.
+
+    ``on_progress(segments, processed_seconds, total_seconds)`` is called with
+    the Whisper segments produced so far (without speaker labels) as the
+    audio is processed, so callers can publish partial results. It may raise
+    TranscriptionAborted to stop the run.
+
+    ``select_model(duration_seconds)`` is called once the audio is decoded
+    and returns the model to run; it resolves ``model_name='auto'`` (see
+    model_selection.py). Without it 'auto' means WHISPER_MODEL.
+
+    ``is_cancelled()`` is checked between stages, after every chunk or
+    window and between diarization steps; once it returns True,
+    TranscriptionCancelled is raised and the model replicas are returned to
+    their pools. It may also raise TranscriptionAborted itself (e.g. the
+    worker lost the job's lease), which stops the run the same way. A single
+    un-chunked Whisper pass cannot be interrupted.
+
+    ``on_stages(n)`` is told how many CPU stages will run side by side
+    (cpu_budget.job_stages) once it is known whether the audio is chunked.
+    """
     if not os.path.exists(filepath):
         raise FileNotFoundError(f"Arquivo de áudio não encontrado em: {filepath}")
 
+    def check_cancelled(*args, **kwargs):
+        if is_cancelled and is_cancelled():
+            raise TranscriptionCancelled()
+
     try:
-        model = load_whisper_model(model_name)
+        language = get_setting('WHISPER_LANGUAGE') or 'pt'
+        # Word timings let speaker changes split a segment; they cost some extra decoding
+        word_timestamps = get_setting('WHISPER_WORD_TIMESTAMPS') in (True, 'True')
+        
+        # Decode once; Whisper and pyannote share the same 16 kHz buffer
+        audio = load_audio(filepath, cache=get_setting('AUDIO_DECODE_CACHE', True) in (True, 'True'))
+        total_seconds = duration_seconds(audio)
+        check_cancelled()
+        
+        if select_model:
+            model_name = select_model(total_seconds)
+        elif model_name == AUTO_MODEL:
+            model_name = get_setting('WHISPER_MODEL') or 'base'
+        
+        # Resolve pools here, inside the app context, so their sizes come from config
+        engine = get_engine(model_name)
+        whisper_pool = get_whisper_pool(model_name)
+        DiarizationService.get_pool()
+        
+        # Long recordings can be split at silences and transcribed in a process pool
+        chunk_seconds = float(get_setting('TRANSCRIBE_CHUNK_SECONDS') or 300)
+        chunk_workers = int(get_setting('TRANSCRIBE_CHUNK_WORKERS') or 2)
+        chunked = get_setting('TRANSCRIBE_CHUNKED') in (True, 'True') and total_seconds > chunk_seconds
+        # Otherwise, with a progress listener, long files are transcribed in
+        # windows of TRANSCRIBE_PROGRESS_SECONDS so segments arrive incrementally
+        progress_seconds = float(get_setting('TRANSCRIBE_PROGRESS_SECONDS') or 0)
+        windowed = on_progress is not None and progress_seconds > 0 and total_seconds > progress_seconds
+        if on_stages:
+            on_stages(job_stages(chunked, chunk_workers))
+        
+        def on_chunk(segments, processed_seconds):
+            if on_progress:
+                on_progress(segments, processed_seconds, total_seconds)
+            check_cancelled()
+        
+        on_chunk([], 0)
         
         print(f"Iniciando processamento paralelo (Whisper: {model_name} + Diarization)...")
         
@@ -44,13 +160,29 @@ def transcribe_audio(filepath: str, model_name: str) -> dict:
             # Helper for Whisper since it requires kwargs
             def run_whisper():
                 print(f"Iniciando transcrição com Whisper ({model_name})...")
-                with _whisper_lock:
-                    return model.transcribe(filepath, language='pt', task='transcribe')
+                check_cancelled()
+                if chunked:
+                    from app.transcriptions.chunking import transcribe_chunked
+                    # The chunk processes count as that many stages of the CPU budget
+                    with cpu_budget.stage('whisper', weight=chunk_workers):
+                        return transcribe_chunked(audio, model_name, engine.spec, chunk_seconds, chunk_workers,
+                                                  on_chunk=on_chunk, language=language, task='transcribe',
+                                                  word_timestamps=word_timestamps)
+                with cpu_budget.stage('whisper'), whisper_pool.acquire() as model:
+                    if windowed:
+                        from app.transcriptions.chunking import transcribe_sequential
+                        return transcribe_sequential(model, audio, progress_seconds,
+                                                     on_chunk=on_chunk, language=language, task='transcribe',
+                                                     word_timestamps=word_timestamps)
+                    return model.transcribe(audio, language=language, task='transcribe',
+                                            word_timestamps=word_timestamps)
             
             # Helper for Diarization
             def run_diarization():
                 print("Iniciando diarização...")
-                return DiarizationService.diarize(filepath)
+                check_cancelled()
+                with cpu_budget.stage('diarization'):
+                    return DiarizationService.diarize(audio, hook=check_cancelled if is_cancelled else None)
 
             # Submit tasks
             future_whisper = executor.submit(run_whisper)
@@ -59,6 +191,8 @@ def transcribe_audio(filepath: str, model_name: str) -> dict:
             # Wait for Whisper (Primary)
             try:
                 whisper_result = future_whisper.result()
+            except TranscriptionAborted:
+                raise
             except Exception as e:
                 raise RuntimeError(f"Erro no Whisper: {e}")
 
@@ -66,10 +200,13 @@ def transcribe_audio(filepath: str, model_name: str) -> dict:
             diarization_segments = []
             try:
                 diarization_segments = future_diarization.result()
+            except TranscriptionAborted:
+                raise
             except Exception as e:
                 print(f"Erro na diarização (ignorando): {e}")
                 # We can continue without speaker labels
 
+        check_cancelled()
         transcription_text = whisper_result.get('text', '').strip()
         whisper_segments = whisper_result.get('segments', [])
         
@@ -79,54 +216,23 @@ def transcribe_audio(filepath: str, model_name: str) -> dict:
         # Merge results
         if diarization_segments:
             print("Fundindo segmentos de texto e oradores...")
-            structured_data = merge_segments(whisper_segments, diarization_segments)
+            structured_data = merge_segments(whisper_segments, diarization_segments, split_words=word_timestamps)
         else:
             print("Diarização falhou ou vazia, retornando apenas texto.")
-            structured_data = [{"start": s["start"], "end": s["end"], "text": s["text"], "speaker": "Unknown"} for s in whisper_segments]
+            structured_data = [{"start": s["start"], "end": s["end"], "text": s["text"], "speaker": UNKNOWN_SPEAKER} for s in whisper_segments]
 
         return {
             'success': True,
             'transcription': transcription_text,
             'segments': structured_data,
-            'model_used': f'whisper-{model_name}'
+            'model_used': model_label(model_name, engine),
+            'model_name': model_name,
+            'duration': total_seconds
         }
 
+    except TranscriptionAborted:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         return {'error': f'Erro durante a transcrição: {str(e)}'}
-
-def merge_segments(whisper_segments, diarization_segments):
-    """
-    Merges Whisper text segments with Pyannote speaker segments based on time overlap.
-    """
-    merged = []
-    
-    for w_seg in whisper_segments:
-        w_start = w_seg['start']
-        w_end = w_seg['end']
-        w_text = w_seg['text']
-        
-        # Find the speaker with the most overlap for this segment
-        best_speaker = "Unknown"
-        max_overlap = 0
-        
-        for d_seg in diarization_segments:
-            # Calculate overlap
-            start = max(w_start, d_seg['start'])
-            end = min(w_end, d_seg['end'])
-            overlap = max(0, end - start)
-            
-            if overlap > max_overlap:
-                max_overlap = overlap
-                best_speaker = d_seg['speaker']
-        
-        merged.append({
-            "start": w_start,
-            "end": w_end,
-            "text": w_text,
-            "speaker": best_speaker
-        })
-        
-    return merged
-
@@ -0,0 +1,208 @@
+"""
+Upload storage.
+
+Finished uploads live in content-addressed storage under UPLOAD_FOLDER:
+``objects/<first 2 hex chars>/<sha256>.<ext>``. Paths are therefore unique
+per content, two users uploading ``meeting.wav`` never collide, and
+identical files are stored once. Uploads in progress are written to
+``partial/<upload_id>.part`` and moved into place once complete and
+verified, so every byte is written to disk exactly once.
+
+Data is streamed in fixed-size blocks and hashed (SHA-256) on the way; the
+running hash of a resumable upload is kept in memory between chunks, so
+normally no extra pass over the file is needed to get its content hash.
+"""
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+
+from flask import current_app
+
+try:
+    import fcntl
+except ImportError:  # Windows: uploads are only serialized within one process
+    fcntl = None
+
+COPY_BLOCK_SIZE = 1024 * 1024  # 1 MiB
+OBJECTS_DIR = 'objects'
+PARTIAL_DIR = 'partial'
+
+# upload_id -> (offset, sha256 object) for uploads whose chunks arrived in
+# this process. Missing after a restart or on another web process; the hash
+# is then recomputed from the partial file.
+_running_hashes = {}
+_running_lock = threading.Lock()
+_fallback_upload_lock = threading.Lock()
+
+
+class ChecksumMismatch(Exception):
+    pass
+
+
+def upload_folder() -> str:
+    return current_app.config['UPLOAD_FOLDER']
+
+
+def absolute_path(relative_path: str) -> str:
+    return os.path.join(upload_folder(), relative_path)
+
+
+def locate(relative_path: str) -> str:
+    """
+    Current location of stored audio. Compaction may have re-encoded an
+    object since a row recorded its path; any file with the same content
+    hash stem holds the same audio.
+    """
+    if os.path.exists(absolute_path(relative_path)):
+        return relative_path
+    directory, name = os.path.split(relative_path)
+    if os.path.normpath(directory).split(os.sep)[0] == OBJECTS_DIR:
+        stem = name.split('.', 1)[0]
+        try:
+            for candidate in sorted(os.listdir(absolute_path(directory))):
+                if candidate.split('.', 1)[0] == stem and candidate.count('.') == 1:
+                    return os.path.join(directory, candidate)
+        except FileNotFoundError:
+            pass
+    return relative_path
+
+
+def partial_path(upload_id: str) -> str:
+    return os.path.join(upload_folder(), PARTIAL_DIR, f"{upload_id}.part")
+
+
+def object_path(sha256: str, extension: str) -> str:
+    """Content-addressed location, relative to UPLOAD_FOLDER."""
+    return os.path.join(OBJECTS_DIR, sha256[:2], f"{sha256}.{extension}")
+
+
+@contextmanager
+def upload_lock(upload_id: str):
+    """
+    Serializes chunk writes to one upload across threads and processes
+    (every web process shares UPLOAD_FOLDER): an exclusive flock on the
+    partial file, released when it is closed. If the partial file is gone,
+    the upload was already completed or discarded and there is nothing to
+    protect; the caller's status check rejects the request.
+    """
+    if fcntl is None:
+        with _fallback_upload_lock:
+            yield
+        return
+    try:
+        fd = os.open(partial_path(upload_id), os.O_RDWR)
+    except FileNotFoundError:
+        yield
+        return
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def create_partial(upload_id: str):
+    path = partial_path(upload_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    with _running_lock:
+        _running_hashes[upload_id] = (0, hashlib.sha256())
+
+
+def write_chunk(upload_id: str, offset: int, stream, max_bytes: int = None, expected_digest: bytes = None) -> int:
+    """
+    Write a chunk read from ``stream`` at ``offset`` of the partial file,
+    reading at most ``max_bytes`` (None = until EOF). Returns the number of
+    bytes written.
+
+    If ``expected_digest`` (raw SHA-256 of the chunk) is given and does not
+    match, the file is truncated back to ``offset`` and ChecksumMismatch is
+    raised, so the client can simply resend the chunk.
+    """
+    path = partial_path(upload_id)
+    chunk_digest = hashlib.sha256()
+    with _running_lock:
+        offset_hashed, running = _running_hashes.get(upload_id, (None, None))
+    if offset_hashed != offset:
+        running = None
+    else:
+        running = running.copy()
+
+    written = 0
+    with open(path, 'r+b') as out:
+        out.seek(offset)
+        out.truncate()
+        while max_bytes is None or written < max_bytes:
+            block = stream.read(COPY_BLOCK_SIZE if max_bytes is None else min(COPY_BLOCK_SIZE, max_bytes - written))
+            if not block:
+                break
+            out.write(block)
+            chunk_digest.update(block)
+            if running is not None:
+                running.update(block)
+            written += len(block)
+
+        if expected_digest is not None and chunk_digest.digest() != expected_digest:
+            out.truncate(offset)
+            raise ChecksumMismatch()
+
+    if running is not None:
+        with _running_lock:
+            _running_hashes[upload_id] = (offset + written, running)
+    return written
+
+
+def read_head(upload_id: str, size: int) -> bytes:
+    """First ``size`` bytes of a partial upload (for format sniffing)."""
+    with open(partial_path(upload_id), 'rb') as f:
+        return f.read(size)
+
+
+def content_hash(upload_id: str, size: int) -> str:
+    """SHA-256 of a complete partial file, from the running hash if available."""
+    with _running_lock:
+        offset_hashed, running = _running_hashes.get(upload_id, (None, None))
+    if running is not None and offset_hashed == size:
+        return running.hexdigest()
+    return hash_file(partial_path(upload_id))
+
+
+def commit_partial(upload_id: str, sha256: str, extension: str) -> str:
+    """
+    Move a complete partial file to its content-addressed location and
+    return that location (relative to UPLOAD_FOLDER). If the same content
+    is already stored, the partial file is simply dropped.
+    """
+    relative_path = object_path(sha256, extension)
+    target = absolute_path(relative_path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if os.path.exists(target):
+        os.remove(partial_path(upload_id))
+    else:
+        os.replace(partial_path(upload_id), target)
+    discard_partial(upload_id, remove_file=False)
+    return relative_path
+
+
+def discard_partial(upload_id: str, remove_file: bool = True):
+    with _running_lock:
+        _running_hashes.pop(upload_id, None)
+    path = partial_path(upload_id)
+    if remove_file and os.path.exists(path):
+        os.remove(path)
+
+
+def save_stream(upload_id: str, stream) -> int:
+    """Copy a whole stream into a new partial file. Returns its size."""
+    create_partial(upload_id)
+    return write_chunk(upload_id, 0, stream)
+
+
+def hash_file(path: str) -> str:
+    """SHA-256 of a file already on disk."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(COPY_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
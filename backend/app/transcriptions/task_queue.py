@@ -1,154 +1,393 @@
 import os
+import time
 import threading
-import queue
-from typing import Callable, Dict, Any
+from collections import deque
+from typing import Dict, Any
 from app.extensions import db
-from app.transcriptions.models import Transcription
-from flask import current_app
+from app.transcriptions.models import Transcription, TranscriptionJob
+from app.transcriptions import jobs
+from app.transcriptions.events import broker
+from app.transcriptions import search
+from app.transcriptions import result_cache
+from app.transcriptions import storage
+from app.transcriptions.cpu_budget import cpu_budget, job_stages
+from app.transcriptions.model_selection import AUTO_MODEL, choose_model
 
 class TranscriptionTaskQueue:
     """
-    Thread-safe task queue manager for background transcription processing.
-    Limits concurrent workers to 3 and queues additional tasks.
+    Worker-side dispatcher for background transcription processing.
+    Claims jobs from the durable job table (see jobs.py, which decides the
+    order), runs them on a fixed pool of max_workers threads and keeps their
+    leases alive.
+
+    The dispatcher and the pool threads sleep on one condition variable:
+    the dispatcher until a pool thread is free and the CPU budget admits
+    another job, the pool threads until a claimed job is handed to them.
+    With nothing queued the dispatcher checks the table every
+    WORKER_POLL_INTERVAL seconds, or right away when notify() is called.
     """
     
     def __init__(self, app=None, max_workers=3):
         self.max_workers = max_workers
-        self.task_queue = queue.Queue()
         self.active_workers = 0
-        self.lock = threading.Lock()
+        self.lock = threading.Condition()
         self._shutdown = False
+        self._stopped = threading.Event()
+        self._wakeup_pending = False
+        self._ready = deque()  # Claimed tasks waiting for a pool thread
         self.app = app # Store app instance to create contexts
+        self.worker_id = jobs.make_worker_id()
+        self.running_jobs = {}  # job_id -> transcription_id
+
+        config = app.config if app else {}
+        self.lease_seconds = config.get('JOB_LEASE_SECONDS', 120)
+        self.heartbeat_seconds = config.get('JOB_HEARTBEAT_SECONDS', 30)
+        self.poll_interval = config.get('WORKER_POLL_INTERVAL', 2)
+        # CPU stages reserved per job until it knows whether it is chunked
+        self.admit_stages = job_stages(config.get('TRANSCRIBE_CHUNKED') in (True, 'True'),
+                                       config.get('TRANSCRIBE_CHUNK_WORKERS', 2))
         
-        # Start the queue processor thread
+        # Fixed pool of task threads, the queue processor and the lease heartbeat
+        self.pool_threads = [
+            threading.Thread(target=self._worker_loop, name=f'transcription-worker-{i}', daemon=True)
+            for i in range(max_workers)
+        ]
+        for thread in self.pool_threads:
+            thread.start()
         self.processor_thread = threading.Thread(target=self._process_queue, daemon=True)
         self.processor_thread.start()
-        print(f"[*] TranscriptionTaskQueue initialized with {max_workers} workers.")
+        self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        self.heartbeat_thread.start()
+        print(f"[*] TranscriptionTaskQueue initialized with {max_workers} workers (id={self.worker_id}).")
     
-    def submit_task(self, transcription_id: int, filepath: str, model_name: str):
-        """
-        Submit a transcription task to the queue.
-        
-        Args:
-            transcription_id: ID of the transcription record
-            filepath: Path to the audio file
-            model_name: Whisper model to use
-        """
-        task = {
-            'transcription_id': transcription_id,
-            'filepath': filepath,
-            'model_name': model_name
-        }
-        self.task_queue.put(task)
-        print(f"Task {transcription_id} added to queue. Queue size: {self.task_queue.qsize()}")
+    def notify(self):
+        """Wake the dispatcher early (e.g. after a job was enqueued in-process)."""
+        with self.lock:
+            self._wakeup_pending = True
+            self.lock.notify_all()
+    
+    def _can_start(self):
+        # Caller holds self.lock; reserves the CPU budget when it returns True
+        return self.active_workers < self.max_workers and cpu_budget.try_admit(self.admit_stages)
     
     def _process_queue(self):
-        """Background thread that processes tasks from the queue."""
-        while not self._shutdown:
+        """Background thread that claims jobs from the database."""
+        while True:
+            with self.lock:
+                # Sleep until a pool thread is free and the CPU budget has
+                # room for another job's stages
+                while not self._shutdown and not self._can_start():
+                    self.lock.wait()
+                if self._shutdown:
+                    break
+                self.active_workers += 1
+            
+            task = None
             try:
-                # Wait for a task (blocking with timeout)
-                task = self.task_queue.get(timeout=1)
-                
-                # Wait until we have an available worker slot
-                while True:
-                    with self.lock:
-                        if self.active_workers < self.max_workers:
-                            self.active_workers += 1
-                            break
-                    threading.Event().wait(0.5)  # Wait before checking again
-                
-                # Start worker thread for this task
-                worker = threading.Thread(
-                    target=self._execute_task,
-                    args=(task,),
-                    daemon=True
-                )
-                worker.start()
-                
-            except queue.Empty:
-                continue
+                with self.app.app_context():
+                    job = jobs.claim_job(self.worker_id, self.lease_seconds)
+                    if job:
+                        task = {
+                            'job_id': job.id,
+                            'transcription_id': job.transcription_id,
+                            'filepath': audio_path(self.app, job.transcription),
+                            'model_name': job.model_name,
+                            'stages': self.admit_stages  # Reserved in the CPU budget
+                        }
+                    db.session.remove()
             except Exception as e:
                 print(f"Error in queue processor: {e}")
+            
+            with self.lock:
+                if task is None:
+                    self.active_workers -= 1
+                    cpu_budget.release(self.admit_stages)
+                    if not self._wakeup_pending and not self._shutdown:
+                        self.lock.wait(self.poll_interval)
+                    self._wakeup_pending = False
+                    continue
+                self.running_jobs[task['job_id']] = task['transcription_id']
+                self._ready.append(task)
+                self.lock.notify_all()
+            print(f"Task {task['transcription_id']} claimed (job {task['job_id']}).")
+    
+    def _worker_loop(self):
+        """Pool thread: run claimed tasks one at a time."""
+        while True:
+            with self.lock:
+                while not self._ready and not self._shutdown:
+                    self.lock.wait()
+                if self._shutdown:
+                    # Claimed but not started: the lease expires and another worker takes it
+                    return
+                task = self._ready.popleft()
+            self._execute_task(task)
+    
+    def _heartbeat_loop(self):
+        """Extend the lease of every job this process is running."""
+        while not self._stopped.wait(self.heartbeat_seconds):
+            with self.lock:
+                job_ids = list(self.running_jobs)
+            if not job_ids:
+                continue
+            try:
+                with self.app.app_context():
+                    for job_id in job_ids:
+                        if not jobs.heartbeat(job_id, self.worker_id, self.lease_seconds) \
+                                and not jobs.is_cancelled(job_id):
+                            print(f"[!] Lease lost for job {job_id}; its result will be discarded.")
+                    db.session.remove()
+            except Exception as e:
+                print(f"[!] Error sending heartbeat: {e}")
     
     def _execute_task(self, task: Dict[str, Any]):
         """
         Execute a single transcription task.
         """
+        job_id = task['job_id']
         transcription_id = task['transcription_id']
         filepath = task['filepath']
         model_name = task['model_name']
         
         try:
             # Import here to avoid circular imports
-            from app.transcriptions.services import transcribe_audio
-            
-            # Use the stored app instance if available, otherwise we'll have to create one (risky)
-            if not self.app:
-                print("[!] Warning: No app instance available in task worker. This might cause issues.")
-                from app import create_app
-                self.app = create_app()
+            from app.transcriptions.services import transcribe_audio, TranscriptionAborted, TranscriptionCancelled
 
             with self.app.app_context():
-                # Update status to processing
-                transcription = Transcription.query.get(transcription_id)
-                if transcription:
-                    transcription.status = 'processing'
-                    transcription.progress = 10
-                    db.session.commit()
-                
                 print(f"[*] Transcription {transcription_id}: Starting processing with model {model_name}")
+                self._publish(transcription_id)
+                
+                # Perform transcription, saving partial segments as they arrive
+                saved = {'count': 0}
+                def on_progress(segments, processed_seconds, total_seconds):
+                    self._save_progress(job_id, transcription_id, segments, saved, processed_seconds, total_seconds)
+                
+                def select_model(duration):
+                    return self._select_model(transcription_id, model_name, duration)
+                
+                def is_cancelled():
+                    return self._is_cancelled(job_id)
+                
+                def on_stages(stages):
+                    self._reserve_stages(task, stages)
                 
-                # Perform transcription
-                result = transcribe_audio(filepath, model_name)
+                started = time.monotonic()
+                try:
+                    result = transcribe_audio(filepath, model_name, on_progress=on_progress,
+                                              select_model=select_model, is_cancelled=is_cancelled,
+                                              on_stages=on_stages)
+                except TranscriptionCancelled:
+                    # The cancel request already set the final status
+                    print(f"[*] Transcription {transcription_id}: cancelled, stopped early.")
+                    self._publish(transcription_id)
+                    return
+                except TranscriptionAborted:
+                    # Another worker owns the job now; leave it alone
+                    print(f"[!] Transcription {transcription_id}: lease lost, stopped early.")
+                    return
+                elapsed = time.monotonic() - started
                 
-                # Update database with results
+                # Update database with results, only if we still hold the lease
                 transcription = Transcription.query.get(transcription_id)
+                final_status = 'failed' if result.get('error') else 'done'
+                if not jobs.finish_job(job_id, self.worker_id, status=final_status):
+                    db.session.rollback()
+                    reason = 'cancelled' if jobs.is_cancelled(job_id) else 'lease lost'
+                    print(f"[!] Transcription {transcription_id}: {reason}, discarding result.")
+                    return
+                
                 if transcription:
                     if result.get('error'):
                         transcription.status = 'failed'
                         transcription.error_message = result['error']
                         transcription.progress = 0
+                        search.remove_transcription(transcription_id)
                     else:
                         transcription.status = 'completed'
                         transcription.text = result['transcription']
-                        transcription.structured_data = result.get('segments')
+                        transcription.replace_segments(result.get('segments') or [])
                         transcription.progress = 100
+                        transcription.bump_revision()
+                        if result.get('duration'):
+                            # Feeds the 'auto' model's speed estimates
+                            transcription.realtime_factor = elapsed / result['duration']
                     
-                    db.session.commit()
-                    print(f"[✓] Transcription {transcription_id} completed. Status: {transcription.status}")
+                db.session.commit()
+                if final_status == 'done':
+                    # Incremental search index update for this transcript only
+                    search.index_transcription(transcription_id)
+                    self._cache_result(transcription_id, result.get('model_name', model_name), result)
+                self._publish(transcription_id)
+                print(f"[✓] Transcription {transcription_id} completed. Status: {final_status}")
                 
         except Exception as e:
             print(f"[!] Error executing task {transcription_id}: {e}")
             import traceback
             traceback.print_exc()
             
-            if self.app:
-                with self.app.app_context():
+            with self.app.app_context():
+                db.session.rollback()
+                if jobs.is_cancelled(job_id):
+                    pass  # Failed while being cancelled: nothing to retry or report
+                elif jobs.release_for_retry(job_id, self.worker_id):
+                    transcription = Transcription.query.get(transcription_id)
+                    if transcription:
+                        transcription.status = 'pending'
+                        transcription.progress = 0
+                    print(f"[*] Job {job_id} re-queued for another attempt.")
+                else:
                     transcription = Transcription.query.get(transcription_id)
                     if transcription:
                         transcription.status = 'failed'
                         transcription.error_message = str(e)
                         transcription.progress = 0
-                        db.session.commit()
+                        search.remove_transcription(transcription_id)
+                db.session.commit()
+                self._publish(transcription_id)
         
         finally:
             # Release worker slot
             with self.lock:
+                self.running_jobs.pop(job_id, None)
                 self.active_workers -= 1
+                cpu_budget.release(task['stages'])
+                self.lock.notify_all()
+            if self.app:
+                with self.app.app_context():
+                    db.session.remove()
             print(f"[*] Worker released. Active workers: {self.active_workers}")
     
+    def _select_model(self, transcription_id, model_name, duration):
+        """Resolve 'auto' for this job and record the model that will run."""
+        if model_name == AUTO_MODEL:
+            model_name, decision = choose_model(duration, transcription_id)
+            print(f"[*] Transcription {transcription_id}: 'auto' chose model {model_name} {decision}")
+        try:
+            transcription = Transcription.query.get(transcription_id)
+            if transcription:
+                transcription.model_name = model_name
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"[!] Could not record model of transcription {transcription_id}: {e}")
+        return model_name
+    
+    def _reserve_stages(self, task, stages):
+        """Give back CPU stages reserved at admission that the job will not run."""
+        with self.lock:
+            surplus = task['stages'] - stages
+            if surplus > 0:
+                cpu_budget.release(surplus)
+                task['stages'] = stages
+                self.lock.notify_all()  # Room for another job, maybe
+    
+    def _is_cancelled(self, job_id):
+        """
+        Whether the job was cancelled (called from inference threads, at
+        every stage, chunk and diarization step boundary). Raises
+        TranscriptionAborted once this worker no longer holds the lease.
+        """
+        from app.transcriptions.services import TranscriptionAborted
+
+        try:
+            with self.app.app_context():
+                state = jobs.job_state(job_id, self.worker_id)
+                db.session.remove()
+        except Exception as e:
+            print(f"[!] Could not check cancellation of job {job_id}: {e}")
+            return False
+        if state == 'lost':
+            raise TranscriptionAborted(f"Lease of job {job_id} lost")
+        return state == 'cancelled'
+    
+    def _cache_result(self, transcription_id, model_name, result):
+        """Store a finished result in the result cache; never fails the job."""
+        try:
+            transcription = Transcription.query.get(transcription_id)
+            if transcription is None or not transcription.audio_hash:
+                return
+            result_cache.store(
+                transcription.audio_hash,
+                model_name,
+                result['transcription'],
+                result.get('segments') or [],
+                duration=transcription.duration
+            )
+        except Exception as e:
+            db.session.rollback()
+            print(f"[!] Could not cache result of transcription {transcription_id}: {e}")
+
+    def _publish(self, transcription_id):
+        """Push the current state to SSE subscribers in this process, if any."""
+        transcription = Transcription.query.get(transcription_id)
+        if transcription:
+            broker.publish_transcription(transcription)
+    
+    def _save_progress(self, job_id, transcription_id, segments, saved, processed_seconds, total_seconds):
+        """
+        Store real progress and append the segments produced since the last
+        call (called from inference threads). ``saved['count']`` tracks how
+        many of ``segments`` are already in the database.
+
+        The writes share a transaction with a lease renewal, so they are
+        only made while this worker still owns the job; otherwise
+        TranscriptionAborted stops the run.
+        """
+        from app.transcriptions.services import TranscriptionAborted
+
+        try:
+            with self.app.app_context():
+                transcription = Transcription.query.get(transcription_id)
+                if transcription is None or transcription.status != 'processing':
+                    return
+                if not jobs.heartbeat(job_id, self.worker_id, self.lease_seconds, commit=False):
+                    db.session.rollback()
+                    if not jobs.is_cancelled(job_id):  # Cancellation stops the run via is_cancelled
+                        raise TranscriptionAborted(f"Lease of job {job_id} lost")
+                    return
+                fraction = processed_seconds / total_seconds if total_seconds else 0
+                # 10% is reserved for the start, the last 5% for merging speakers
+                transcription.progress = min(95, 10 + int(85 * fraction))
+                transcription.duration = total_seconds
+                transcription.processed_seconds = processed_seconds
+                if processed_seconds == 0:
+                    # Fresh start: drop partial segments of an earlier attempt
+                    transcription.replace_segments([])
+                    saved['count'] = 0
+                new_segments = segments[saved['count']:]
+                if new_segments:
+                    transcription.append_segments(
+                        [{"start": s["start"], "end": s["end"], "text": s["text"], "speaker": "Unknown"}
+                         for s in new_segments],
+                        first_position=saved['count']
+                    )
+                    transcription.text = ''.join(s['text'] for s in segments).strip()
+                    saved['count'] = len(segments)
+                db.session.commit()
+                broker.publish_transcription(transcription)
+        except TranscriptionAborted:
+            raise
+        except Exception as e:
+            print(f"[!] Could not save progress for transcription {transcription_id}: {e}")
+    
     def get_queue_info(self):
         """Get information about the current queue state."""
+        with self.app.app_context():
+            queued_tasks = jobs.count_jobs('queued')
         with self.lock:
             return {
                 'active_workers': self.active_workers,
-                'queued_tasks': self.task_queue.qsize(),
-                'max_workers': self.max_workers
+                'queued_tasks': queued_tasks,
+                'max_workers': self.max_workers,
+                'cpu': cpu_budget.stats()
             }
     
     def shutdown(self):
         """Gracefully shutdown the queue processor."""
-        self._shutdown = True
+        with self.lock:
+            self._shutdown = True
+            self.lock.notify_all()
+        self._stopped.set()
         if self.processor_thread.is_alive():
             self.processor_thread.join(timeout=5)
 
@@ -160,33 +399,35 @@ def get_task_queue(app=None) -> TranscriptionTaskQueue:
     """Get or create the global task queue instance."""
     global _task_queue
     if _task_queue is None:
-        _task_queue = TranscriptionTaskQueue(app=app, max_workers=3)
-    elif app and _task_queue.app is None:
-        _task_queue.app = app
+        _task_queue = TranscriptionTaskQueue(app=app, max_workers=app.config.get('TRANSCRIPTION_WORKERS', 3))
     return _task_queue
 
+def audio_path(app, transcription):
+    """Path of the uploaded audio for a transcription (call inside an app context)."""
+    relative_path = transcription.storage_path or transcription.filename
+    return os.path.join(app.config['UPLOAD_FOLDER'], storage.locate(relative_path))
+
 def recover_ghost_tasks(app):
     """
-    Finds transcriptions that were left 'pending' or 'processing' 
-    (ghost tasks from a crash/restart) and re-queues them.
+    Creates jobs for transcriptions that are 'pending' or 'processing' but
+    have no job row (records written before the durable job table existed).
+    Interrupted jobs need no recovery: their lease expires and any worker
+    reclaims them. Cancelled transcriptions are left alone. Safe to run
+    from several processes at once.
     """
     with app.app_context():
-        # Avoid circular import
-        from app.auth.user_preferences import UserPreferences
-        
-        ghost_tasks = Transcription.query.filter(Transcription.status.in_(['pending', 'processing'])).all()
+        ghost_tasks = Transcription.query\
+            .outerjoin(TranscriptionJob, TranscriptionJob.transcription_id == Transcription.id)\
+            .filter(Transcription.status.in_(['pending', 'processing']),
+                    TranscriptionJob.id.is_(None))\
+            .all()
         if not ghost_tasks:
             return
             
         print(f"[*] Found {len(ghost_tasks)} ghost tasks. Re-queuing for background processing...")
-        queue = get_task_queue(app=app)
         
         for task in ghost_tasks:
-            # Try to get the user's preferred model
-            prefs = UserPreferences.query.filter_by(user_id=task.user_id).first()
-            model_name = prefs.whisper_model if prefs else 'base'
-            
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], task.filename)
+            filepath = audio_path(app, task)
             
             # Reset status to pending to ensure clean start
             task.status = 'pending'
@@ -195,10 +436,15 @@ def recover_ghost_tasks(app):
             
             # Check if file exists before queuing
             if os.path.exists(filepath):
-                queue.submit_task(task.id, filepath, model_name)
+                jobs.enqueue_job(task, jobs.resolve_model_name(task.user_id))
             else:
                 print(f"[!] Warning: File for task {task.id} not found at {filepath}. Marking as failed.")
                 task.status = 'failed'
                 task.error_message = "Arquivo original não encontrado no servidor para processamento."
         
-        db.session.commit()
+        try:
+            db.session.commit()
+        except Exception as e:
+            # Another process backfilled the same rows first (unique transcription_id)
+            db.session.rollback()
+            print(f"[*] Ghost tasks already recovered by another process: {e}")
@@ -0,0 +1,101 @@
+"""
+Standalone inference worker.
+
+Run with ``python -m app.transcriptions.worker``. The gunicorn web processes
+only accept uploads and create 'pending' records; this process is the only
+one that loads Whisper/pyannote and runs transcriptions, so the models live
+in memory exactly once and inference concurrency is set in one place
+(``TRANSCRIPTION_WORKERS``).
+"""
+import signal
+import threading
+
+from app.transcriptions.task_queue import get_task_queue, recover_ghost_tasks
+
+
+class TranscriptionWorker:
+    """
+    Owns the local TranscriptionTaskQueue, which claims jobs from the
+    durable job table until the worker is stopped.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._stop = threading.Event()
+
+    def run(self):
+        """Backfill jobs for legacy records, then process jobs until stopped."""
+        recover_ghost_tasks(self.app)
+        with self.app.app_context():
+            # First run after upgrading: index transcripts completed before search existed
+            from app.transcriptions.search import rebuild_if_empty
+            rebuild_if_empty()
+
+            # Import here: only the worker needs the ML stack
+            from app.transcriptions.services import preload_models
+            preload_models()
+        task_queue = get_task_queue(app=self.app)
+        print(f"[*] Inference worker started (workers={task_queue.max_workers}).")
+        if self.app.config.get('STORAGE_MAINTENANCE_INTERVAL'):
+            threading.Thread(target=self._maintenance_loop, daemon=True).start()
+        self._stop.wait()
+        task_queue.shutdown()
+        # Chunk process pools are child processes: stop them with the worker
+        from app.transcriptions.model_pool import model_cache
+        model_cache.close_all()
+        print("[*] Inference worker stopped.")
+
+    def _maintenance_loop(self):
+        """Compact, expire and garbage-collect stored audio periodically."""
+        from app.transcriptions.compaction import run_maintenance
+
+        interval = self.app.config['STORAGE_MAINTENANCE_INTERVAL']
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    run_maintenance()
+            except Exception as e:
+                print(f"[!] Storage maintenance error: {e}")
+            self._stop.wait(interval)
+
+    def stop(self):
+        self._stop.set()
+
+
+def start_embedded_worker(app):
+    """
+    Run the worker loop in a daemon thread of the current process.
+    Intended for local development (``EMBEDDED_WORKER=True``) only.
+    """
+    worker = TranscriptionWorker(app)
+    thread = threading.Thread(target=worker.run, daemon=True)
+    thread.start()
+    return worker
+
+
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    from app import create_app
+    from config import Config
+
+    class WorkerConfig(Config):
+        # This process *is* the worker; never start a second one inside it.
+        EMBEDDED_WORKER = False
+
+    app = create_app(WorkerConfig)
+    worker = TranscriptionWorker(app)
+
+    def handle_signal(signum, frame):
+        print(f"[*] Signal {signum} received, stopping worker...")
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    worker.run()
+
+
+if __name__ == '__main__':
+    main()
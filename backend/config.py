@@ -18,12 +18,117 @@ class Config:
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or \
         os.path.join(basedir, 'instance', 'uploads')
     MAX_CONTENT_LENGTH = 700 * 1024 * 1024  # 700MB
+    # Cached transcript exports (TXT/SRT/VTT/JSON), one file per format and revision
+    EXPORT_CACHE_ENABLED = os.environ.get('EXPORT_CACHE_ENABLED', 'True') == 'True'
+    EXPORT_CACHE_FOLDER = os.environ.get('EXPORT_CACHE_FOLDER') or \
+        os.path.join(basedir, 'instance', 'exports')
+    # JSON/transcript responses smaller than this are sent uncompressed
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE') or 1024)
+    # Resumable uploads: largest file accepted and the chunk size suggested to clients
+    UPLOAD_MAX_SIZE = int(os.environ.get('UPLOAD_MAX_SIZE') or 700 * 1024 * 1024)
+    UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE') or 8 * 1024 * 1024)
+
+    # Storage maintenance (run by the worker every STORAGE_MAINTENANCE_INTERVAL
+    # seconds, 0 = off): re-encode finished WAV uploads to STORAGE_COMPACT_CODEC
+    # ('flac' lossless, 'opus' lossy speech, '' = keep WAV), delete audio of
+    # finished transcriptions after AUDIO_RETENTION_DAYS (0 = keep forever) and
+    # files nothing references (abandoned or never transcribed uploads) after
+    # UPLOAD_ORPHAN_HOURS.
+    STORAGE_MAINTENANCE_INTERVAL = int(os.environ.get('STORAGE_MAINTENANCE_INTERVAL') or 3600)
+    STORAGE_COMPACT_CODEC = os.environ.get('STORAGE_COMPACT_CODEC', 'flac')
+    STORAGE_OPUS_BITRATE = os.environ.get('STORAGE_OPUS_BITRATE') or '32k'
+    AUDIO_RETENTION_DAYS = int(os.environ.get('AUDIO_RETENTION_DAYS') or 0)
+    UPLOAD_ORPHAN_HOURS = int(os.environ.get('UPLOAD_ORPHAN_HOURS') or 24)
 
     # Whisper
     WHISPER_MODEL = os.environ.get('WHISPER_MODEL') or 'base'
+    # whisper_model='auto': the largest of AUTO_MODEL_CANDIDATES expected to
+    # finish (including the work queued ahead) within the audio duration x
+    # AUTO_MODEL_TARGET_RTF, or AUTO_MODEL_MIN_BUDGET_SECONDS for short files.
+    # Speeds are averaged over each model's last AUTO_MODEL_RTF_SAMPLES jobs.
+    AUTO_MODEL_CANDIDATES = os.environ.get('AUTO_MODEL_CANDIDATES') or 'tiny,base,small,medium'
+    AUTO_MODEL_TARGET_RTF = float(os.environ.get('AUTO_MODEL_TARGET_RTF') or 0.5)
+    AUTO_MODEL_MIN_BUDGET_SECONDS = float(os.environ.get('AUTO_MODEL_MIN_BUDGET_SECONDS') or 120)
+    AUTO_MODEL_RTF_SAMPLES = int(os.environ.get('AUTO_MODEL_RTF_SAMPLES') or 20)
+    WHISPER_LANGUAGE = os.environ.get('WHISPER_LANGUAGE') or 'pt'
+    # Inference engine: 'whisper' (PyTorch FP32) or 'faster-whisper[:compute type]'
+    # (CTranslate2; int8, int8_float32, int16 or float32). WHISPER_ENGINE_MODELS
+    # overrides it per model, e.g. "large=faster-whisper:int8,base=whisper".
+    WHISPER_ENGINE = os.environ.get('WHISPER_ENGINE') or 'whisper'
+    WHISPER_ENGINE_MODELS = os.environ.get('WHISPER_ENGINE_MODELS', '')
+    WHISPER_COMPUTE_TYPE = os.environ.get('WHISPER_COMPUTE_TYPE') or 'int8'
+    # Word timestamps: segments are split where the speaker changes mid-sentence
+    WHISPER_WORD_TIMESTAMPS = os.environ.get('WHISPER_WORD_TIMESTAMPS', 'False') == 'True'
+
+    # Result cache: finished results keyed by audio hash, model, language and
+    # pipeline version. Least recently used entries are evicted beyond either
+    # limit (0 = no limit).
+    RESULT_CACHE_ENABLED = os.environ.get('RESULT_CACHE_ENABLED', 'True') == 'True'
+    RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES') or 1000)
+    RESULT_CACHE_MAX_MB = int(os.environ.get('RESULT_CACHE_MAX_MB') or 200)
+
+    # Keep each decoded upload as <file>.pcm16k.npy so retries skip decoding
+    AUDIO_DECODE_CACHE = os.environ.get('AUDIO_DECODE_CACHE', 'True') == 'True'
+
+    # Chunked mode: audio longer than TRANSCRIBE_CHUNK_SECONDS is split at
+    # silences and transcribed by TRANSCRIBE_CHUNK_WORKERS processes per job
+    TRANSCRIBE_CHUNKED = os.environ.get('TRANSCRIBE_CHUNKED') == 'True' # False by default
+    TRANSCRIBE_CHUNK_SECONDS = float(os.environ.get('TRANSCRIBE_CHUNK_SECONDS') or 300)
+    TRANSCRIBE_CHUNK_WORKERS = int(os.environ.get('TRANSCRIBE_CHUNK_WORKERS') or 2)
+    # Window size for incremental partial results outside chunked mode (0 = off,
+    # the default). Windows are cut at silences, but Whisper sees each one
+    # separately, so the output can differ slightly from a single pass.
+    TRANSCRIBE_PROGRESS_SECONDS = float(os.environ.get('TRANSCRIBE_PROGRESS_SECONDS') or 0)
+
+    # Inference worker
+    # Total concurrent transcriptions, set once for the whole deployment.
+    TRANSCRIPTION_WORKERS = int(os.environ.get('TRANSCRIPTION_WORKERS') or 3)
+    # CPU budget of the worker: cores shared by the running Whisper/diarization
+    # stages (0 = all cores available to the process). A job only starts while
+    # every running stage would still get CPU_MIN_THREADS_PER_STAGE threads.
+    CPU_CORES = int(os.environ.get('CPU_CORES') or 0)
+    CPU_MIN_THREADS_PER_STAGE = int(os.environ.get('CPU_MIN_THREADS_PER_STAGE') or 2)
+    CPU_INTEROP_THREADS = int(os.environ.get('CPU_INTEROP_THREADS') or 1)
+    WORKER_POLL_INTERVAL = float(os.environ.get('WORKER_POLL_INTERVAL') or 2)
+    # Durable job queue: lease length, heartbeat period and retry bound
+    JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS') or 120)
+    JOB_HEARTBEAT_SECONDS = int(os.environ.get('JOB_HEARTBEAT_SECONDS') or 30)
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS') or 3)
+    # Scheduling: fair share between users, then shortest expected job first.
+    # Interactive submissions and retries jump ahead by the given seconds of
+    # audio; every second waited counts as SCHEDULER_AGING_RATE seconds less.
+    SCHEDULER_INTERACTIVE_BOOST_SECONDS = float(os.environ.get('SCHEDULER_INTERACTIVE_BOOST_SECONDS') or 1800)
+    SCHEDULER_RETRY_BOOST_SECONDS = float(os.environ.get('SCHEDULER_RETRY_BOOST_SECONDS') or 900)
+    SCHEDULER_AGING_RATE = float(os.environ.get('SCHEDULER_AGING_RATE') or 1.0)
+    SCHEDULER_MAX_CANDIDATES = int(os.environ.get('SCHEDULER_MAX_CANDIDATES') or 1000)
+    # Run the worker inside the web process (local development only)
+    EMBEDDED_WORKER = os.environ.get('EMBEDDED_WORKER') == 'True' # False by default
+
+    # Model replicas per Whisper size, e.g. "tiny=4,base=3,medium=1".
+    # Sizes not listed use WHISPER_REPLICAS_DEFAULT (TRANSCRIPTION_WORKERS if unset).
+    WHISPER_REPLICAS = os.environ.get('WHISPER_REPLICAS') or ''
+    WHISPER_REPLICAS_DEFAULT = int(os.environ.get('WHISPER_REPLICAS_DEFAULT') or 0) or None
+
+    # Model cache: total memory for loaded replicas (0 = unlimited), seconds
+    # before an unused model is unloaded (0 = never), and models to load at
+    # worker startup (e.g. "base,diarization"), optionally warmed up.
+    MODEL_MEMORY_BUDGET_MB = int(os.environ.get('MODEL_MEMORY_BUDGET_MB') or 0)
+    MODEL_IDLE_TIMEOUT = int(os.environ.get('MODEL_IDLE_TIMEOUT') or 0)
+    PRELOAD_MODELS = os.environ.get('PRELOAD_MODELS') or ''
+    MODEL_WARMUP = os.environ.get('MODEL_WARMUP') == 'True'
+
+    # Server-Sent Events: how often each web process checks for job changes
+    # made by the worker, and the keepalive period of idle streams
+    EVENTS_POLL_INTERVAL = float(os.environ.get('EVENTS_POLL_INTERVAL') or 2)
+    EVENTS_KEEPALIVE_SECONDS = int(os.environ.get('EVENTS_KEEPALIVE_SECONDS') or 15)
 
     # Diarization
     HF_TOKEN = os.environ.get('HF_TOKEN')
+    DIARIZATION_REPLICAS = int(os.environ.get('DIARIZATION_REPLICAS') or 0) or None
+
+    # Accounts allowed to see deployment-wide statistics (cache, storage),
+    # comma-separated usernames; nobody by default
+    OPERATOR_USERNAMES = os.environ.get('OPERATOR_USERNAMES') or ''
 
     # Session / Cookies
     SESSION_COOKIE_SAMESITE = 'Lax'
@@ -35,6 +140,7 @@ class Config:
         # Create necessary directories
         try:
             os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+            os.makedirs(app.config['EXPORT_CACHE_FOLDER'], exist_ok=True)
             # Ensure instance folder exists (though Flask usually handles this)
             instance_path = os.path.join(basedir, 'instance')
             if not os.path.exists(instance_path):
@@ -0,0 +1,99 @@
+"""
+Compares speech-to-text engines on the same audio.
+
+For every engine spec (see app/transcriptions/engines.py) the model is
+loaded once, then each file is transcribed and timed. Reports the load
+time, the real-time factor (processing time / audio duration; below 1 is
+faster than real time) and the word error rate of each engine against the
+first one listed, so quantization drift shows up next to the speedup. With
+--reference, WER against a human transcript (one .txt per audio file, same
+base name) is reported as well.
+
+Usage: python scripts/bench_engines.py audio.wav [more.mp3 ...] [--model base]
+       [--engines whisper faster-whisper:int8 faster-whisper:int16]
+       [--language pt] [--threads 0] [--reference DIR]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.transcriptions.audio import load_audio, duration_seconds  # noqa: E402
+from app.transcriptions.engines import create_engine  # noqa: E402
+
+
+def normalize(text: str) -> list:
+    """Lowercased words without punctuation, as WER is usually computed."""
+    return re.findall(r"\w+", text.lower())
+
+
+def word_error_rate(reference: list, hypothesis: list) -> float:
+    """Word-level Levenshtein distance divided by the reference length."""
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, start=1):
+        current = [i] + [0] * len(hypothesis)
+        for j, hyp_word in enumerate(hypothesis, start=1):
+            current[j] = min(previous[j] + 1,  # deletion
+                             current[j - 1] + 1,  # insertion
+                             previous[j - 1] + (ref_word != hyp_word))  # substitution
+        previous = current
+    return previous[-1] / len(reference)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--model', default='base')
+    parser.add_argument('--engines', nargs='+', default=['whisper', 'faster-whisper:int8'])
+    parser.add_argument('--language', default='pt')
+    parser.add_argument('--threads', type=int, default=0, help='CPU threads per engine (0 = library default)')
+    parser.add_argument('--reference', help='Directory with <audio base name>.txt reference transcripts')
+    args = parser.parse_args()
+
+    audio = {path: load_audio(path, cache=False) for path in args.files}
+    baseline = {}  # path -> words of the first engine
+
+    for spec in args.engines:
+        engine = create_engine(spec)
+        started = time.perf_counter()
+        model = engine.load(args.model, args.threads)
+        load_s = time.perf_counter() - started
+
+        for path, samples in audio.items():
+            started = time.perf_counter()
+            result = model.transcribe(samples, language=args.language, task='transcribe')
+            elapsed = time.perf_counter() - started
+            words = normalize(result['text'])
+            duration = duration_seconds(samples)
+
+            report = {
+                'engine': engine.spec,
+                'model': args.model,
+                'file': os.path.basename(path),
+                'audio_s': round(duration, 2),
+                'load_s': round(load_s, 2),
+                'transcribe_s': round(elapsed, 2),
+                'rtf': round(elapsed / duration, 3) if duration else None,
+                'segments': len(result['segments']),
+            }
+            if path in baseline:
+                report['wer_vs_' + args.engines[0]] = round(word_error_rate(baseline[path], words), 4)
+            else:
+                baseline[path] = words
+            if args.reference:
+                reference_path = os.path.join(args.reference, os.path.splitext(os.path.basename(path))[0] + '.txt')
+                if os.path.exists(reference_path):
+                    with open(reference_path, encoding='utf-8') as f:
+                        report['wer_vs_reference'] = round(word_error_rate(normalize(f.read()), words), 4)
+            print(json.dumps(report, ensure_ascii=False))
+        del model
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Micro-benchmark of the Whisper/pyannote speaker merge.
+
+Builds a synthetic conversation (Whisper segments with word timestamps and
+overlapping diarization turns), then times the sweep-line merge in
+app/transcriptions/alignment.py against the previous pairwise scan and
+checks that both assign the same speaker to every segment. Word-level
+splitting is timed as well.
+
+Usage: python scripts/bench_merge.py [--segments 1000 10000 100000] [--turns-per-segment 1.5] [--seed 0]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.transcriptions.alignment import merge_segments  # noqa: E402
+
+
+def pairwise_merge(whisper_segments, diarization_segments):
+    """The original O(N·M) merge, kept as the reference."""
+    merged = []
+    for w_seg in whisper_segments:
+        best_speaker = "Unknown"
+        max_overlap = 0
+        for d_seg in diarization_segments:
+            overlap = max(0, min(w_seg['end'], d_seg['end']) - max(w_seg['start'], d_seg['start']))
+            if overlap > max_overlap:
+                max_overlap = overlap
+                best_speaker = d_seg['speaker']
+        merged.append({"start": w_seg['start'], "end": w_seg['end'],
+                       "text": w_seg['text'], "speaker": best_speaker})
+    return merged
+
+
+def synthetic(segment_count, turns_per_segment, rng):
+    """Whisper-like segments of 2-8 s with words, and speaker turns that overlap a little."""
+    segments, t = [], 0.0
+    for i in range(segment_count):
+        length = rng.uniform(2, 8)
+        words, w = [], t
+        for _ in range(max(1, int(length * 2.5))):
+            duration = rng.uniform(0.15, 0.5)
+            words.append({'word': ' palavra', 'start': w, 'end': min(w + duration, t + length)})
+            w += length / max(1, int(length * 2.5))
+        segments.append({'id': i, 'start': t, 'end': t + length, 'text': ' palavra' * len(words), 'words': words})
+        t += length + rng.uniform(0, 0.6)
+
+    total = t
+    turns, t = [], 0.0
+    mean = total / max(1, int(segment_count * turns_per_segment))
+    while t < total:
+        length = rng.expovariate(1 / mean) + 0.3
+        turns.append({'start': t, 'end': t + length, 'speaker': f"SPEAKER_{rng.randrange(4):02d}"})
+        t += length - rng.uniform(0, min(0.4, length / 2))  # Crosstalk
+    return segments, turns
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--segments', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--turns-per-segment', type=float, default=1.5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skip-pairwise-above', type=int, default=10000,
+                        help='Do not time the quadratic reference beyond this many segments')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for count in args.segments:
+        segments, turns = synthetic(count, args.turns_per_segment, rng)
+        sweep, sweep_s = timed(merge_segments, segments, turns, split_words=False)
+        words, words_s = timed(merge_segments, segments, turns, split_words=True)
+        report = {
+            'segments': len(segments),
+            'turns': len(turns),
+            'sweep_s': round(sweep_s, 4),
+            'sweep_words_s': round(words_s, 4),
+            'segments_after_word_split': len(words),
+        }
+        if count <= args.skip_pairwise_above:
+            reference, pairwise_s = timed(pairwise_merge, segments, turns)
+            report['pairwise_s'] = round(pairwise_s, 4)
+            report['speedup'] = round(pairwise_s / sweep_s, 1) if sweep_s else None
+            report['identical'] = reference == sweep
+        print(json.dumps(report))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+"""
+Runs one storage maintenance pass (compaction, retention, orphan cleanup)
+immediately and prints what it reclaimed. The worker does the same every
+STORAGE_MAINTENANCE_INTERVAL seconds; this is for one-off cleanups.
+
+Usage: python scripts/compact_storage.py
+"""
+import json
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    from app import create_app
+    from app.transcriptions.compaction import run_maintenance, storage_usage
+
+    app = create_app()
+    with app.app_context():
+        before = storage_usage()
+        report = run_maintenance()
+        after = storage_usage()
+        print(json.dumps({'report': report.to_dict(), 'usage_before': before, 'usage_after': after}, indent=2))
+    return 1 if report.error_message else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
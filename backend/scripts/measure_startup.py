@@ -0,0 +1,88 @@
+"""
+Measures web-process startup time and guards against heavy imports.
+
+Runs, in a fresh interpreter, the same steps a gunicorn worker does before it
+can answer /auth/status: import the app, call create_app() and serve one
+request. Fails (exit code 1) if torch/whisper/pyannote were imported on that
+path or if startup took longer than --max-seconds.
+
+Usage: python scripts/measure_startup.py [--max-seconds 3] [--runs 3]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+HEAVY_MODULES = ['torch', 'whisper', 'pyannote', 'torchaudio']
+
+PROBE = r'''
+import importlib, json, sys, time
+t0 = time.perf_counter()
+from app import create_app
+t_import = time.perf_counter()
+app = create_app()
+t_create = time.perf_counter()
+# Importing the inference services module must stay cheap as well
+importlib.import_module('app.transcriptions.services')
+response = app.test_client().get('/auth/status')
+t_request = time.perf_counter()
+print(json.dumps({
+    'import_s': t_import - t0,
+    'create_app_s': t_create - t_import,
+    'first_request_s': t_request - t_create,
+    'total_s': t_request - t0,
+    'status_code': response.status_code,
+    'heavy_modules': sorted({m.split('.')[0] for m in sys.modules} & set(HEAVY)),
+}))
+'''
+
+
+def run_probe():
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env.update({
+            'DATABASE_URL': 'sqlite:///' + os.path.join(tmp, 'startup.sqlite'),
+            'UPLOAD_FOLDER': os.path.join(tmp, 'uploads'),
+            'EMBEDDED_WORKER': 'False',
+        })
+        code = f"HEAVY = {HEAVY_MODULES!r}\n" + PROBE
+        proc = subprocess.run(
+            [sys.executable, '-c', code],
+            cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            print(proc.stderr)
+            sys.exit(1)
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--max-seconds', type=float, default=3.0)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    results = [run_probe() for _ in range(args.runs)]
+    best = min(results, key=lambda r: r['total_s'])
+
+    print(f"import app:       {best['import_s'] * 1000:8.1f} ms")
+    print(f"create_app():     {best['create_app_s'] * 1000:8.1f} ms")
+    print(f"GET /auth/status: {best['first_request_s'] * 1000:8.1f} ms")
+    print(f"total (best of {args.runs}): {best['total_s'] * 1000:8.1f} ms")
+
+    failed = False
+    if best['status_code'] != 200:
+        print(f"[!] /auth/status returned {best['status_code']}")
+        failed = True
+    if best['heavy_modules']:
+        print(f"[!] Heavy modules imported on the web path: {', '.join(best['heavy_modules'])}")
+        failed = True
+    if best['total_s'] > args.max_seconds:
+        print(f"[!] Startup took longer than {args.max_seconds:.1f}s")
+        failed = True
+
+    sys.exit(1 if failed else 0)
@@ -119,6 +119,16 @@ const Dashboard = ({ user, onLogout }: { user: any, onLogout: () => void }) => {
   const [isSettingsOpen, setIsSettingsOpen] = useState(false);
   const [speakerItem, setSpeakerItem] = useState<Transcription | null>(null);
 
+  // The list only carries summaries; load the segments when they are needed
+  const openSpeakers = async (item: Transcription) => {
+    try {
+      const full = await api.transcriptions.status(item.id);
+      setSpeakerItem(full ?? item);
+    } catch (err: any) {
+      alert(`Erro ao carregar transcrição: ${err.message}`);
+    }
+  };
+
   const handleRetry = async (item: Transcription) => {
     try {
       await api.transcriptions.retry(item.id);
@@ -128,6 +138,16 @@ const Dashboard = ({ user, onLogout }: { user: any, onLogout: () => void }) => {
     }
   };
 
+  const handleCancel = async (item: Transcription) => {
+    if (!confirm(`Cancelar a transcrição de "${item.filename}"?`)) return;
+    try {
+      await api.transcriptions.cancel(item.id);
+      refresh();
+    } catch (err: any) {
+      alert(`Erro ao cancelar: ${err.message}`);
+    }
+  };
+
   return (
     <div className="min-h-screen bg-slate-50">
       <header className="glass sticky top-0 z-50 px-6 py-4 flex items-center justify-between">
@@ -174,8 +194,9 @@ const Dashboard = ({ user, onLogout }: { user: any, onLogout: () => void }) => {
                     key={item.id}
                     item={item}
                     onView={setViewingItem}
-                    onManageSpeakers={setSpeakerItem}
+                    onManageSpeakers={openSpeakers}
                     onRetry={handleRetry}
+                    onCancel={handleCancel}
                   />
                 ))
               ) : !loading && (
@@ -200,7 +221,7 @@ const Dashboard = ({ user, onLogout }: { user: any, onLogout: () => void }) => {
                   Dica de Uso
                 </h4>
                 <p className="text-xs text-slate-500 leading-relaxed">
-                  Para melhores resultados, utilize arquivos .wav com alta qualidade e evite ruídos de fundo intensos.
+                  Para melhores resultados, utilize gravações de boa qualidade (WAV, FLAC ou MP3/Opus com bitrate alto) e evite ruídos de fundo intensos.
                 </p>
               </div>
             </div>
@@ -211,7 +232,7 @@ const Dashboard = ({ user, onLogout }: { user: any, onLogout: () => void }) => {
       <ReaderView
         item={viewingItem}
         onClose={() => setViewingItem(null)}
-        onManageSpeakers={setSpeakerItem}
+        onManageSpeakers={openSpeakers}
       />
 
       <SettingsModal
@@ -1,4 +1,4 @@
-import type { AuthStatus, PaginatedResponse, Transcription } from '../types';
+import type { AuthStatus, PaginatedResponse, Transcription, UploadInfo } from '../types';
 
 const API_BASE = import.meta.env.VITE_API_URL || 'http://localhost:5000';
 
@@ -15,6 +15,86 @@ async function handleResponse(response: Response) {
     return response.json();
 }
 
+const MAX_CHUNK_RETRIES = 5;
+
+async function sha256Base64(data: ArrayBuffer) {
+    const digest = await crypto.subtle.digest('SHA-256', data);
+    return btoa(String.fromCharCode(...new Uint8Array(digest)));
+}
+
+/**
+ * Upload a file in chunks with the server's resumable protocol. The upload
+ * ID is remembered per file, so after a network drop or a page reload the
+ * upload continues from the offset the server already has.
+ */
+async function uploadResumable(file: File, onProgress?: (fraction: number) => void): Promise<UploadInfo> {
+    const resumeKey = `upload:${file.name}:${file.size}:${file.lastModified}`;
+    let info: UploadInfo | null = null;
+
+    const savedId = localStorage.getItem(resumeKey);
+    if (savedId) {
+        const response = await fetch(`${API_BASE}/transcriptions/uploads/${savedId}`, { credentials: 'include' });
+        info = response.ok ? await response.json() : null;
+    }
+    if (!info || info.status !== 'uploading') {
+        info = await fetch(`${API_BASE}/transcriptions/uploads`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: file.name, size: file.size }),
+            credentials: 'include'
+        }).then(handleResponse);
+        if (!info) throw new Error('Não autorizado');
+        localStorage.setItem(resumeKey, info.upload_id);
+    }
+
+    const chunkSize = info.chunk_size || 8 * 1024 * 1024;
+    let failures = 0;
+    while (info.status === 'uploading') {
+        onProgress?.(info.offset / info.size);
+        const chunk = await file.slice(info.offset, info.offset + chunkSize).arrayBuffer();
+        let response: Response;
+        try {
+            response = await fetch(`${API_BASE}/transcriptions/uploads/${info.upload_id}`, {
+                method: 'PATCH',
+                headers: {
+                    'Content-Type': 'application/offset+octet-stream',
+                    'Upload-Offset': String(info.offset),
+                    'Upload-Checksum': `sha256 ${await sha256Base64(chunk)}`
+                },
+                body: chunk,
+                credentials: 'include'
+            });
+        } catch (err) {
+            // Network drop: wait, then continue from the server's offset
+            if (++failures > MAX_CHUNK_RETRIES) throw err;
+            await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** failures));
+            const current = await fetch(`${API_BASE}/transcriptions/uploads/${info.upload_id}`, { credentials: 'include' })
+                .then(r => r.ok ? r.json() : null).catch(() => null);
+            if (current) info = { ...info, ...current };
+            continue;
+        }
+
+        const body = await response.json().catch(() => ({}));
+        if (response.status === 401) {
+            window.dispatchEvent(new CustomEvent('unauthorized'));
+            throw new Error('Não autorizado');
+        }
+        // 409 (offset mismatch) and 460 (chunk checksum mismatch) carry the
+        // server's offset; resend from there
+        const resendable = response.status === 409 || response.status === 460;
+        if ((!response.ok && !resendable) || body.offset === undefined) {
+            throw new Error(body.error || 'Falha no upload');
+        }
+        failures = response.ok ? 0 : failures + 1;
+        if (failures > MAX_CHUNK_RETRIES) throw new Error(body.error || 'Falha no upload');
+        info = { ...info, ...body };
+    }
+
+    localStorage.removeItem(resumeKey);
+    onProgress?.(1);
+    return info;
+}
+
 export const api = {
     auth: {
         status: (): Promise<AuthStatus> =>
@@ -56,25 +136,20 @@ export const api = {
 
     transcriptions: {
         list: (page = 1, perPage = 10): Promise<PaginatedResponse<Transcription>> =>
-            fetch(`${API_BASE}/transcriptions/?page=${page}&per_page=${perPage}`, {
+            // Summary view: metadata and a short preview, not the full transcript
+            fetch(`${API_BASE}/transcriptions/?page=${page}&per_page=${perPage}&view=summary`, {
                 credentials: 'include'
             }).then(handleResponse),
 
-        upload: (file: File) => {
-            const formData = new FormData();
-            formData.append('file', file);
-            return fetch(`${API_BASE}/transcriptions/upload`, {
-                method: 'POST',
-                body: formData,
-                credentials: 'include'
-            }).then(handleResponse);
-        },
+        // Resumable, chunked upload; resolves with the finished upload
+        upload: (file: File, onProgress?: (fraction: number) => void): Promise<UploadInfo> =>
+            uploadResumable(file, onProgress),
 
-        start: (filename: string) =>
+        start: (uploadId: string) =>
             fetch(`${API_BASE}/transcriptions/transcribe`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ filename }),
+                body: JSON.stringify({ upload_id: uploadId }),
                 credentials: 'include'
             }).then(handleResponse),
 
@@ -84,13 +159,29 @@ export const api = {
                 credentials: 'include'
             }).then(handleResponse),
 
+        cancel: (id: number) =>
+            fetch(`${API_BASE}/transcriptions/${id}/cancel`, {
+                method: 'POST',
+                credentials: 'include'
+            }).then(handleResponse),
+
         status: (id: number): Promise<Transcription> =>
             fetch(`${API_BASE}/transcriptions/${id}/status`, {
                 credentials: 'include'
             }).then(handleResponse),
 
+        batchStatus: (ids: number[], results = false): Promise<{ items: Transcription[]; missing: number[] }> =>
+            fetch(`${API_BASE}/transcriptions/status?ids=${ids.join(',')}&results=${results}`, {
+                credentials: 'include'
+            }).then(handleResponse),
+
+        eventsUrl: () => `${API_BASE}/transcriptions/events`,
+
         downloadUrl: (id: number) => `${API_BASE}/transcriptions/${id}/download`,
 
+        exportUrl: (id: number, format: 'txt' | 'srt' | 'vtt' | 'json') =>
+            `${API_BASE}/transcriptions/${id}/export/${format}`,
+
         renameSpeaker: (id: number, oldLabel: string, newLabel: string) =>
             fetch(`${API_BASE}/transcriptions/${id}/rename-speaker`, {
                 method: 'PUT',
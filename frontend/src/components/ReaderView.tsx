@@ -65,6 +65,7 @@ export const ReaderView: React.FC<ReaderViewProps> = ({ item, onClose, onManageS
                             <p className="text-xs text-slate-400 flex items-center gap-2">
                                 <span className="w-2 h-2 rounded-full bg-green-500" />
                                 Modo de Leitura
+                                {item.model_name && <span>· Modelo {item.model_name}</span>}
                             </p>
                         </div>
 
@@ -97,6 +98,17 @@ export const ReaderView: React.FC<ReaderViewProps> = ({ item, onClose, onManageS
                                 <Download size={18} />
                             </a>
 
+                            {(['srt', 'vtt', 'json'] as const).map(format => (
+                                <a
+                                    key={format}
+                                    href={api.transcriptions.exportUrl(item.id, format)}
+                                    className="hidden sm:inline p-2 hover:bg-slate-100 rounded-xl text-slate-600 transition-all text-xs font-bold uppercase"
+                                    title={`Baixar como ${format.toUpperCase()}`}
+                                >
+                                    {format}
+                                </a>
+                            ))}
+
                             <div className="w-px h-6 bg-slate-200 mx-1" />
 
                             <button
@@ -1,7 +1,7 @@
 import React from 'react';
 import type { Transcription } from '../types';
-import { Clock, CheckCircle2, AlertCircle, Loader2, Download, Eye, Mic, User, RotateCcw } from 'lucide-react';
-import { formatTimestamp, cn } from '../utils';
+import { Clock, CheckCircle2, AlertCircle, Loader2, Download, Eye, Mic, User, RotateCcw, XCircle } from 'lucide-react';
+import { formatTimestamp, formatEta, cn } from '../utils';
 import { api } from '../api/client';
 
 interface TranscriptionCardProps {
@@ -9,17 +9,22 @@ interface TranscriptionCardProps {
     onView: (item: Transcription) => void;
     onManageSpeakers: (item: Transcription) => void;
     onRetry?: (item: Transcription) => void;
+    onCancel?: (item: Transcription) => void;
 }
 
-export const TranscriptionCard: React.FC<TranscriptionCardProps> = ({ item, onView, onManageSpeakers, onRetry }) => {
+export const TranscriptionCard: React.FC<TranscriptionCardProps> = ({ item, onView, onManageSpeakers, onRetry, onCancel }) => {
     const statusConfig: Record<string, { label: string, icon: any, color: string, animate?: string }> = {
         pending: { label: 'Na Fila', icon: Clock, color: 'text-amber-500 bg-amber-50' },
         processing: { label: 'Processando...', icon: Loader2, color: 'text-blue-500 bg-blue-50', animate: 'animate-spin' },
         completed: { label: 'Concluído', icon: CheckCircle2, color: 'text-green-500 bg-green-50' },
         failed: { label: 'Falhou', icon: AlertCircle, color: 'text-red-500 bg-red-50' },
+        cancelled: { label: 'Cancelado', icon: XCircle, color: 'text-slate-500 bg-slate-100' },
     };
 
     const config = statusConfig[item.status];
+    const label = item.status === 'processing'
+        ? `Processando ${item.progress ?? 0}%${item.eta_seconds != null ? ` · ~${formatEta(item.eta_seconds)}` : ''}`
+        : config.label;
 
     return (
         <div className="list-row group flex items-center justify-between gap-4 border border-transparent hover:border-primary-light/20 shadow-sm hover:shadow-md relative">
@@ -50,7 +55,7 @@ export const TranscriptionCard: React.FC<TranscriptionCardProps> = ({ item, onVi
                             config.color.split(' ')[0]
                         )}>
                             <span className={cn("w-1.5 h-1.5 rounded-full", config.color.split(' ')[1])} />
-                            {config.label}
+                            {label}
                         </div>
                     </div>
                 </div>
@@ -85,7 +90,17 @@ export const TranscriptionCard: React.FC<TranscriptionCardProps> = ({ item, onVi
                     </>
                 )}
 
-                {item.status === 'failed' && onRetry && (
+                {(item.status === 'pending' || item.status === 'processing') && onCancel && (
+                    <button
+                        onClick={() => onCancel(item)}
+                        className="p-2 hover:bg-slate-100 text-slate-500 rounded-xl transition-all"
+                        title="Cancelar"
+                    >
+                        <XCircle size={20} />
+                    </button>
+                )}
+
+                {(item.status === 'failed' || item.status === 'cancelled') && onRetry && (
                     <button
                         onClick={() => onRetry(item)}
                         className="p-2 hover:bg-red-50 text-red-500 rounded-xl transition-all"
@@ -3,6 +3,9 @@ import { Upload, AlertCircle, Loader2 } from 'lucide-react';
 import { api } from '../api/client';
 import { cn } from '../utils';
 
+// Checked again on the server, which sniffs the file content
+const ACCEPTED_EXTENSIONS = ['.wav', '.mp3', '.m4a', '.aac', '.mp4', '.ogg', '.oga', '.opus', '.flac', '.webm'];
+
 interface UploadZoneProps {
     onSuccess: () => void;
 }
@@ -11,18 +14,20 @@ export const UploadZone: React.FC<UploadZoneProps> = ({ onSuccess }) => {
     const [isDragging, setIsDragging] = useState(false);
     const [isUploading, setIsUploading] = useState(false);
     const [error, setError] = useState<string | null>(null);
+    const [progress, setProgress] = useState(0);
 
     const handleFile = async (file: File) => {
-        if (!file.name.toLowerCase().endsWith('.wav')) {
-            setError('Por favor, selecione um arquivo .wav');
+        if (!ACCEPTED_EXTENSIONS.some(ext => file.name.toLowerCase().endsWith(ext))) {
+            setError('Por favor, selecione um arquivo de áudio (WAV, MP3, M4A, OGG, Opus, FLAC ou WebM)');
             return;
         }
 
         setIsUploading(true);
         setError(null);
+        setProgress(0);
         try {
-            const uploadData = await api.transcriptions.upload(file);
-            await api.transcriptions.start(uploadData.filename);
+            const uploadData = await api.transcriptions.upload(file, setProgress);
+            await api.transcriptions.start(uploadData.upload_id);
             onSuccess();
         } catch (err: any) {
             setError(err.message || 'Erro no upload');
@@ -47,7 +52,7 @@ export const UploadZone: React.FC<UploadZoneProps> = ({ onSuccess }) => {
                 onClick={() => {
                     const input = document.createElement('input');
                     input.type = 'file';
-                    input.accept = '.wav';
+                    input.accept = ACCEPTED_EXTENSIONS.join(',');
                     input.onchange = (e) => {
                         const file = (e.target as HTMLInputElement).files?.[0];
                         if (file) handleFile(file);
@@ -68,13 +73,15 @@ export const UploadZone: React.FC<UploadZoneProps> = ({ onSuccess }) => {
                         {isUploading ? <Loader2 className="animate-spin" /> : <Upload size={32} />}
                     </div>
                     <h3 className="font-bold text-slate-800 text-lg">
-                        {isUploading ? 'Processando arquivo...' : 'Nova Transcrição'}
+                        {isUploading
+                            ? (progress < 1 ? `Enviando... ${Math.round(progress * 100)}%` : 'Processando arquivo...')
+                            : 'Nova Transcrição'}
                     </h3>
                     <p className="text-slate-500 text-sm mt-1">
                         Arraste seu áudio aqui ou clique para buscar
                     </p>
                     <div className="mt-4 flex gap-2">
-                        <span className="px-3 py-1 bg-white border border-slate-200 rounded-full text-[10px] font-bold text-slate-400 uppercase tracking-wider">.WAV APENAS</span>
+                        <span className="px-3 py-1 bg-white border border-slate-200 rounded-full text-[10px] font-bold text-slate-400 uppercase tracking-wider">WAV · MP3 · M4A · OGG · FLAC · WEBM</span>
                     </div>
                 </div>
             </div>
@@ -7,6 +7,8 @@ export function useTranscriptions() {
     const [loading, setLoading] = useState(true);
     const [page, setPage] = useState(1);
     const [totalPages, setTotalPages] = useState(1);
+    // Server-Sent Events are the primary channel; polling is only a fallback
+    const [streamAvailable, setStreamAvailable] = useState(typeof EventSource !== 'undefined');
 
     const fetchTranscriptions = useCallback(async (p = 1) => {
         try {
@@ -27,8 +29,42 @@ export function useTranscriptions() {
         fetchTranscriptions();
     }, [fetchTranscriptions]);
 
-    // Polling for active transcriptions
+    // Each open stream holds a server thread, so only listen while something is in flight
+    const hasActive = transcriptions.some(t => t.status === 'pending' || t.status === 'processing');
+
+    // Push channel: status/progress/completion events for the user's jobs
     useEffect(() => {
+        if (!streamAvailable || !hasActive) return;
+
+        const source = new EventSource(api.transcriptions.eventsUrl(), { withCredentials: true });
+
+        const applyUpdate = (event: MessageEvent) => {
+            const update = JSON.parse(event.data) as Partial<Transcription> & { id: number };
+            setTranscriptions(prev => prev.map(t => (t.id === update.id ? { ...t, ...update } : t)));
+        };
+        const refreshOnFinish = (event: MessageEvent) => {
+            applyUpdate(event);
+            fetchTranscriptions(page);
+        };
+
+        source.addEventListener('status', applyUpdate);
+        source.addEventListener('completed', refreshOnFinish);
+        source.addEventListener('failed', refreshOnFinish);
+        source.addEventListener('cancelled', refreshOnFinish);
+        source.onerror = () => {
+            // EventSource reconnects by itself; give up only if it was closed for good
+            if (source.readyState === EventSource.CLOSED) {
+                setStreamAvailable(false);
+            }
+        };
+
+        return () => source.close();
+    }, [streamAvailable, hasActive, fetchTranscriptions, page]);
+
+    // Polling fallback for active transcriptions, only when the stream is unavailable
+    useEffect(() => {
+        if (streamAvailable) return;
+
         const activeIds = transcriptions
             .filter(t => t.status === 'pending' || t.status === 'processing')
             .map(t => t.id);
@@ -36,23 +72,24 @@ export function useTranscriptions() {
         if (activeIds.length === 0) return;
 
         const interval = setInterval(async () => {
-            const updates = await Promise.all(
-                activeIds.map(id => api.transcriptions.status(id))
-            );
+            // One request for every active job
+            const data = await api.transcriptions.batchStatus(activeIds);
+            if (!data) return;
+            const updates = data.items;
 
             setTranscriptions(prev => prev.map(t => {
                 const update = updates.find(u => u.id === t.id);
-                return update ? update : t;
+                return update ? { ...t, ...update } : t;
             }));
 
             // If anything finished, refresh the whole list to be sure
-            if (updates.some(u => u.status === 'completed' || u.status === 'failed')) {
+            if (updates.some(u => u.status === 'completed' || u.status === 'failed' || u.status === 'cancelled')) {
                 fetchTranscriptions(page);
             }
         }, 3000);
 
         return () => clearInterval(interval);
-    }, [transcriptions, fetchTranscriptions, page]);
+    }, [streamAvailable, transcriptions, fetchTranscriptions, page]);
 
     return {
         transcriptions,
@@ -7,11 +7,18 @@ export interface User {
 export interface Transcription {
     id: number;
     filename: string;
-    status: 'pending' | 'processing' | 'completed' | 'failed';
+    status: 'pending' | 'processing' | 'completed' | 'failed' | 'cancelled';
     progress: number;
     timestamp: string;
     error_message?: string;
     segments?: any[];
+    transcription?: string;
+    preview?: string;
+    partial?: boolean;
+    duration?: number;
+    processed_seconds?: number;
+    eta_seconds?: number | null;
+    model_name?: string | null;
 }
 
 export interface AuthStatus {
@@ -26,3 +33,13 @@ export interface PaginatedResponse<T> {
     pages: number;
     per_page: number;
 }
+
+export interface UploadInfo {
+    upload_id: string;
+    filename: string;
+    status: 'uploading' | 'complete';
+    size: number;
+    offset: number;
+    sha256: string | null;
+    chunk_size?: number;
+}
@@ -8,3 +8,10 @@ export function cn(...inputs: ClassValue[]) {
 export function formatTimestamp(timestamp: string) {
     return new Date(timestamp).toLocaleString('pt-BR');
 }
+
+export function formatEta(seconds: number) {
+    if (seconds < 60) return `${Math.max(1, Math.round(seconds))}s`;
+    const minutes = Math.round(seconds / 60);
+    if (minutes < 60) return `${minutes} min`;
+    return `${Math.floor(minutes / 60)}h${String(minutes % 60).padStart(2, '0')}`;
+}